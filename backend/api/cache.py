@@ -0,0 +1,169 @@
+import time
+from functools import partial
+from hashlib import md5
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, urlencode
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+from recipes.cache import (
+    get_recipe_list_version,
+    get_recipe_version,
+    get_reference_data_version,
+)
+
+from .constants import (
+    RECIPE_CACHE_LOCK_TIMEOUT,
+    RECIPE_CACHE_STALE_TIMEOUT,
+    RECIPE_CACHE_TIMEOUT,
+    RECIPE_CACHE_WAIT_STEP,
+    RECIPE_CACHE_WAIT_TIMEOUT,
+    REFERENCE_DATA_CACHE_TIMEOUT,
+    REFERENCE_DATA_MAX_AGE,
+)
+from .timing import metrics
+
+
+class ReferenceDataCacheMixin:
+    """
+    Кэширует ответы list и retrieve для справочников.
+
+    Ответ хранится уже отрендеренным и привязан к версии справочников,
+    поэтому любое изменение тегов или продуктов делает старые записи
+    недостижимыми. Версия берётся из памяти процесса и перечитывается
+    из общего кэша раз в REFERENCE_DATA_VERSION_TTL секунд, поэтому
+    условные запросы с If-None-Match и If-Modified-Since обычно
+    обрабатываются без обращения к базе.
+    """
+
+    def perform_authentication(self, request):
+        """Справочники открыты всем, пользователь определяется лениво."""
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, partial(super().list, request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, partial(super().retrieve, request, *args, **kwargs)
+        )
+
+    def cached_response(self, request, get_response):
+        version = get_reference_data_version()
+        etag = '"{}"'.format(
+            md5(f'{version}:{request.get_full_path()}'.encode()).hexdigest()
+        )
+        response = get_conditional_response(
+            request, etag=etag, last_modified=version
+        )
+        if response is None:
+            cache_key = f'reference-data:{etag}'
+            content = cache.get(cache_key)
+            if content is None:
+                response = get_response()
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                content = JSONRenderer().render(response.data)
+                cache.set(cache_key, content, REFERENCE_DATA_CACHE_TIMEOUT)
+            response = HttpResponse(
+                content, content_type='application/json'
+            )
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(version)
+        patch_cache_control(
+            response, public=True, max_age=REFERENCE_DATA_MAX_AGE
+        )
+        return response
+
+
+def normalize_query(query_params):
+    """Строка запроса с упорядоченными параметрами и значениями."""
+    return urlencode(
+        sorted((key, sorted(values)) for key, values in query_params.lists()),
+        doseq=True,
+    )
+
+
+class AnonymousRecipeCacheMixin:
+    """
+    Кэширует ответы list и retrieve рецептов для анонимных запросов.
+
+    Ключ строится по адресу с нормализованной строкой запроса и
+    версиям справочников, списков рецептов и самого рецепта; сигналы
+    меняют версии после изменения данных. Пока один запрос собирает
+    ответ для ключа, остальные получают предыдущий ответ по тому же
+    адресу (stale) или ждут нового, а не идут в базу.
+    """
+
+    def list(self, request, *args, **kwargs):
+        get_response = partial(super().list, request, *args, **kwargs)
+        if request.user.is_authenticated:
+            return get_response()
+        return self.cached_response(
+            request, get_recipe_list_version(), get_response
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        get_response = partial(super().retrieve, request, *args, **kwargs)
+        if request.user.is_authenticated:
+            return get_response()
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return self.cached_response(
+            request, get_recipe_version(pk), get_response
+        )
+
+    def cached_response(self, request, version, get_response):
+        route = request.resolver_match.view_name
+        base_key = 'recipe-response:' + md5(
+            f'{request.scheme}://{request.get_host()}{request.path}?'
+            f'{normalize_query(request.query_params)}'.encode()
+        ).hexdigest()
+        stale_key = f'{base_key}:stale'
+        key = f'{base_key}:{get_reference_data_version()}:{version}'
+        result = 'hit'
+        content = cache.get(key)
+        if content is None:
+            content, result = self.fill(key, stale_key, get_response)
+        metrics.increment(
+            'foodgram_response_cache_total', route=route, result=result
+        )
+        if isinstance(content, HttpResponse):
+            return content
+        return HttpResponse(content, content_type='application/json')
+
+    @staticmethod
+    def fill(key, stale_key, get_response):
+        """
+        Собирает ответ для ключа в одном запросе из одновременных.
+
+        Возвращает содержимое (или ответ с ошибкой) и результат
+        обращения к кэшу для метрик.
+        """
+        lock_key = f'{key}:lock'
+        locked = cache.add(lock_key, 1, RECIPE_CACHE_LOCK_TIMEOUT)
+        if not locked:
+            content = cache.get(stale_key)
+            if content is not None:
+                return content, 'stale'
+            deadline = time.monotonic() + RECIPE_CACHE_WAIT_TIMEOUT
+            while time.monotonic() < deadline:
+                time.sleep(RECIPE_CACHE_WAIT_STEP)
+                content = cache.get(key)
+                if content is not None:
+                    return content, 'hit'
+        try:
+            response = get_response()
+            if response.status_code != status.HTTP_200_OK:
+                cache.delete(stale_key)
+                return response, 'miss'
+            content = JSONRenderer().render(response.data)
+            cache.set(key, content, RECIPE_CACHE_TIMEOUT)
+            cache.set(stale_key, content, RECIPE_CACHE_STALE_TIMEOUT)
+        finally:
+            if locked:
+                cache.delete(lock_key)
+        return content, 'miss'
@@ -6,3 +6,30 @@ INDENT_AFTER_HEADER = 30
 INDENT_BETWEEN_INGREDIENTS = 20
 
 TXT_FILENAME = 'spisok_pokupok.txt'
+CSV_FILENAME = 'spisok_pokupok.csv'
+SHOPPING_LIST_CHUNK_SIZE = 500
+SHOPPING_LIST_FORMAT_PARAM = 'file_format'
+INGREDIENT_SEARCH_MAX_LIMIT = 100
+REFERENCE_DATA_CACHE_TIMEOUT = 60 * 60 * 24
+REFERENCE_DATA_MAX_AGE = 60 * 5
+BULK_RECIPES_MAX_LENGTH = 500
+METRICS_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+METRICS_FLUSH_INTERVAL = 5
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+NPLUSONE_STACK_DEPTH = 60
+NPLUSONE_TEMPLATE_LENGTH = 200
+MAX_IMAGE_UPLOAD_SIZE = 10 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+RECIPE_CACHE_TIMEOUT = 60 * 10
+RECIPE_CACHE_STALE_TIMEOUT = 60 * 60
+RECIPE_CACHE_LOCK_TIMEOUT = 10
+RECIPE_CACHE_WAIT_TIMEOUT = 2
+RECIPE_CACHE_WAIT_STEP = 0.05
+COVERAGE_MAX_INGREDIENTS = 500
+RECIPE_FACETS_PARAM = 'facets'
+FEED_EVENTS_PATH = '/api/recipes/feed/events/'
+FEED_EVENTS_KEEPALIVE = 15
+FEED_EVENTS_QUEUE_SIZE = 100
+FEED_EVENTS_REPLAY_LIMIT = 50
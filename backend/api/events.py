@@ -0,0 +1,198 @@
+import asyncio
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from rest_framework.authtoken.models import Token
+
+from recipes.events import author_channel, get_broker, user_channel
+from recipes.models import Recipe, Subscriptions
+
+from .constants import (
+    FEED_EVENTS_KEEPALIVE,
+    FEED_EVENTS_QUEUE_SIZE,
+    FEED_EVENTS_REPLAY_LIMIT,
+)
+
+
+def database_sync_to_async(function):
+    """
+    sync_to_async для запросов к базе вне обработчика Django.
+
+    Устаревшие соединения закрываются до и после вызова, как это
+    делает обработчик запросов.
+    """
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(wrapper)
+
+
+def get_header(scope, name):
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+@database_sync_to_async
+def authenticate(scope):
+    """Пользователь по заголовку "Authorization: Token <ключ>"."""
+    keyword, _, key = (get_header(scope, b'authorization') or '').partition(
+        ' '
+    )
+    if keyword != 'Token' or not key:
+        return None
+    token = Token.objects.select_related('user').filter(key=key).first()
+    if token is None or not token.user.is_active:
+        return None
+    return token.user
+
+
+@database_sync_to_async
+def get_authors(user):
+    return set(Subscriptions.objects.filter(user=user).values_list(
+        'author_id', flat=True
+    ))
+
+
+@database_sync_to_async
+def get_missed_recipes(authors, last_id):
+    """Рецепты авторов, опубликованные после события last_id."""
+    return [
+        {
+            'type': 'recipe',
+            'id': pk,
+            'name': name,
+            'author': author_id,
+            'pub_date': pub_date.isoformat(),
+        }
+        for pk, name, author_id, pub_date in Recipe.objects.filter(
+            author__in=authors, pk__gt=last_id
+        ).order_by('pk').values_list(
+            'pk', 'name', 'author_id', 'pub_date'
+        )[:FEED_EVENTS_REPLAY_LIMIT]
+    ]
+
+
+def format_event(message):
+    return (
+        f'id: {message["id"]}\nevent: recipe\n'
+        f'data: {json.dumps(message, ensure_ascii=False)}\n\n'
+    ).encode()
+
+
+async def send_error(send, status, detail):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({
+        'type': 'http.response.body',
+        'body': json.dumps({'detail': detail}, ensure_ascii=False).encode(),
+    })
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def feed_events(scope, receive, send):
+    """
+    Поток server-sent events о новых рецептах авторов из подписок.
+
+    Каждое событие "recipe" несёт id рецепта; при переподключении с
+    заголовком Last-Event-ID сначала отдаются пропущенные рецепты.
+    Смена подписок применяется к открытому потоку на лету.
+    """
+    if scope['method'] != 'GET':
+        await send_error(send, 405, 'Метод не разрешён.')
+        return
+    user = await authenticate(scope)
+    if user is None:
+        await send_error(send, 401, 'Учетные данные не были предоставлены.')
+        return
+    broker = get_broker()
+    authors = await get_authors(user)
+    listener = broker.listen(
+        [user_channel(user.pk), *map(author_channel, authors)],
+        FEED_EVENTS_QUEUE_SIZE,
+    )
+    disconnect = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        last_id = get_header(scope, b'last-event-id') or ''
+        last_id = (
+            int(last_id) if last_id.isascii() and last_id.isdigit() else 0
+        )
+        if last_id:
+            for message in await get_missed_recipes(authors, last_id):
+                await send({
+                    'type': 'http.response.body',
+                    'body': format_event(message),
+                    'more_body': True,
+                })
+                last_id = message['id']
+        while True:
+            message = asyncio.ensure_future(listener.get())
+            done, _ = await asyncio.wait(
+                {message, disconnect},
+                timeout=FEED_EVENTS_KEEPALIVE,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnect in done:
+                message.cancel()
+                return
+            if message not in done:
+                message.cancel()
+                body = b': ping\n\n'
+            else:
+                message = message.result()
+                if message['type'] == 'subscribed':
+                    broker.follow(listener, author_channel(message['author']))
+                    continue
+                if message['type'] == 'unsubscribed':
+                    broker.unfollow(
+                        listener, author_channel(message['author'])
+                    )
+                    continue
+                # Рецепты, уже отданные из Last-Event-ID, не повторяются.
+                if message['id'] <= last_id:
+                    continue
+                body = format_event(message)
+            await send({
+                'type': 'http.response.body',
+                'body': body,
+                'more_body': True,
+            })
+    finally:
+        disconnect.cancel()
+        broker.close(listener)
+
+
+def route_feed_events(application, path):
+    """Направляет запросы к path в поток событий, остальные — в application."""
+
+    async def router(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == path:
+            await feed_events(scope, receive, send)
+        else:
+            await application(scope, receive, send)
+
+    return router
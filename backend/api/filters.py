@@ -1,9 +1,34 @@
 import django_filters
+from django.db.models import (
+    Case,
+    Count,
+    Exists,
+    F,
+    IntegerField,
+    OuterRef,
+    Value,
+    When,
+)
+
 from recipes.models import Ingredient, Recipe, Tag
+from recipes.search import search_recipes
+from recipes.utils import normalize_search_key
+
+from .constants import INGREDIENT_SEARCH_MAX_LIMIT
+
+TAGS_MODE_ANY = 'any'
+TAGS_MODE_ALL = 'all'
 
 
 class RecipeFilter(django_filters.FilterSet):
-    """Список фильтров для рецептов."""
+    """
+    Список фильтров для рецептов.
+
+    Параметр "search" ищет по названию, описанию и продуктам и
+    сортирует выдачу по релевантности. Теги "tags" отбираются по
+    маске тегов рецепта: по умолчанию рецепты с любым из тегов,
+    с "tags_mode=all" — со всеми.
+    """
 
     is_favorited = django_filters.NumberFilter(method='filter_is_favorited')
     is_in_shopping_cart = django_filters.NumberFilter(
@@ -13,8 +38,16 @@ class RecipeFilter(django_filters.FilterSet):
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),
-        conjoined=False
+        method='filter_tags',
+    )
+    tags_mode = django_filters.ChoiceFilter(
+        choices=(
+            (TAGS_MODE_ANY, 'Любой из тегов'),
+            (TAGS_MODE_ALL, 'Все теги'),
+        ),
+        method='filter_tags_mode',
     )
+    search = django_filters.CharFilter(method='filter_search')
 
     def filter_is_favorited(self, recipe, name, value):
         """Возвращает рецепты по фильтру "в избранном"."""
@@ -33,18 +66,127 @@ class RecipeFilter(django_filters.FilterSet):
             return recipe.none()
         return recipe
 
+    def filter_tags(self, recipe, name, value):
+        """
+        Возвращает рецепты с любым или со всеми тегами value.
+
+        Теги без бита маски проверяются подзапросом к связям.
+        """
+        if not value:
+            return recipe
+        mask = 0
+        unmasked = []
+        for tag in value:
+            if tag.bit is None:
+                unmasked.append(tag)
+            else:
+                mask |= 1 << tag.bit
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk')
+        )
+        recipe = recipe.alias(tags_match=F('tags_mask').bitand(mask))
+        if self.form.cleaned_data.get('tags_mode') != TAGS_MODE_ALL:
+            if unmasked:
+                return recipe.filter(Exists(recipe_tags.filter(tag__in=value)))
+            return recipe.exclude(tags_match=0)
+        for tag in unmasked:
+            recipe = recipe.filter(Exists(recipe_tags.filter(tag=tag)))
+        return recipe.filter(tags_match=mask)
+
+    def filter_tags_mode(self, recipe, name, value):
+        """Режим применяется в filter_tags."""
+        return recipe
+
+    def filter_search(self, recipe, name, value):
+        """Возвращает рецепты по полнотекстовому запросу."""
+        if not value.strip():
+            return recipe
+        return search_recipes(recipe, value)
+
     class Meta:
         model = Recipe
-        fields = ('author', 'is_favorited', 'is_in_shopping_cart', 'tags')
+        fields = (
+            'author',
+            'is_favorited',
+            'is_in_shopping_cart',
+            'tags',
+            'tags_mode',
+            'search',
+        )
+
+
+def tag_facets(recipes):
+    """
+    Число рецептов выборки с каждым тегом.
+
+    Рецепты группируются по маске тегов одним запросом, счётчики тегов
+    собираются из масок; теги без бита считаются отдельно по связям.
+    """
+    masks = recipes.order_by().values('tags_mask').annotate(
+        count=Count('pk')
+    ).values_list('tags_mask', 'count')
+    tags = list(Tag.objects.all())
+    counts = dict.fromkeys((tag.pk for tag in tags), 0)
+    for mask, count in masks:
+        for tag in tags:
+            if tag.bit is not None and mask >> tag.bit & 1:
+                counts[tag.pk] += count
+    if any(tag.bit is None for tag in tags):
+        counts.update(
+            Recipe.tags.through.objects.filter(
+                recipe__in=recipes.order_by().values('pk'), tag__bit=None
+            ).values('tag').annotate(count=Count('*')).values_list(
+                'tag', 'count'
+            )
+        )
+    return [
+        {
+            'id': tag.pk,
+            'name': tag.name,
+            'slug': tag.slug,
+            'count': counts[tag.pk],
+        }
+        for tag in tags
+    ]
 
 
 class IngredientFilter(django_filters.FilterSet):
-    """Фильтр по названию для ингредиентов."""
+    """
+    Поиск ингредиентов по названию.
 
-    name = django_filters.CharFilter(
-        field_name='name', lookup_expr='icontains'
-    )
+    Сначала идут продукты, название которых начинается с запроса, затем
+    содержащие его. Параметр "limit" ограничивает размер выдачи.
+    """
+
+    name = django_filters.CharFilter(method='filter_name')
+    limit = django_filters.NumberFilter(method='filter_limit')
+
+    def filter_name(self, ingredients, name, value):
+        """Возвращает продукты, содержащие запрос, префиксные — первыми."""
+        search_key = normalize_search_key(value)
+        if not search_key:
+            return ingredients
+        return ingredients.filter(
+            search_name__contains=search_key
+        ).annotate(
+            search_rank=Case(
+                When(search_name__startswith=search_key, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by('search_rank', 'search_name')
+
+    def filter_limit(self, ingredients, name, value):
+        """Ограничение применяется в filter_queryset после всех фильтров."""
+        return ingredients
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        limit = self.form.cleaned_data.get('limit')
+        if limit is None:
+            return queryset
+        return queryset[:max(0, min(int(limit), INGREDIENT_SEARCH_MAX_LIMIT))]
 
     class Meta:
         model = Ingredient
-        fields = ('name',)
+        fields = ('name', 'limit')
@@ -0,0 +1,534 @@
+import base64
+import io
+import json
+import math
+import platform
+import re
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from itertools import combinations
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.urls import URLResolver
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.timing import RequestTimings
+from api.urls import urlpatterns
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    Subscriptions,
+    Tag,
+    User,
+)
+
+BENCHMARK_EMAIL = 'benchmark-user@example.com'
+BENCHMARK_PASSWORD = 'Zq7-vLk2-Rp9x'
+CART_SIZE = 20
+SUBSCRIPTIONS_SIZE = 10
+RECIPE_INGREDIENTS_SIZE = 10
+BULK_SIZE = 50
+# Маршруты djoser, которым нужны одноразовые токены из писем.
+SKIPPED_ROUTES = {
+    'users-activation',
+    'users-resend-activation',
+    'users-reset-password',
+    'users-reset-password-confirm',
+    'users-reset-username',
+    'users-reset-username-confirm',
+    'users-set-username',
+}
+
+Case = namedtuple(
+    'Case',
+    (
+        'name', 'route', 'method', 'path', 'data', 'status', 'anonymous',
+        'admin',
+    ),
+    defaults=(None, 200, False, False),
+)
+
+
+def percentile(values, percent):
+    """Процентиль по методу ближайшего ранга."""
+    values = sorted(values)
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def route_names(patterns):
+    """Имена всех маршрутов из api/urls.py."""
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from route_names(pattern.url_patterns)
+        elif pattern.name:
+            yield pattern.name
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер задержек, числа и времени SQL-запросов и пикового '
+        'потребления памяти для всех маршрутов API'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            type=float,
+            help='Перед замером сгенерировать данные командой seed_load.',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--only',
+            help='Регулярное выражение для отбора замеров по имени.',
+        )
+        parser.add_argument('--output', help='Файл для результатов JSON.')
+        parser.add_argument(
+            '--compare',
+            help='Файл с эталонными результатами для сравнения.',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.2,
+            help='Допустимый относительный рост задержки и памяти.',
+        )
+
+    def prepare(self):
+        """Создаёт пользователя для замеров и его списки."""
+        author = User.objects.order_by('-recipes_count', 'pk').first()
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        ingredient_ids = list(
+            Ingredient.objects.values_list('pk', flat=True)[
+                :RECIPE_INGREDIENTS_SIZE
+            ]
+        )
+        if author is None or not tags or not ingredient_ids:
+            raise CommandError(
+                'Нет данных для замера: запустите seed_load или '
+                'укажите --scale.'
+            )
+        user = User.objects.create_user(
+            username='benchmark-user',
+            email=BENCHMARK_EMAIL,
+            password=BENCHMARK_PASSWORD,
+            first_name='Benchmark',
+            last_name='User',
+        )
+        recipe_ids = list(
+            Recipe.objects.values_list('pk', flat=True)[:CART_SIZE * 2]
+        )
+        ShoppingCart.objects.add_recipes(user, recipe_ids[:CART_SIZE])
+        Favorite.objects.add_recipes(user, recipe_ids[:CART_SIZE])
+        authors = list(
+            User.objects.exclude(pk=user.pk).order_by(
+                '-recipes_count', 'pk'
+            ).values_list('pk', flat=True)[:SUBSCRIPTIONS_SIZE + 1]
+        )
+        Subscriptions.objects.bulk_create(
+            Subscriptions(user=user, author_id=author_id)
+            for author_id in authors[:-1]
+        )
+        Subscriptions.objects.shift_counters([], authors[:-1], 1)
+        Subscriptions.objects.shift_counters(
+            [user.pk], [], len(authors) - 1
+        )
+        buffer = io.BytesIO()
+        Image.new('RGB', (1, 1)).save(buffer, 'PNG')
+        image = 'data:image/png;base64,' + base64.b64encode(
+            buffer.getvalue()
+        ).decode()
+        recipe = {
+            'name': 'benchmark',
+            'text': 'benchmark',
+            'cooking_time': 10,
+            'image': image,
+            'tags': list(
+                Tag.objects.filter(slug__in=tags).values_list('pk', flat=True)
+            ),
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 100}
+                for ingredient_id in ingredient_ids
+            ],
+        }
+        client = APIClient()
+        response = client.post(
+            '/api/auth/token/login/',
+            {'email': BENCHMARK_EMAIL, 'password': BENCHMARK_PASSWORD},
+        )
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {response.data["auth_token"]}'
+        )
+        own = client.post('/api/recipes/', recipe, format='json').data['id']
+        admin = User.objects.create_superuser(
+            username='benchmark-admin',
+            email='benchmark-admin@example.com',
+            password=BENCHMARK_PASSWORD,
+        )
+        return client, {
+            'admin': admin,
+            'user': user,
+            'author': author.pk,
+            'subscribed': authors[0],
+            'unsubscribed': authors[-1],
+            'tags': tags,
+            'search': Ingredient.objects.get(
+                pk=ingredient_ids[0]
+            ).search_name[:3],
+            'ingredient': ingredient_ids[0],
+            'tag': recipe['tags'][0],
+            'recipe': recipe_ids[0],
+            'in_lists': recipe_ids[0],
+            'not_in_lists': recipe_ids[-1],
+            'bulk': recipe_ids,
+            'own': own,
+            'image': image,
+            'payload': recipe,
+        }
+
+    def build_cases(self, data):
+        filters = {
+            'author': data['author'],
+            'tags': data['tags'],
+            'is_favorited': 1,
+            'is_in_shopping_cart': 1,
+        }
+        cases = [
+            Case(
+                'recipes-list[anonymous]', 'recipes-list', 'get',
+                '/api/recipes/', anonymous=True,
+            ),
+            Case(
+                'recipes-list[count=false]', 'recipes-list', 'get',
+                '/api/recipes/', {'count': 'false'},
+            ),
+            Case(
+                'recipes-list[cursor]', 'recipes-list', 'get',
+                '/api/recipes/', {'cursor': ''},
+            ),
+        ]
+        for size in range(len(filters) + 1):
+            for names in combinations(filters, size):
+                cases.append(Case(
+                    f'recipes-list[{",".join(names)}]' if names
+                    else 'recipes-list',
+                    'recipes-list', 'get', '/api/recipes/',
+                    {name: filters[name] for name in names},
+                ))
+        own = f'/api/recipes/{data["own"]}/'
+        recipe = f'/api/recipes/{data["recipe"]}/'
+        added = f'/api/recipes/{data["in_lists"]}/'
+        not_added = f'/api/recipes/{data["not_in_lists"]}/'
+        bulk = {'recipes': data['bulk'][:BULK_SIZE]}
+        subscribed = f'/api/users/{data["subscribed"]}/subscribe/'
+        unsubscribed = f'/api/users/{data["unsubscribed"]}/subscribe/'
+        return cases + [
+            Case('api-root', 'api-root', 'get', '/api/'),
+            Case('tags-list', 'tags-list', 'get', '/api/tags/'),
+            Case(
+                'tags-detail', 'tags-detail', 'get',
+                f'/api/tags/{data["tag"]}/',
+            ),
+            Case(
+                'ingredients-list', 'ingredients-list', 'get',
+                '/api/ingredients/',
+            ),
+            Case(
+                'ingredients-list[name]', 'ingredients-list', 'get',
+                '/api/ingredients/', {'name': data['search']},
+            ),
+            Case(
+                'ingredients-detail', 'ingredients-detail', 'get',
+                f'/api/ingredients/{data["ingredient"]}/',
+            ),
+            Case('recipes-detail', 'recipes-detail', 'get', recipe),
+            Case('recipes-feed', 'recipes-feed', 'get', '/api/recipes/feed/'),
+            Case(
+                'recipes-what-can-i-cook', 'recipes-what-can-i-cook', 'get',
+                '/api/recipes/what_can_i_cook/',
+                {'ingredients': ','.join(
+                    str(item['id'])
+                    for item in data['payload']['ingredients'][:3]
+                )},
+            ),
+            Case(
+                'recipes-detail[anonymous]', 'recipes-detail', 'get', recipe,
+                anonymous=True,
+            ),
+            Case(
+                'recipes-create', 'recipes-list', 'post', '/api/recipes/',
+                dict(data['payload'], name='benchmark-create'), 201,
+            ),
+            Case(
+                'recipes-update', 'recipes-detail', 'patch', own,
+                dict(data['payload'], cooking_time=20),
+            ),
+            Case('recipes-delete', 'recipes-detail', 'delete', own, None, 204),
+            Case(
+                'recipes-get-link', 'recipes-get-link', 'get',
+                f'{recipe}get-link/',
+            ),
+            Case(
+                'recipes-favorite[post]', 'recipes-favorite', 'post',
+                f'{not_added}favorite/', None, 201,
+            ),
+            Case(
+                'recipes-favorite[delete]', 'recipes-favorite', 'delete',
+                f'{added}favorite/', None, 204,
+            ),
+            Case(
+                'recipes-shopping-cart[post]', 'recipes-shopping-cart', 'post',
+                f'{not_added}shopping_cart/', None, 201,
+            ),
+            Case(
+                'recipes-shopping-cart[delete]', 'recipes-shopping-cart',
+                'delete', f'{added}shopping_cart/', None, 204,
+            ),
+            Case(
+                'recipes-favorite-bulk[post]', 'recipes-favorite-bulk', 'post',
+                '/api/recipes/favorite/', bulk, 201,
+            ),
+            Case(
+                'recipes-favorite-bulk[delete]', 'recipes-favorite-bulk',
+                'delete', '/api/recipes/favorite/', bulk,
+            ),
+            Case(
+                'recipes-shopping-cart-bulk[post]',
+                'recipes-shopping-cart-bulk', 'post',
+                '/api/recipes/shopping_cart/', bulk, 201,
+            ),
+            Case(
+                'recipes-shopping-cart-bulk[delete]',
+                'recipes-shopping-cart-bulk', 'delete',
+                '/api/recipes/shopping_cart/', bulk,
+            ),
+            Case(
+                'recipes-clear-shopping-cart', 'recipes-clear-shopping-cart',
+                'delete', '/api/recipes/shopping_cart/clear/', None, 204,
+            ),
+            Case(
+                'recipes-download-shopping-cart[txt]',
+                'recipes-download-shopping-cart', 'get',
+                '/api/recipes/download_shopping_cart/',
+            ),
+            Case(
+                'recipes-download-shopping-cart[csv]',
+                'recipes-download-shopping-cart', 'get',
+                '/api/recipes/download_shopping_cart/', {'file_format': 'csv'},
+            ),
+            Case(
+                'users-list', 'users-list', 'get', '/api/users/',
+                anonymous=True,
+            ),
+            Case(
+                'users-create', 'users-list', 'post', '/api/users/',
+                {
+                    'email': 'benchmark-new@example.com',
+                    'username': 'benchmark-new',
+                    'first_name': 'Benchmark',
+                    'last_name': 'New',
+                    'password': BENCHMARK_PASSWORD,
+                },
+                201, True,
+            ),
+            Case(
+                'users-detail', 'users-detail', 'get',
+                f'/api/users/{data["author"]}/',
+            ),
+            Case('users-me', 'users-me', 'get', '/api/users/me/'),
+            Case(
+                'users-avatar[put]', 'users-avatar', 'put',
+                '/api/users/me/avatar/', {'avatar': data['image']},
+            ),
+            Case(
+                'users-avatar[delete]', 'users-avatar', 'delete',
+                '/api/users/me/avatar/', None, 204,
+            ),
+            Case(
+                'users-set-password', 'users-set-password', 'post',
+                '/api/users/set_password/',
+                {
+                    'current_password': BENCHMARK_PASSWORD,
+                    'new_password': BENCHMARK_PASSWORD[::-1],
+                },
+                204,
+            ),
+            Case(
+                'users-subscriptions', 'users-subscriptions', 'get',
+                '/api/users/subscriptions/',
+            ),
+            Case(
+                'users-subscriptions[recipes_limit]', 'users-subscriptions',
+                'get', '/api/users/subscriptions/', {'recipes_limit': 3},
+            ),
+            Case(
+                'users-subscribe[post]', 'users-subscribe', 'post',
+                unsubscribed, None, 201,
+            ),
+            Case(
+                'users-subscribe[delete]', 'users-subscribe', 'delete',
+                subscribed, None, 204,
+            ),
+            Case(
+                'login', 'login', 'post', '/api/auth/token/login/',
+                {'email': BENCHMARK_EMAIL, 'password': BENCHMARK_PASSWORD},
+                anonymous=True,
+            ),
+            Case(
+                'logout', 'logout', 'post', '/api/auth/token/logout/',
+                None, 204,
+            ),
+            Case('metrics', 'metrics', 'get', '/api/metrics/', admin=True),
+        ]
+
+    def request(self, client, case):
+        """Выполняет запрос в точке сохранения, которая затем откатывается."""
+        timings = RequestTimings()
+        with transaction.atomic():
+            with connection.execute_wrapper(timings.execute):
+                started = time.perf_counter()
+                if case.method == 'get':
+                    response = client.get(case.path, case.data)
+                else:
+                    response = getattr(client, case.method)(
+                        case.path, case.data, format='json'
+                    )
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return response, elapsed, timings
+
+    def measure(self, clients, case):
+        client = clients['admin' if case.admin else case.anonymous]
+        for _ in range(self.options['warmup']):
+            self.request(client, case)
+        timings, sql_timings = [], []
+        for _ in range(self.options['repeat']):
+            response, elapsed, request_timings = self.request(client, case)
+            timings.append(elapsed)
+            sql_timings.append(request_timings.durations['db'])
+        tracemalloc.start()
+        try:
+            self.request(client, case)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        if response.status_code != case.status:
+            self.stderr.write(
+                f'{case.name}: ожидался статус {case.status}, '
+                f'получен {response.status_code}'
+            )
+        return {
+            'route': case.route,
+            'method': case.method.upper(),
+            'status': response.status_code,
+            'p50_ms': percentile(timings, 50) * 1000,
+            'p95_ms': percentile(timings, 95) * 1000,
+            'p99_ms': percentile(timings, 99) * 1000,
+            'queries': request_timings.queries,
+            'sql_ms': statistics.median(sql_timings) * 1000,
+            'peak_kb': peak / 1024,
+        }
+
+    def compare(self, results, baseline_path):
+        """Возвращает число регрессий относительно эталона."""
+        with open(baseline_path, encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+        growth = 1 + self.options['threshold']
+        regressions = 0
+        for name, result in results.items():
+            base = baseline.get(name)
+            if base is None:
+                self.stdout.write(f'{name}: нет в эталоне')
+                continue
+            problems = []
+            if result['queries'] > base['queries']:
+                problems.append(
+                    f'запросов {base["queries"]} -> {result["queries"]}'
+                )
+            for metric in ('p95_ms', 'peak_kb'):
+                if result[metric] > base[metric] * growth:
+                    problems.append(
+                        f'{metric} {base[metric]:.1f} -> '
+                        f'{result[metric]:.1f}'
+                    )
+            if problems:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(
+                    f'{name}: {"; ".join(problems)}'
+                ))
+        return regressions
+
+    def handle(self, *args, **options):
+        self.options = options
+        if options['scale']:
+            call_command(
+                'seed_load', scale=options['scale'], seed=options['seed']
+            )
+        only = re.compile(options['only']) if options['only'] else None
+        results = {}
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root,
+            ALLOWED_HOSTS=['testserver'],
+        ), transaction.atomic():
+            client, data = self.prepare()
+            cases = self.build_cases(data)
+            uncovered = (
+                set(route_names(urlpatterns)) - SKIPPED_ROUTES
+                - {case.route for case in cases}
+            )
+            if uncovered:
+                self.stderr.write(
+                    f'Маршруты без замеров: {", ".join(sorted(uncovered))}'
+                )
+            clients = {False: client, True: APIClient(), 'admin': APIClient()}
+            clients['admin'].force_authenticate(data['admin'])
+            width = max(len(case.name) for case in cases)
+            self.stdout.write(
+                f'{"замер":<{width}} {"p50":>8} {"p95":>8} {"p99":>8} '
+                f'{"запросов":>9} {"SQL мс":>8} {"пик КБ":>9}'
+            )
+            for case in cases:
+                if only and not only.search(case.name):
+                    continue
+                result = results[case.name] = self.measure(clients, case)
+                self.stdout.write(
+                    f'{case.name:<{width}} {result["p50_ms"]:>8.2f} '
+                    f'{result["p95_ms"]:>8.2f} {result["p99_ms"]:>8.2f} '
+                    f'{result["queries"]:>9} {result["sql_ms"]:>8.2f} '
+                    f'{result["peak_kb"]:>9.1f}'
+                )
+            meta = {
+                'created': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'repeat': options['repeat'],
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+            }
+            transaction.set_rollback(True)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(
+                    {'meta': meta, 'results': results},
+                    file,
+                    ensure_ascii=False,
+                    indent=2,
+                )
+        if options['compare']:
+            regressions = self.compare(results, options['compare'])
+            if regressions:
+                raise CommandError(f'Найдено регрессий: {regressions}')
+            self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
@@ -0,0 +1,107 @@
+import statistics
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import Ingredient, Recipe
+from recipes.search import get_backend, search_baseline, search_recipes
+
+DEFAULT_QUERIES_COUNT = 5
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение полнотекстового поиска рецептов с поиском '
+        'через icontains'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            type=float,
+            help='Перед замером сгенерировать данные командой seed_load '
+                 '(1 — миллион рецептов).',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--queries',
+            help='Запросы через запятую. По умолчанию — названия самых '
+                 'популярных продуктов.',
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=6,
+            help='Размер первой страницы выдачи.',
+        )
+
+    def get_queries(self, queries):
+        if queries:
+            return [query.strip() for query in queries.split(',')]
+        return [
+            name.split()[0]
+            for name in Ingredient.objects.order_by(
+                '-recipes_count'
+            ).values_list('name', flat=True)[:DEFAULT_QUERIES_COUNT]
+        ]
+
+    def measure(self, search, query, limit, repeat):
+        """Медиана времени первой страницы и числа найденных, в мс."""
+        page, count = [], []
+        for _ in range(repeat):
+            recipes = search(
+                Recipe.objects.order_by('-pub_date'), query
+            )
+            started = time.perf_counter()
+            list(recipes.values_list('pk', flat=True)[:limit])
+            page.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            matches = recipes.count()
+            count.append(time.perf_counter() - started)
+        return (
+            matches,
+            statistics.median(page) * 1000,
+            statistics.median(count) * 1000,
+        )
+
+    def handle(self, *args, **options):
+        if options['scale']:
+            call_command(
+                'seed_load',
+                scale=options['scale'],
+                seed=options['seed'],
+                stdout=self.stdout,
+            )
+        backend = get_backend()
+        if backend is None:
+            raise CommandError(
+                'Полнотекстовый поиск для этой базы не поддерживается.'
+            )
+        queries = self.get_queries(options['queries'])
+        if not queries:
+            raise CommandError('Нет запросов для замера.')
+        self.stdout.write(
+            f'Рецептов: {Recipe.objects.count()}, поиск: {backend}'
+        )
+        self.stdout.write(
+            f'{"запрос":<20} {"способ":<10} {"найдено":>9} '
+            f'{"страница, мс":>13} {"count, мс":>10}'
+        )
+        for query in queries:
+            results = {}
+            for name, search in (
+                ('icontains', search_baseline),
+                (backend, search_recipes),
+            ):
+                results[name] = self.measure(
+                    search, query, options['limit'], options['repeat']
+                )
+                matches, page, count = results[name]
+                self.stdout.write(
+                    f'{query[:20]:<20} {name:<10} {matches:>9} '
+                    f'{page:>13.1f} {count:>10.1f}'
+                )
+            speedup = results['icontains'][1] / max(results[backend][1], 1e-6)
+            self.stdout.write(f'{"":<20} ускорение страницы: {speedup:.1f}x')
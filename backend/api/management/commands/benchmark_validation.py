@@ -0,0 +1,87 @@
+import base64
+import io
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from api.serializers import RecipeCreateUpdateSerializer
+from recipes.models import Ingredient, Tag
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер времени и числа запросов при проверке рецепта '
+        'в зависимости от числа продуктов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='10,100,1000,5000',
+            help='Числа продуктов в рецепте через запятую.',
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        buffer = io.BytesIO()
+        Image.new('RGB', (1, 1)).save(buffer, 'PNG')
+        image = 'data:image/png;base64,' + base64.b64encode(
+            buffer.getvalue()
+        ).decode()
+        with transaction.atomic():
+            ingredients = Ingredient.objects.bulk_create(
+                Ingredient(
+                    name=f'benchmark-{index}',
+                    measurement_unit='г',
+                    search_name=f'benchmark-{index}',
+                )
+                for index in range(sizes[-1])
+            )
+            tag = Tag.objects.create(name='benchmark', slug='benchmark')
+            if not all(ingredient.pk for ingredient in ingredients):
+                ingredients = Ingredient.objects.filter(
+                    name__startswith='benchmark-'
+                )
+            ingredient_ids = [ingredient.pk for ingredient in ingredients]
+            self.stdout.write(
+                f'{"продуктов":>10} {"запросов":>9} {"мс":>10} '
+                f'{"прирост мкс/шт":>15}'
+            )
+            previous_size, previous_elapsed = 0, 0
+            for size in sizes:
+                payload = {
+                    'name': 'benchmark',
+                    'text': 'benchmark',
+                    'cooking_time': 1,
+                    'image': image,
+                    'tags': [tag.pk],
+                    'ingredients': [
+                        {'id': ingredient_id, 'amount': 1}
+                        for ingredient_id in ingredient_ids[:size]
+                    ],
+                }
+                timings = []
+                for _ in range(options['repeat']):
+                    serializer = RecipeCreateUpdateSerializer(data=payload)
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        serializer.is_valid(raise_exception=True)
+                        timings.append(time.perf_counter() - started)
+                elapsed = min(timings)
+                marginal = (
+                    (elapsed - previous_elapsed) / (size - previous_size)
+                )
+                previous_size, previous_elapsed = size, elapsed
+                self.stdout.write(
+                    f'{size:>10} {len(queries):>9} {elapsed * 1000:>10.2f} '
+                    f'{marginal * 1e6:>15.2f}'
+                )
+            transaction.set_rollback(True)
+        self.stdout.write(
+            'При линейной сложности прирост времени на продукт '
+            'не растёт с размером рецепта.'
+        )
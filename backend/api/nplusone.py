@@ -0,0 +1,140 @@
+import logging
+import re
+import sys
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.fields import Field
+from rest_framework.serializers import BaseSerializer
+
+from .constants import NPLUSONE_STACK_DEPTH, NPLUSONE_TEMPLATE_LENGTH
+
+logger = logging.getLogger(__name__)
+
+SQL_NORMALIZERS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%s|\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE),
+     'IN (...)'),
+    (re.compile(r'\s+'), ' '),
+)
+IGNORED_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO')
+
+
+class QueryCheckError(AssertionError):
+    """Найден N+1 или превышен бюджет запросов."""
+
+
+def normalize_sql(sql):
+    """Приводит SQL к шаблону без значений параметров."""
+    for pattern, replacement in SQL_NORMALIZERS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def find_origin(frame):
+    """
+    Возвращает поле сериализатора, из-за которого выполнен запрос.
+
+    Ближайшее к запросу поле, не являющееся сериализатором, точнее всего
+    указывает на источник (SerializerMethodField, SlugRelatedField).
+    Если такого нет, берётся вложенный сериализатор, а затем строка
+    кода проекта.
+    """
+    serializer_origin = code_origin = None
+    for _ in range(NPLUSONE_STACK_DEPTH):
+        if frame is None:
+            break
+        # type(), а не isinstance(): у ленивых объектов (request.user)
+        # isinstance() читает __class__ и выполняет отложенный запрос.
+        owner = type(frame.f_locals.get('self'))
+        if issubclass(owner, Field) and frame.f_locals['self'].field_name:
+            field = frame.f_locals['self']
+            origin = f'{type(field.parent).__name__}.{field.field_name}'
+            if not issubclass(owner, BaseSerializer):
+                return origin
+            serializer_origin = serializer_origin or origin
+        filename = frame.f_code.co_filename
+        if (
+            code_origin is None
+            and filename.startswith(str(settings.BASE_DIR))
+            and filename != __file__
+        ):
+            code_origin = f'{filename}:{frame.f_lineno}'
+        frame = frame.f_back
+    return serializer_origin or code_origin or 'неизвестно'
+
+
+class QueryRecorder:
+    """Собирает шаблоны запросов и их источники за время запроса."""
+
+    def __init__(self):
+        self.templates = Counter()
+        self.origins = defaultdict(Counter)
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith(IGNORED_STATEMENTS):
+            template = normalize_sql(sql)
+            self.templates[template] += 1
+            self.origins[template][find_origin(sys._getframe(1))] += 1
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self):
+        return sum(self.templates.values())
+
+    def repeats(self, threshold):
+        """Шаблоны, выполненные не менее threshold раз."""
+        return [
+            (template, count, self.origins[template].most_common(1)[0][0])
+            for template, count in self.templates.most_common()
+            if count >= threshold
+        ]
+
+
+class NPlusOneMiddleware:
+    """
+    Ищет повторяющиеся запросы и проверяет бюджет запросов маршрутов.
+
+    Включается настройкой NPLUSONE_MODE: "warn" пишет предупреждения в
+    лог, "raise" выбрасывает QueryCheckError, чтобы тест упал. Бюджеты
+    задаются в QUERY_BUDGETS по имени маршрута и HTTP-методу: запись
+    обычно дороже чтения. Настройки читаются при каждом запросе,
+    поэтому их можно переопределять в тестах.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = getattr(settings, 'NPLUSONE_MODE', 'off')
+        if mode not in ('warn', 'raise'):
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        match = request.resolver_match
+        route = match.view_name if match else request.path
+        problems = [
+            f'{route}: {count} одинаковых запросов из {origin}: '
+            f'{template[:NPLUSONE_TEMPLATE_LENGTH]}'
+            for template, count, origin in recorder.repeats(
+                getattr(settings, 'NPLUSONE_THRESHOLD', 3)
+            )
+        ]
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(
+            (route, request.method)
+        )
+        if budget is not None and recorder.count > budget:
+            problems.append(
+                f'{route}: {recorder.count} запросов при бюджете {budget}'
+            )
+        if problems and mode == 'raise':
+            raise QueryCheckError('\n'.join(problems))
+        for problem in problems:
+            logger.warning(problem)
+        return response
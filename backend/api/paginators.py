@@ -1,8 +1,154 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class PaginatorWithLimit(PageNumberPagination):
-    """Пагинатор с атрибутом лимита количества выведенных страниц."""
+    """
+    Пагинатор с атрибутом лимита количества выведенных страниц.
+
+    Помимо постраничного режима поддерживает:
+    - "count=false" — страницы без подсчёта общего числа объектов;
+    - "cursor" — пагинацию по ключу для view с атрибутом
+      keyset_ordering, без COUNT и OFFSET.
+    """
 
     page_size_query_param = 'limit'
     page_size = 6
+    count_query_param = 'count'
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.mode = 'page'
+        self.keyset_ordering = getattr(view, 'keyset_ordering', None)
+        if (
+            self.keyset_ordering
+            and self.cursor_query_param in request.query_params
+        ):
+            self.mode = 'cursor'
+            return self.paginate_keyset(queryset, request)
+        if request.query_params.get(self.count_query_param) in (
+            'false', '0'
+        ):
+            self.mode = 'nocount'
+            return self.paginate_without_count(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.mode == 'page':
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('count', None),
+            ('next', self.next_link),
+            ('previous', self.previous_link),
+            ('results', data),
+        ]))
+
+    def paginate_without_count(self, queryset, request):
+        """Отдаёт страницу, не выполняя COUNT по всей выборке."""
+        page_size = self.get_page_size(request)
+        try:
+            page_number = int(
+                request.query_params.get(self.page_query_param, 1)
+            )
+        except ValueError:
+            page_number = 0
+        if page_number < 1:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message='Неверный номер страницы.'
+            ))
+        offset = (page_number - 1) * page_size
+        results = list(queryset[offset:offset + page_size + 1])
+        url = request.build_absolute_uri()
+        self.next_link = (
+            replace_query_param(
+                url, self.page_query_param, page_number + 1
+            )
+            if len(results) > page_size else None
+        )
+        self.previous_link = None
+        if page_number == 2:
+            self.previous_link = remove_query_param(
+                url, self.page_query_param
+            )
+        elif page_number > 2:
+            self.previous_link = replace_query_param(
+                url, self.page_query_param, page_number - 1
+            )
+        return results[:page_size]
+
+    def encode_cursor(self, obj):
+        position = [
+            obj._meta.get_field(field.lstrip('-')).value_to_string(obj)
+            for field in self.keyset_ordering
+        ]
+        return base64.urlsafe_b64encode(
+            json.dumps(position).encode()
+        ).decode()
+
+    def decode_cursor(self, queryset, cursor):
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(position) != len(self.keyset_ordering):
+                raise ValueError
+            return [
+                queryset.model._meta.get_field(field.lstrip('-')).to_python(
+                    value
+                )
+                for field, value in zip(self.keyset_ordering, position)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound('Неверный курсор.')
+
+    def paginate_keyset(self, queryset, request):
+        """
+        Отдаёт объекты, следующие за позицией из курсора.
+
+        Условие строится лексикографически по полям keyset_ordering,
+        поэтому запрос обслуживается составным индексом по тем же полям.
+        """
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.keyset_ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            position = self.decode_cursor(queryset, cursor)
+            condition = Q()
+            equal = {}
+            for field, value in zip(self.keyset_ordering, position):
+                name = field.lstrip('-')
+                lookup = 'lt' if field.startswith('-') else 'gt'
+                condition |= Q(**equal, **{f'{name}__{lookup}': value})
+                equal[name] = value
+            queryset = queryset.filter(condition)
+        results = list(queryset[:page_size + 1])
+        self.next_link = None
+        if len(results) > page_size:
+            self.next_link = replace_query_param(
+                request.build_absolute_uri(),
+                self.cursor_query_param,
+                self.encode_cursor(results[page_size - 1]),
+            )
+        self.previous_link = None
+        return results[:page_size]
+
+
+class KeysetPaginator(PaginatorWithLimit):
+    """
+    Пагинатор только по ключу, для лент без общего счётчика.
+
+    Первая страница запрашивается без параметра "cursor".
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.mode = 'cursor'
+        self.keyset_ordering = view.keyset_ordering
+        return self.paginate_keyset(queryset, request)
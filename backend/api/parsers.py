@@ -0,0 +1,136 @@
+import json
+import mimetypes
+from functools import partial
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http.multipartparser import (
+    MultiPartParser as DjangoMultiPartParser,
+    MultiPartParserError,
+)
+from django.utils.datastructures import MultiValueDict
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import BaseParser, DataAndFiles, MultiPartParser
+
+from .constants import MAX_IMAGE_UPLOAD_SIZE, UPLOAD_CHUNK_SIZE
+
+
+class ImageTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = (
+        f'Размер файла превышает {MAX_IMAGE_UPLOAD_SIZE // 1024 // 1024} МБ.'
+    )
+    default_code = 'image_too_large'
+
+
+class FormData(dict):
+    """
+    Поля формы с уже разобранными вложенными значениями.
+
+    DRF объединяет данные с файлами через copy() и update(); здесь из
+    MultiValueDict берётся по одному файлу на поле, а не список.
+    """
+
+    def copy(self):
+        return FormData(self)
+
+    def update(self, other):
+        if isinstance(other, MultiValueDict):
+            other = other.dict()
+        super().update(other)
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет файлы во временный файл и прерывает загрузку сверх лимита."""
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > MAX_IMAGE_UPLOAD_SIZE:
+            self.file.close()
+            raise ImageTooLarge
+        return super().receive_data_chunk(raw_data, start)
+
+
+class JSONFieldsMultiPartParser(MultiPartParser):
+    """
+    multipart/form-data, в котором вложенные поля переданы как JSON.
+
+    Поля json_fields принимаются строкой JSON ('[{"id": 1, "amount": 5}]')
+    или повторяющимися значениями ("tags=1&tags=2"); одно значение
+    без списка ("tags=1") становится списком из одного элемента.
+    """
+
+    json_fields = ('ingredients', 'tags')
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        meta = request.META.copy()
+        meta['CONTENT_TYPE'] = media_type
+        try:
+            data, files = DjangoMultiPartParser(
+                meta,
+                stream,
+                [LimitedUploadHandler(request)],
+                parser_context.get('encoding', settings.DEFAULT_CHARSET),
+            ).parse()
+        except MultiPartParserError as error:
+            raise ParseError(f'Ошибка разбора multipart: {error}')
+        result = FormData(data.dict())
+        for field in self.json_fields:
+            values = data.getlist(field)
+            if len(values) != 1:
+                if values:
+                    result[field] = values
+                continue
+            try:
+                value = json.loads(values[0])
+            except ValueError:
+                raise ParseError(f'Поле "{field}" должно содержать JSON.')
+            result[field] = value if isinstance(value, list) else [value]
+        return DataAndFiles(result, files)
+
+
+class RawImageParser(BaseParser):
+    """
+    Изображение, переданное телом запроса с Content-Type image/*.
+
+    Тело пишется во временный файл порциями и попадает в поле view
+    raw_upload_field.
+    """
+
+    media_type = 'image/*'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        field = getattr(parser_context['view'], 'raw_upload_field', None)
+        if field is None:
+            raise ParseError(
+                'Загрузка файла телом запроса не поддерживается.'
+            )
+        try:
+            length = int(
+                parser_context['request'].META.get('CONTENT_LENGTH') or 0
+            )
+        except ValueError:
+            length = 0
+        if length > MAX_IMAGE_UPLOAD_SIZE:
+            raise ImageTooLarge
+        content_type = media_type.split(';')[0].strip()
+        upload = TemporaryUploadedFile(
+            f'upload{mimetypes.guess_extension(content_type) or ""}',
+            content_type,
+            0,
+            None,
+        )
+        for chunk in iter(partial(stream.read, UPLOAD_CHUNK_SIZE), b''):
+            upload.size += len(chunk)
+            if upload.size > MAX_IMAGE_UPLOAD_SIZE:
+                upload.close()
+                raise ImageTooLarge
+            upload.write(chunk)
+        upload.seek(0)
+        files = MultiValueDict({field: [upload]})
+        # Django закроет и удалит временный файл после ответа, как делает
+        # это для файлов multipart.
+        parser_context['request']._request._files = files
+        return DataAndFiles(FormData(), files)
@@ -1,3 +1,8 @@
+import uuid
+from collections import Counter
+
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
 from rest_framework import serializers
 from drf_extra_fields.fields import Base64ImageField
 from djoser.serializers import (
@@ -9,17 +14,73 @@ from recipes.models import (
     Ingredient,
     Recipe,
     RecipeIngredient,
+    ShoppingListItem,
     Subscriptions,
     Tag,
     User,
 )
 from recipes.constants import MIN_INGREDIENT_AMOUNT
+from recipes.images import get_srcset
+
+from .constants import BULK_RECIPES_MAX_LENGTH, COVERAGE_MAX_INGREDIENTS
+from .timing import TimedRepresentationMixin
+
+
+class SrcsetField(serializers.ReadOnlyField):
+    """
+    Уменьшенные копии изображения по форматам в виде строк srcset.
 
+    Пример: {"webp": "https://.../x_card.webp 480w, ..."}. Пока копии
+    не отмечены готовыми в поле <field>_renditions, поле пустое.
+    """
 
-class AvatarSerializer(serializers.ModelSerializer):
+    def __init__(self, kind, field, **kwargs):
+        self.kind = kind
+        self.field = field
+        super().__init__(source='*', **kwargs)
+
+    def to_representation(self, instance):
+        value = getattr(instance, self.field)
+        if not value or value.name != getattr(
+            instance, f'{self.field}_renditions'
+        ):
+            return {}
+        request = self.context.get('request')
+        return {
+            extension: ', '.join(
+                f'{request.build_absolute_uri(url) if request else url} '
+                f'{width}w'
+                for url, width in renditions
+            )
+            for extension, renditions in get_srcset(
+                value.name, self.kind, value.storage
+            ).items()
+        }
+
+
+class Base64OrFileImageField(Base64ImageField):
+    """
+    Изображение строкой base64 или загруженным файлом.
+
+    Файл из multipart или тела запроса уже лежит во временном файле и
+    проверяется Pillow без чтения в память; имя файла задаётся заново
+    по формату изображения.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, UploadedFile):
+            return super().to_internal_value(data)
+        data = serializers.ImageField.to_internal_value(self, data)
+        data.name = f'{uuid.uuid4()}.{data.image.format.lower()}'
+        return data
+
+
+class AvatarSerializer(
+    TimedRepresentationMixin, serializers.ModelSerializer
+):
     """Сериализатор для аватара."""
 
-    avatar = Base64ImageField()
+    avatar = Base64OrFileImageField()
 
     class Meta:
         model = User
@@ -36,43 +97,68 @@ class UserCreateSerializer(DjoserUserCreateSerializer):
         )
 
 
-class UserSerializer(DjoserUserSerializer):
+class UserSerializer(TimedRepresentationMixin, DjoserUserSerializer):
     """Сериализатор для представления пользователей."""
 
     is_subscribed = serializers.SerializerMethodField()
+    avatar_srcset = SrcsetField('avatar', 'avatar')
 
     class Meta(DjoserUserSerializer.Meta):
         fields = (
             'is_subscribed',
             'avatar',
+            'avatar_srcset',
             *DjoserUserSerializer.Meta.fields,
         )
 
     def get_is_subscribed(self, user):
         request = self.context.get('request')
-        return (
-            request and request.user.is_authenticated
-            and Subscriptions.objects.filter(
-                user=request.user, author=user
-            ).exists()
-        )
-
-
-class ShortRecipeSerializer(serializers.ModelSerializer):
+        if not (request and request.user.is_authenticated):
+            return False
+        if hasattr(user, 'is_subscribed'):
+            return user.is_subscribed
+        return Subscriptions.objects.filter(
+            user=request.user, author=user
+        ).exists()
+
+
+class ShortRecipeSerializer(
+    TimedRepresentationMixin, serializers.ModelSerializer
+):
     """Сериализатор для модели Recipe для списка подписок."""
 
+    image_srcset = SrcsetField('recipe', 'image')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_srcset', 'cooking_time')
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id рецептов для групповых операций."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_RECIPES_MAX_LENGTH,
+    )
+
+
+class IngredientIdsSerializer(serializers.Serializer):
+    """Сериализатор продуктов, которые есть у пользователя."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=COVERAGE_MAX_INGREDIENTS,
+    )
 
 
 class SubscriptionsSerializer(UserSerializer):
     """Сериализатор для подписок на авторов рецептов."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        source='recipes.count', read_only=True
-    )
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta(UserSerializer.Meta):
         model = User
@@ -82,16 +168,21 @@ class SubscriptionsSerializer(UserSerializer):
             'recipes_count',
         )
 
-    def get_recipes(self, recipe):
-        """Возращает рецепты согласно параметру "recipes_limit" в запросе."""
+    def get_recipes(self, user):
+        """
+        Возращает рецепты автора.
+
+        Ожидает, что рецепты уже ограничены параметром "recipes_limit"
+        и загружены во view в атрибут limited_recipes.
+        """
         return ShortRecipeSerializer(
-            recipe.recipes.all()[:int(
-                self.context.get('request').GET.get('recipes_limit', 10**10)
-            )], many=True, context=self.context
+            user.limited_recipes, many=True, context=self.context
         ).data
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(
+    TimedRepresentationMixin, serializers.ModelSerializer
+):
     """Сериализатор для модели Tag."""
 
     class Meta:
@@ -99,7 +190,9 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'slug')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(
+    TimedRepresentationMixin, serializers.ModelSerializer
+):
     """Сериализатор для модели Ingredient."""
 
     class Meta:
@@ -113,15 +206,9 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
     id = serializers.PrimaryKeyRelatedField(
         source='ingredient', read_only=True
     )
-    name = serializers.SlugRelatedField(
-        source='ingredient',
-        read_only=True,
-        slug_field='name'
-    )
-    measurement_unit = serializers.SlugRelatedField(
-        source='ingredient',
-        read_only=True,
-        slug_field='measurement_unit'
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
     )
 
     class Meta:
@@ -130,11 +217,14 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 
 
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
-    """Сериализатор для создания ингредиентов."""
+    """
+    Сериализатор для создания ингредиентов.
 
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    Существование продуктов проверяется одним запросом в
+    RecipeCreateUpdateSerializer.validate.
+    """
+
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
@@ -151,7 +241,9 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
         return value
 
 
-class RecipeRetrieveSerializer(serializers.ModelSerializer):
+class RecipeRetrieveSerializer(
+    TimedRepresentationMixin, serializers.ModelSerializer
+):
     """Сериализатор для получения рецепта с использованием slug."""
 
     author = UserSerializer(read_only=True)
@@ -161,6 +253,7 @@ class RecipeRetrieveSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_srcset = SrcsetField('recipe', 'image')
 
     class Meta:
         model = Recipe
@@ -171,6 +264,7 @@ class RecipeRetrieveSerializer(serializers.ModelSerializer):
             'tags',
             'text',
             'image',
+            'image_srcset',
             'cooking_time',
             'author',
             'is_favorited',
@@ -181,28 +275,55 @@ class RecipeRetrieveSerializer(serializers.ModelSerializer):
     def get_is_favorited(self, recipe):
         """Проверяет, добавлен ли рецепт в избранное пользователем."""
         user = self.context.get('request').user
-        return (
-            user.is_authenticated
-            and recipe.favorites.filter(user=user).exists()
-        )
+        if not user.is_authenticated:
+            return False
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
+        return recipe.favorites.filter(user=user).exists()
 
     def get_is_in_shopping_cart(self, recipe):
         """Проверяет, добавлен ли рецепт в список покупок пользователем."""
         user = self.context.get('request').user
-        return (
-            user.is_authenticated
-            and recipe.shoppingcarts.filter(user=user).exists()
+        if not user.is_authenticated:
+            return False
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
+        return recipe.shoppingcarts.filter(user=user).exists()
+
+
+class CookableRecipeSerializer(RecipeRetrieveSerializer):
+    """
+    Рецепт в подборе по продуктам.
+
+    coverage — доля продуктов рецепта, которые есть у пользователя,
+    missing — число недостающих. Значения берутся из контекста.
+    """
+
+    coverage = serializers.SerializerMethodField()
+    missing = serializers.SerializerMethodField()
+
+    class Meta(RecipeRetrieveSerializer.Meta):
+        fields = RecipeRetrieveSerializer.Meta.fields + (
+            'coverage',
+            'missing',
         )
+        read_only_fields = fields
+
+    def get_coverage(self, recipe):
+        matched, total = self.context['coverage'][recipe.pk]
+        return round(matched / total, 4)
+
+    def get_missing(self, recipe):
+        matched, total = self.context['coverage'][recipe.pk]
+        return total - matched
 
 
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания рецепта с использованием id."""
 
     ingredients = RecipeIngredientCreateSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True
-    )
-    image = Base64ImageField(required=True)
+    tags = serializers.ListField(child=serializers.IntegerField())
+    image = Base64OrFileImageField(required=True)
 
     class Meta:
         model = Recipe
@@ -218,7 +339,18 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         read_only_fields = ('author',)
 
     def to_representation(self, instance):
-        """Возвращает данные сериализатора для GET-запроса."""
+        """
+        Возвращает данные сериализатора для GET-запроса.
+
+        Созданный или изменённый рецепт перечитывается через выборку
+        представления, чтобы автор, теги и продукты подгрузились заранее,
+        а не по запросу на каждый. Рецепты из списка уже подгружены.
+        """
+        view = self.context.get('view')
+        if view is not None and not getattr(
+            instance, '_prefetched_objects_cache', None
+        ):
+            instance = view.get_queryset().get(pk=instance.pk)
         return RecipeRetrieveSerializer(instance, context=self.context).data
 
     def validate_image(self, value):
@@ -231,58 +363,105 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def validate_items(items, model, field_name):
+        """
+        Проверяет список id одним запросом к базе.
+
+        Возвращает найденные объекты в виде {id: объект}.
+        """
         if not items:
             raise serializers.ValidationError(
                 {field_name: f'Поле {field_name} не может быть пустым.'}
             )
-        existing_items = model.objects.filter(
-            id__in=items
-        ).values_list('id', flat=True)
-        missing_items = set(items) - set(existing_items)
+        existing_items = model.objects.in_bulk(items)
+        missing_items = set(items) - existing_items.keys()
         if missing_items:
             raise serializers.ValidationError(
                 {field_name: f'Элемент(ы) с id {missing_items} не существует!'}
             )
-        non_unique_ids = set(
-            item for item in items if items.count(item) > 1
-        )
+        non_unique_ids = {
+            item for item, count in Counter(items).items() if count > 1
+        }
         if non_unique_ids:
             raise serializers.ValidationError(
                 {field_name: f'Элементы с id {non_unique_ids} не уникальны!'}
             )
+        return existing_items
 
     def validate(self, data):
-        """Проверяет поля теги и ингредиенты."""
-        tags = self.initial_data.get('tags')
-        ingredients = self.initial_data.get('ingredients')
+        """
+        Проверяет поля теги и ингредиенты.
+
+        Найденные объекты подставляются в данные вместо id и
+        используются при записи рецепта.
+        """
+        tags = data.get('tags')
+        ingredients = data.get('ingredients')
         if not ingredients:
             raise serializers.ValidationError(
                 'Поле "ingredients" не может быть пустым.'
             )
-        ingredients_ids = [item['id'] for item in ingredients]
-        self.validate_items(
-            ingredients_ids,
+        existing_ingredients = self.validate_items(
+            [item['id'] for item in ingredients],
             model=Ingredient,
             field_name='ingredients',
         )
-        self.validate_items(
+        existing_tags = self.validate_items(
             tags,
             model=Tag,
             field_name='tags',
         )
+        data['ingredients'] = [
+            {**item, 'id': existing_ingredients[item['id']]}
+            for item in ingredients
+        ]
+        data['tags'] = [existing_tags[tag_id] for tag_id in tags]
         return data
 
-    def set_ingredients(self, recipe, ingredients):
-        """Добавляет ингредиенты в промежуточную модель."""
+    def set_ingredients(self, recipe, ingredients, created=False):
+        """
+        Приводит продукты рецепта к переданному списку.
+
+        Удаляются, обновляются и добавляются только отличающиеся строки.
+        Возвращает прежний состав в виде {ingredient_id: amount}.
+        """
+        amounts = {
+            ingredient['id'].pk: ingredient['amount']
+            for ingredient in ingredients
+        }
+        current = {} if created else {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe
+            )
+        }
+        old_amounts = {
+            ingredient_id: recipe_ingredient.amount
+            for ingredient_id, recipe_ingredient in current.items()
+        }
+        removed = current.keys() - amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, recipe_ingredient in current.items():
+            amount = amounts.get(ingredient_id, recipe_ingredient.amount)
+            if recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        RecipeIngredient.objects.bulk_update(changed, ('amount',))
         RecipeIngredient.objects.bulk_create(
             RecipeIngredient(
+                recipe=recipe,
                 ingredient=ingredient['id'],
                 amount=ingredient['amount'],
-                recipe=recipe,
             )
             for ingredient in ingredients
+            if ingredient['id'].pk not in current
         )
+        return old_amounts, amounts
 
+    @transaction.atomic
     def create(self, validated_data):
         """Создаёт новый рецепт."""
         ingredients = validated_data.pop('ingredients')
@@ -290,15 +469,41 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         author = self.context.get('request').user
         recipe = Recipe.objects.create(author=author, **validated_data)
         recipe.tags.set(tags)
-        self.set_ingredients(recipe, ingredients)
+        _, amounts = self.set_ingredients(recipe, ingredients, created=True)
+        Recipe.objects.author_changed(None, author.pk)
+        Recipe.objects.relations_changed(
+            (), [tag.pk for tag in tags], (), amounts
+        )
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Обновляет существующий рецепт."""
-        ingredients_data = validated_data.pop('ingredients')
-        tags_data = validated_data.pop('tags')
+        """
+        Обновляет существующий рецепт.
+
+        Рецепт перечитывается с блокировкой строки на время транзакции и
+        сохраняется один раз, поэтому в базу не попадают значения,
+        загруженные до блокировки. У тегов и продуктов меняются только
+        отличающиеся записи.
+
+        Блокировка не берёт ключ строки (FOR NO KEY UPDATE): добавление
+        рецепта в избранное и корзину проверяет внешний ключ под
+        KEY SHARE и, заблокировав пользователя, не должно ждать рецепт,
+        пока изменение рецепта ждёт того же пользователя.
+        """
+        ingredients = validated_data.pop('ingredients')
+        tags = validated_data.pop('tags')
+        instance = Recipe.objects.select_for_update(no_key=True).get(
+            pk=instance.pk
+        )
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
         instance.save()
-        instance.ingredients.clear()
-        self.set_ingredients(instance, ingredients_data)
-        instance.tags.set(tags_data)
-        return super().update(instance, validated_data)
+        old_tags = set(instance.tags.values_list('pk', flat=True))
+        instance.tags.set(tags)
+        old_amounts, amounts = self.set_ingredients(instance, ingredients)
+        ShoppingListItem.objects.update_recipe(instance, old_amounts, amounts)
+        Recipe.objects.relations_changed(
+            old_tags, [tag.pk for tag in tags], old_amounts, amounts
+        )
+        return instance
@@ -0,0 +1,118 @@
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingListItem,
+    User,
+)
+
+
+class BulkRecipesTests(TestCase):
+    """Добавление и удаление нескольких рецептов одним запросом."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='x'
+        )
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        ingredient = Ingredient.objects.create(
+            name='Молоко', measurement_unit='мл'
+        )
+        cls.recipes = []
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                name=f'Рецепт {i}',
+                author=author,
+                text='Приготовить.',
+                image='recipe_images/test.png',
+                cooking_time=10,
+            )
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=100
+            )
+            cls.recipes.append(recipe)
+        cls.missing = max(recipe.pk for recipe in cls.recipes) + 1
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_add(self):
+        first, second, third = (recipe.pk for recipe in self.recipes)
+        Favorite.objects.add_recipe(self.user, self.recipes[0])
+        response = self.client.post(
+            reverse('api:recipes-favorite-bulk'),
+            {'recipes': [third, first, second, self.missing]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {
+            'created': [second, third],
+            'existing': [first],
+            'missing': [self.missing],
+        })
+        self.assertEqual(Recipe.objects.get(pk=second).favorites_count, 1)
+
+    def test_add_only_existing(self):
+        Favorite.objects.add_recipe(self.user, self.recipes[0])
+        response = self.client.post(
+            reverse('api:recipes-favorite-bulk'),
+            {'recipes': [self.recipes[0].pk]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], [])
+
+    def test_delete(self):
+        first, second, _ = (recipe.pk for recipe in self.recipes)
+        ShoppingCart.objects.add_recipe(self.user, self.recipes[0])
+        response = self.client.delete(
+            reverse('api:recipes-shopping-cart-bulk'),
+            {'recipes': [first, second, self.missing]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'deleted': [first],
+            'missing': [second, self.missing],
+        })
+        self.assertFalse(ShoppingListItem.objects.filter(user=self.user))
+
+    def test_invalid_payload(self):
+        for payload in ({}, {'recipes': []}, {'recipes': ['x']}):
+            with self.subTest(payload=payload):
+                response = self.client.post(
+                    reverse('api:recipes-favorite-bulk'),
+                    payload,
+                    format='json',
+                )
+                self.assertEqual(response.status_code, 400)
+
+    def test_clear_shopping_cart(self):
+        ShoppingCart.objects.add_recipes(
+            self.user, [recipe.pk for recipe in self.recipes]
+        )
+        self.assertEqual(
+            ShoppingListItem.objects.get(user=self.user).amount, 300
+        )
+        response = self.client.delete(
+            reverse('api:recipes-clear-shopping-cart')
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(ShoppingCart.objects.filter(user=self.user))
+        self.assertFalse(ShoppingListItem.objects.filter(user=self.user))
+
+    def test_anonymous(self):
+        response = APIClient().delete(
+            reverse('api:recipes-clear-shopping-cart')
+        )
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,98 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from recipes.cache import (
+    forget_reference_data_version,
+    get_recipe_list_version,
+    get_recipe_version,
+    get_reference_data_version,
+)
+from recipes.models import Recipe, Tag, User
+
+
+class ReferenceDataCacheTests(TestCase):
+    """Кэш справочников отвечает 304 без запросов и сбрасывается."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Tag.objects.create(name='Завтрак', slug='breakfast')
+
+    def setUp(self):
+        forget_reference_data_version()
+        cache.clear()
+        self.client = APIClient()
+        self.url = reverse('api:tags-list')
+
+    def test_not_modified_without_queries(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_tag_change(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Обед', slug='lunch')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()), 2)
+
+
+class AnonymousRecipeCacheTests(TestCase):
+    """Изменение рецепта сбрасывает только ответы, где он есть."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        cls.changed, cls.other = (
+            Recipe.objects.create(
+                name=name,
+                author=author,
+                text='Приготовить.',
+                image='recipe_images/test.png',
+                cooking_time=10,
+            )
+            for name in ('Каша', 'Суп')
+        )
+
+    def setUp(self):
+        forget_reference_data_version()
+        cache.clear()
+        # Версии кэша уже созданы, как на работающем сервере.
+        get_reference_data_version()
+        get_recipe_list_version()
+        for recipe in (self.changed, self.other):
+            get_recipe_version(recipe.pk)
+        self.client = APIClient()
+
+    def get_name(self, recipe):
+        return self.client.get(
+            reverse('api:recipes-detail', args=(recipe.pk,))
+        ).json()['name']
+
+    def get_list_names(self):
+        return {
+            recipe['name']
+            for recipe in self.client.get(
+                reverse('api:recipes-list')
+            ).json()['results']
+        }
+
+    def test_edit_invalidates_affected_entries(self):
+        self.assertEqual(self.get_name(self.changed), 'Каша')
+        self.assertEqual(self.get_name(self.other), 'Суп')
+        self.assertEqual(self.get_list_names(), {'Каша', 'Суп'})
+        # Обход сигналов: кэш другого рецепта не должен сброситься.
+        Recipe.objects.filter(pk=self.other.pk).update(name='Борщ')
+        recipe = Recipe.objects.get(pk=self.changed.pk)
+        recipe.name = 'Овсянка'
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.save()
+        self.assertEqual(self.get_name(self.changed), 'Овсянка')
+        self.assertEqual(self.get_name(self.other), 'Суп')
+        self.assertEqual(self.get_list_names(), {'Овсянка', 'Борщ'})
@@ -0,0 +1,133 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.nplusone import NPlusOneMiddleware, QueryCheckError
+from recipes.cache import get_recipe_list_version, get_reference_data_version
+from recipes.models import Ingredient, Recipe, Subscriptions, Tag, User
+
+# Прозрачное изображение PNG 1×1.
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR4nGNgYGBgAAAABQABpfZFQAAAAABJRU5ErkJggg=='
+)
+
+
+class NPlusOneTests(TestCase):
+    """Проверка повторяющихся запросов и бюджетов маршрутов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='x'
+        )
+        tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        for number in range(5):
+            author = User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+                password='x',
+            )
+            Subscriptions.objects.subscribe(cls.user, author)
+            for i in range(3):
+                Recipe.objects.create(
+                    name=f'Рецепт {number}-{i}',
+                    author=author,
+                    text='Приготовить.',
+                    image='recipe_images/test.png',
+                    cooking_time=10,
+                ).tags.add(tag)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_checks_are_enabled_in_tests(self):
+        self.assertEqual(settings.NPLUSONE_MODE, 'raise')
+
+    def test_routes_fit_budgets(self):
+        recipe = Recipe.objects.first()
+        for url in (
+            reverse('api:recipes-list'),
+            reverse('api:recipes-detail', args=(recipe.pk,)),
+            reverse('api:users-subscriptions') + '?recipes_limit=2',
+            reverse('api:recipes-download-shopping-cart'),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_write_routes_use_own_budgets(self):
+        # Бюджет списка на чтение не распространяется на создание
+        # и изменение рецепта.
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Продукт {i}', measurement_unit='г'
+            )
+            for i in range(3)
+        ]
+        payload = {
+            'name': 'Каша',
+            'text': 'Сварить.',
+            'cooking_time': 10,
+            'image': IMAGE,
+            'tags': [Tag.objects.get().pk],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': 10}
+                for ingredient in ingredients
+            ],
+        }
+        with override_settings(MEDIA_ROOT=media_root, QUERY_BUDGETS={
+            ('api:recipes-list', 'GET'): 1,
+            ('api:recipes-detail', 'GET'): 1,
+        }):
+            response = self.client.post(
+                reverse('api:recipes-list'), payload, format='json'
+            )
+            self.assertEqual(response.status_code, 201)
+            response = self.client.patch(
+                reverse('api:recipes-detail', args=(response.data['id'],)),
+                {**payload, 'ingredients': payload['ingredients'][:1]},
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_anonymous_list_fits_budget(self):
+        # Версии кэша уже созданы, готового ответа в кэше нет.
+        get_reference_data_version()
+        get_recipe_list_version()
+        response = APIClient().get(reverse('api:recipes-list'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_budget_exceeded(self):
+        with override_settings(
+            QUERY_BUDGETS={('api:recipes-list', 'GET'): 1}
+        ):
+            with self.assertRaisesMessage(
+                QueryCheckError, 'api:recipes-list: 5 запросов при бюджете 1'
+            ):
+                self.client.get(reverse('api:recipes-list'))
+
+    def test_budget_in_warn_mode(self):
+        with override_settings(
+            NPLUSONE_MODE='warn',
+            QUERY_BUDGETS={('api:recipes-list', 'GET'): 1},
+        ), self.assertLogs('api.nplusone', 'WARNING'):
+            response = self.client.get(reverse('api:recipes-list'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_repeated_queries(self):
+        def get_response(request):
+            for user in User.objects.all():
+                list(user.recipes.all())
+
+        middleware = NPlusOneMiddleware(get_response)
+        with self.assertRaisesMessage(QueryCheckError, 'одинаковых запросов'):
+            middleware(RequestFactory().get('/n-plus-one/'))
@@ -0,0 +1,95 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe, Subscriptions, User
+
+
+class PaginationTests(TestCase):
+    """Страницы по курсору и без подсчёта отдают все рецепты по порядку."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='x'
+        )
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        Subscriptions.objects.subscribe(cls.user, author)
+        now = timezone.now()
+        # Рецепты 2–4 опубликованы одновременно.
+        for i, minutes in enumerate((10, 9, 5, 5, 5, 3, 1)):
+            recipe = Recipe.objects.create(
+                name=f'Рецепт {i}',
+                author=author,
+                text='Приготовить.',
+                image='recipe_images/test.png',
+                cooking_time=10,
+            )
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=now - timedelta(minutes=minutes)
+            )
+        cls.expected = list(
+            Recipe.objects.order_by('-pub_date', 'id').values_list(
+                'pk', flat=True
+            )
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def collect(self, url):
+        """Проходит страницы по ссылкам next и собирает id рецептов."""
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(response.data['count'])
+            self.assertLessEqual(len(response.data['results']), 3)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_cursor(self):
+        self.assertEqual(
+            self.collect(reverse('api:recipes-list') + '?cursor=&limit=3'),
+            self.expected,
+        )
+
+    def test_feed(self):
+        self.assertEqual(
+            self.collect(reverse('api:recipes-feed') + '?limit=3'),
+            self.expected,
+        )
+
+    def test_without_count(self):
+        ids = self.collect(
+            reverse('api:recipes-list') + '?count=false&limit=3'
+        )
+        self.assertCountEqual(ids, self.expected)
+        pub_dates = dict(Recipe.objects.values_list('pk', 'pub_date'))
+        self.assertEqual(
+            [pub_dates[pk] for pk in ids],
+            sorted(pub_dates.values(), reverse=True),
+        )
+
+    def test_previous_without_count(self):
+        response = self.client.get(
+            reverse('api:recipes-list') + '?count=false&limit=3&page=3'
+        )
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+        self.assertIn('page=2', response.data['previous'])
+
+    def test_invalid_cursor(self):
+        for cursor in ('x', 'WzFd'):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    reverse('api:recipes-list') + f'?cursor={cursor}'
+                )
+                self.assertEqual(response.status_code, 404)
@@ -0,0 +1,35 @@
+from django.test import RequestFactory, TestCase
+from rest_framework.request import Request
+
+from api.parsers import JSONFieldsMultiPartParser
+
+
+class JSONFieldsMultiPartParserTests(TestCase):
+    """Вложенные поля multipart передаются JSON или повторами."""
+
+    def parse(self, data):
+        request = RequestFactory().post('/api/recipes/', data)
+        return JSONFieldsMultiPartParser().parse(
+            request,
+            request.META['CONTENT_TYPE'],
+            {'request': Request(request)},
+        ).data
+
+    def test_json(self):
+        data = self.parse({
+            'tags': '[1, 2]',
+            'ingredients': '[{"id": 1, "amount": 5}]',
+        })
+        self.assertEqual(data['tags'], [1, 2])
+        self.assertEqual(data['ingredients'], [{'id': 1, 'amount': 5}])
+
+    def test_repeated_values(self):
+        self.assertEqual(self.parse({'tags': ['1', '2']})['tags'], ['1', '2'])
+
+    def test_single_value(self):
+        data = self.parse({
+            'tags': '1',
+            'ingredients': '{"id": 1, "amount": 5}',
+        })
+        self.assertEqual(data['tags'], [1])
+        self.assertEqual(data['ingredients'], [{'id': 1, 'amount': 5}])
@@ -0,0 +1,175 @@
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Subscriptions,
+    Tag,
+    User,
+)
+
+# Прозрачное изображение PNG 1×1.
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR4nGNgYGBgAAAABQABpfZFQAAAAABJRU5ErkJggg=='
+)
+
+
+class QueryCountTests(TestCase):
+    """Число запросов не зависит от числа рецептов и авторов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='x'
+        )
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {i}', slug=f'tag{i}')
+            for i in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Продукт {i}', measurement_unit='г'
+            )
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.authors = []
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_authors(self, count, recipes_per_author):
+        for _ in range(count):
+            number = len(self.authors)
+            author = User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+                password='x',
+            )
+            self.authors.append(author)
+            Subscriptions.objects.subscribe(self.user, author)
+            for i in range(recipes_per_author):
+                recipe = Recipe.objects.create(
+                    name=f'Рецепт {number}-{i}',
+                    author=author,
+                    text='Приготовить.',
+                    image='recipe_images/test.png',
+                    cooking_time=10,
+                )
+                recipe.tags.set(self.tags[:1 + i % len(self.tags)])
+                RecipeIngredient.objects.bulk_create(
+                    RecipeIngredient(
+                        recipe=recipe, ingredient=ingredient, amount=i + 1
+                    )
+                    for ingredient in self.ingredients[:2 + i % 3]
+                )
+                Favorite.objects.add_recipe(self.user, recipe)
+                ShoppingCart.objects.add_recipe(self.user, recipe)
+
+    def assert_queries_stable(self, num, url):
+        for authors, recipes_per_author in ((1, 1), (4, 3)):
+            self.add_authors(authors, recipes_per_author)
+            cache.clear()
+            with self.assertNumQueries(num):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_recipe_list(self):
+        self.assert_queries_stable(5, reverse('api:recipes-list'))
+
+    def test_recipe_detail(self):
+        self.add_authors(1, 3)
+        recipe = Recipe.objects.first()
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                reverse('api:recipes-detail', args=(recipe.pk,))
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_subscriptions(self):
+        self.assert_queries_stable(
+            3, reverse('api:users-subscriptions') + '?recipes_limit=2'
+        )
+
+
+class RecipeWriteQueryTests(TestCase):
+    """Ответ на создание и изменение рецепта не делает запросов на продукт."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        cls.tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Продукт {i}', measurement_unit='г'
+            )
+            for i in range(6)
+        ]
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_payload(self, name, count):
+        return {
+            'name': name,
+            'text': 'Сварить.',
+            'cooking_time': 10,
+            'image': IMAGE,
+            'tags': [self.tag.pk],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': 10}
+                for ingredient in self.ingredients[:count]
+            ],
+        }
+
+    def count_queries(self, method, url, payload):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(
+                url, payload, format='json'
+            )
+        self.assertIn(response.status_code, (200, 201), response.data)
+        self.assertEqual(
+            len(response.data['ingredients']), len(payload['ingredients'])
+        )
+        return len(queries), response.data['id']
+
+    def test_create(self):
+        url = reverse('api:recipes-list')
+        few, _ = self.count_queries('post', url, self.get_payload('Суп', 2))
+        many, _ = self.count_queries('post', url, self.get_payload('Щи', 6))
+        self.assertEqual(few, many)
+
+    def test_update(self):
+        counts = []
+        for name, count in (('Суп', 2), ('Щи', 6)):
+            _, pk = self.count_queries(
+                'post', reverse('api:recipes-list'), self.get_payload(name, 1)
+            )
+            queries, _ = self.count_queries(
+                'patch',
+                reverse('api:recipes-detail', args=(pk,)),
+                self.get_payload(name, count),
+            )
+            counts.append(queries)
+        self.assertEqual(counts[0], counts[1])
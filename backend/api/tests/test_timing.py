@@ -0,0 +1,50 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.cache import get_recipe_list_version, get_reference_data_version
+from recipes.models import User
+
+
+@override_settings(DEBUG=False)
+class ServerTimingTests(TestCase):
+    """Заголовок Server-Timing видят только сотрудники и при DEBUG."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='x'
+        )
+        cls.staff = User.objects.create_user(
+            username='staff',
+            email='staff@example.com',
+            password='x',
+            is_staff=True,
+        )
+
+    def setUp(self):
+        # Версии кэша уже созданы, как на работающем сервере.
+        get_reference_data_version()
+        get_recipe_list_version()
+
+    def get(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.credentials(
+                HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user)}'
+            )
+        return client.get(reverse('api:recipes-list'))
+
+    def test_hidden_from_anonymous(self):
+        self.assertNotIn('Server-Timing', self.get())
+
+    def test_hidden_from_users(self):
+        self.assertNotIn('Server-Timing', self.get(self.user))
+
+    def test_sent_to_staff(self):
+        self.assertIn('db;dur=', self.get(self.staff)['Server-Timing'])
+
+    @override_settings(DEBUG=True)
+    def test_sent_in_debug(self):
+        self.assertIn('Server-Timing', self.get())
@@ -0,0 +1,319 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.renderers import JSONRenderer
+
+from .constants import METRICS_BUCKETS, METRICS_FLUSH_INTERVAL
+
+PHASES = ('db', 'view', 'serialize', 'render', 'total')
+COUNTERS_HELP = {
+    'foodgram_response_cache_total': 'Обращения к кэшу ответов рецептов.',
+}
+
+current_timings = ContextVar('current_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Время этапов обработки одного запроса.
+
+    Время этапа не включает запросы к базе, выполненные внутри него:
+    они учитываются отдельно в "db". Вложенные замеры одного этапа
+    (например, вложенные сериализаторы) учитываются один раз.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.durations = {'db': 0.0, 'serialize': 0.0, 'render': 0.0}
+        self.active = set()
+
+    def execute(self, execute, sql, params, many, context):
+        """Обёртка connection.execute_wrapper для учёта запросов."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations['db'] += time.perf_counter() - started
+            self.queries += 1
+
+    @contextmanager
+    def measure(self, phase):
+        if phase in self.active:
+            yield
+            return
+        self.active.add(phase)
+        db = self.durations['db']
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[phase] += (
+                time.perf_counter() - started - (self.durations['db'] - db)
+            )
+            self.active.discard(phase)
+
+    def finish(self, total):
+        """Возвращает длительности всех этапов в секундах."""
+        durations = dict(self.durations, total=total)
+        durations['view'] = max(0.0, total - sum(self.durations.values()))
+        return durations
+
+
+@contextmanager
+def measure(phase):
+    """Замеряет этап текущего запроса, если он обрабатывается middleware."""
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    with timings.measure(phase):
+        yield
+
+
+class TimedRepresentationMixin:
+    """Учитывает время to_representation как этап "serialize"."""
+
+    def to_representation(self, instance):
+        with measure('serialize'):
+            return super().to_representation(instance)
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer, учитывающий время рендеринга как этап "render"."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with measure('render'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+def escape_label(value):
+    return (
+        str(value).replace('\\', '\\\\').replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+class MetricsRegistry:
+    """
+    Гистограммы длительности этапов по маршрутам.
+
+    Каждый процесс копит значения в памяти и не чаще раза в
+    METRICS_FLUSH_INTERVAL секунд записывает их в свой файл в каталоге
+    METRICS_DIR. При выдаче метрик файлы всех процессов суммируются,
+    поэтому под gunicorn с несколькими воркерами счётчики общие, а
+    файлы перезапущенных воркеров сохраняют монотонность счётчиков.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.queries = {}
+        self.counters = {}
+        self.flushed = 0.0
+
+    @property
+    def directory(self):
+        return getattr(settings, 'METRICS_DIR', '')
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f'{os.getpid()}.json')
+
+    def observe(self, route, method, durations, queries):
+        with self.lock:
+            for phase, duration in durations.items():
+                buckets = self.histograms.setdefault(
+                    (route, method, phase),
+                    [0] * (len(METRICS_BUCKETS) + 1) + [0.0],
+                )
+                buckets[bisect_left(METRICS_BUCKETS, duration)] += 1
+                buckets[-1] += duration
+            self.queries[route, method] = (
+                self.queries.get((route, method), 0) + queries
+            )
+        if (
+            self.directory
+            and time.monotonic() - self.flushed > METRICS_FLUSH_INTERVAL
+        ):
+            self.flush()
+
+    def increment(self, name, **labels):
+        """Увеличивает счётчик name из COUNTERS_HELP с метками labels."""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'histograms': [
+                    [*key, list(buckets)]
+                    for key, buckets in self.histograms.items()
+                ],
+                'queries': [
+                    [*key, total] for key, total in self.queries.items()
+                ],
+                'counters': [
+                    [name, labels, total]
+                    for (name, labels), total in self.counters.items()
+                ],
+            }
+
+    def flush(self):
+        """Атомарно записывает значения процесса в его файл."""
+        if not self.directory:
+            return
+        self.flushed = time.monotonic()
+        os.makedirs(self.directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(temporary, self.path)
+
+    def collect(self):
+        """Суммирует значения всех процессов."""
+        snapshots = [self.snapshot()]
+        if self.directory and os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if not name.endswith('.json') or path == self.path:
+                    continue
+                try:
+                    with open(path) as file:
+                        snapshots.append(json.load(file))
+                except (OSError, ValueError):
+                    continue
+        histograms, queries, counters = {}, {}, {}
+        for snapshot in snapshots:
+            for route, method, phase, buckets in snapshot['histograms']:
+                total = histograms.setdefault(
+                    (route, method, phase), [0] * len(buckets)
+                )
+                for index, value in enumerate(buckets):
+                    total[index] += value
+            for route, method, count in snapshot['queries']:
+                queries[route, method] = (
+                    queries.get((route, method), 0) + count
+                )
+            for name, labels, count in snapshot.get('counters', ()):
+                key = (name, tuple(tuple(label) for label in labels))
+                counters[key] = counters.get(key, 0) + count
+        return histograms, queries, counters
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+        histograms, queries, counters = self.collect()
+        lines = [
+            '# HELP foodgram_request_phase_seconds '
+            'Длительность этапов обработки запроса.',
+            '# TYPE foodgram_request_phase_seconds histogram',
+        ]
+        for (route, method, phase), buckets in sorted(histograms.items()):
+            labels = (
+                f'route="{escape_label(route)}",'
+                f'method="{escape_label(method)}",phase="{phase}"'
+            )
+            cumulative = 0
+            for bound, count in zip(
+                (*METRICS_BUCKETS, '+Inf'), buckets[:-1]
+            ):
+                cumulative += count
+                lines.append(
+                    'foodgram_request_phase_seconds_bucket'
+                    f'{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f'foodgram_request_phase_seconds_sum{{{labels}}} '
+                f'{buckets[-1]}'
+            )
+            lines.append(
+                f'foodgram_request_phase_seconds_count{{{labels}}} '
+                f'{cumulative}'
+            )
+        lines += [
+            '# HELP foodgram_request_db_queries_total '
+            'Число SQL-запросов при обработке запросов.',
+            '# TYPE foodgram_request_db_queries_total counter',
+        ]
+        for (route, method), count in sorted(queries.items()):
+            lines.append(
+                'foodgram_request_db_queries_total'
+                f'{{route="{escape_label(route)}",'
+                f'method="{escape_label(method)}"}} {count}'
+            )
+        for name, help_text in COUNTERS_HELP.items():
+            lines += [
+                f'# HELP {name} {help_text}',
+                f'# TYPE {name} counter',
+            ]
+            for (counter, labels), count in sorted(counters.items()):
+                if counter != name:
+                    continue
+                labels = ','.join(
+                    f'{label}="{escape_label(value)}"'
+                    for label, value in labels
+                )
+                lines.append(f'{name}{{{labels}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+atexit.register(metrics.flush)
+
+
+class ServerTimingMiddleware:
+    """
+    Замеряет время запросов к базе, сериализации, рендеринга и view.
+
+    Значения копятся в гистограммах по имени маршрута, а заголовок
+    Server-Timing получают только сотрудники и все клиенты при DEBUG:
+    остальным незачем видеть устройство сервера. Содержимое потоковых
+    ответов формируется уже после middleware и в замер не попадает.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timings.execute)
+                    )
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        durations = timings.finish(time.perf_counter() - started)
+        # DRF записывает пользователя, определённого по токену, и в
+        # исходный запрос Django.
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or getattr(user, 'is_staff', False):
+            response['Server-Timing'] = ', '.join(
+                f'{phase};dur={durations[phase] * 1000:.2f}'
+                + (
+                    f';desc="{timings.queries} queries"'
+                    if phase == 'db' else ''
+                )
+                for phase in PHASES
+            )
+        match = request.resolver_match
+        metrics.observe(
+            match.view_name if match else 'unmatched',
+            request.method,
+            durations,
+            timings.queries,
+        )
+        return response
@@ -1,22 +1,57 @@
+import csv
 from datetime import datetime
 
+from .constants import CSV_FILENAME, SHOPPING_LIST_CHUNK_SIZE, TXT_FILENAME
+
+
+class Echo:
+    """Объект с интерфейсом файла, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
 
 def generate_txt(ingredients, recipes):
-    """Создает из списка продуктов текстовый файл."""
+    """
+    Построчно формирует текстовый список покупок.
+
+    Рецепты и продукты читаются через iterator(), поэтому в памяти
+    одновременно находится не больше одной порции строк из базы.
+    """
 
     current_date = datetime.now().strftime('%Y-%m-%d %H:%M')
-    return '\n'.join(
-        [
-            f'Список покупок от {current_date}\n',
-            'Рецепты:',
-            *[f'{index}. {recipe}' for index, recipe in enumerate(
-                recipes, start=1
-            )],
-            '\nПродукты:',
-            *[
-                f'{index}. {ingredient["name"].capitalize()}: '
-                f'{ingredient["amount"]} {ingredient["measurement"]}'
-                for index, ingredient in enumerate(ingredients, start=1)
-            ]
-        ]
-    )
+    yield f'Список покупок от {current_date}\n\n'
+    yield 'Рецепты:'
+    for index, recipe in enumerate(
+        recipes.iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE), start=1
+    ):
+        yield f'\n{index}. {recipe}'
+    yield '\n\nПродукты:'
+    for index, ingredient in enumerate(
+        ingredients.iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE), start=1
+    ):
+        yield (
+            f'\n{index}. {ingredient["name"].capitalize()}: '
+            f'{ingredient["amount"]} {ingredient["measurement"]}'
+        )
+
+
+def generate_csv(ingredients, recipes):
+    """Построчно формирует список покупок в формате CSV."""
+
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Продукт', 'Количество', 'Единица измерения'))
+    for ingredient in ingredients.iterator(
+        chunk_size=SHOPPING_LIST_CHUNK_SIZE
+    ):
+        yield writer.writerow((
+            ingredient['name'].capitalize(),
+            ingredient['amount'],
+            ingredient['measurement'],
+        ))
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': (generate_txt, TXT_FILENAME, 'text/plain; charset=utf-8'),
+    'csv': (generate_csv, CSV_FILENAME, 'text/csv; charset=utf-8'),
+}
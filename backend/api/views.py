@@ -1,5 +1,14 @@
-from django.db.models import F, Sum
-from django.http import FileResponse
+from django.db.models import (
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    Window,
+    prefetch_related_objects,
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.urls import reverse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
@@ -7,40 +16,57 @@ from djoser.views import UserViewSet as DjoserUserViewSet
 from djoser.serializers import SetPasswordSerializer
 from rest_framework import permissions, status, viewsets
 from rest_framework.exceptions import ValidationError
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 
 from recipes.models import (
     Favorite,
     Ingredient,
     Recipe,
+    RecipeIngredient,
     ShoppingCart,
+    ShoppingListItem,
     Subscriptions,
     Tag,
     User,
 )
-from .constants import TXT_FILENAME
-from .filters import IngredientFilter, RecipeFilter
-from .paginators import PaginatorWithLimit
+from recipes.coverage import coverage_index
+from recipes.shortlinks import decode, encode, recipe_exists
+from .cache import AnonymousRecipeCacheMixin, ReferenceDataCacheMixin
+from .constants import (
+    METRICS_CONTENT_TYPE,
+    RECIPE_FACETS_PARAM,
+    SHOPPING_LIST_FORMAT_PARAM,
+)
+from .filters import IngredientFilter, RecipeFilter, tag_facets
+from .paginators import KeysetPaginator, PaginatorWithLimit
+from .parsers import JSONFieldsMultiPartParser, RawImageParser
 from .permissions import ReadOnlyOrAuthor
 from .serializers import (
     AvatarSerializer,
+    CookableRecipeSerializer,
+    IngredientIdsSerializer,
     IngredientSerializer,
     RecipeRetrieveSerializer,
     RecipeCreateUpdateSerializer,
+    RecipeIdsSerializer,
     SubscriptionsSerializer,
     TagSerializer,
     UserCreateSerializer,
     UserSerializer,
     ShortRecipeSerializer,
 )
-from .utils import generate_txt
+from .timing import metrics
+from .utils import SHOPPING_LIST_FORMATS
 
 
 class UserViewSet(DjoserUserViewSet):
     """ViewSet для управления пользователями."""
 
     pagination_class = PaginatorWithLimit
+    keyset_ordering = ("username", "id")
+    raw_upload_field = None
 
     def get_serializer_class(self):
         if self.action == "set_password":
@@ -60,7 +86,9 @@ class UserViewSet(DjoserUserViewSet):
         detail=False,
         methods=["put", "delete"],
         permission_classes=[permissions.IsAuthenticated],
+        parser_classes=(JSONParser, JSONFieldsMultiPartParser, RawImageParser),
         url_path="me/avatar",
+        raw_upload_field="avatar",
     )
     def avatar(self, request):
         """Обновляет или удаляет аватар текущего пользователя."""
@@ -73,6 +101,67 @@ class UserViewSet(DjoserUserViewSet):
         request.user.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def get_recipes_limit(self):
+        """Возвращает проверенное значение параметра "recipes_limit"."""
+        recipes_limit = self.request.query_params.get("recipes_limit")
+        if recipes_limit is None:
+            return None
+        try:
+            recipes_limit = int(recipes_limit)
+        except ValueError:
+            raise ValidationError(
+                {"recipes_limit": "Значение должно быть целым числом."}
+            )
+        if recipes_limit < 0:
+            raise ValidationError(
+                {"recipes_limit": "Значение не может быть отрицательным."}
+            )
+        return recipes_limit
+
+    def get_subscriptions_queryset(self, authors):
+        """Добавляет к авторам признак подписки."""
+        return authors.annotate(
+            is_subscribed=Exists(
+                Subscriptions.objects.filter(
+                    user=self.request.user, author=OuterRef("pk")
+                )
+            ),
+        ).order_by(*User._meta.ordering)
+
+    @staticmethod
+    def prefetch_recipes(authors, recipes_limit):
+        """
+        Загружает одним запросом первые recipes_limit рецептов авторов.
+
+        Рецепты нумеруются оконной функцией ROW_NUMBER() в пределах
+        каждого автора, и в выборку попадают только первые из них.
+        """
+        recipes = Recipe.objects.all()
+        if recipes_limit is not None:
+            ranked = (
+                Recipe.objects.filter(author__in=authors)
+                .annotate(
+                    row_number=Window(
+                        expression=RowNumber(),
+                        partition_by=F("author"),
+                        order_by=(F("pub_date").desc(), F("id").desc()),
+                    )
+                )
+                .values("id", "row_number")
+            )
+            sql, params = ranked.query.sql_with_params()
+            recipes = recipes.filter(
+                pk__in=RawSQL(
+                    f"SELECT id FROM ({sql}) ranked WHERE row_number <= %s",
+                    (*params, recipes_limit),
+                )
+            )
+        prefetch_related_objects(
+            authors,
+            Prefetch("recipes", queryset=recipes, to_attr="limited_recipes"),
+        )
+        return authors
+
     @action(
         detail=False,
         permission_classes=[permissions.IsAuthenticated],
@@ -82,16 +171,23 @@ class UserViewSet(DjoserUserViewSet):
         """
         Возвращает список пользователей, на которых подписан пользователь.
         """
-        subscriptions = User.objects.filter(authors__user=request.user)
+        recipes_limit = self.get_recipes_limit()
+        subscriptions = self.get_subscriptions_queryset(
+            User.objects.filter(authors__user=request.user)
+        )
         page = self.paginate_queryset(subscriptions)
         if page is not None:
             serializer = SubscriptionsSerializer(
-                page, many=True, context={"request": request}
+                self.prefetch_recipes(page, recipes_limit),
+                many=True,
+                context={"request": request},
             )
             return self.get_paginated_response(serializer.data)
 
         serializer = SubscriptionsSerializer(
-            subscriptions, many=True, context={"request": request}
+            self.prefetch_recipes(list(subscriptions), recipes_limit),
+            many=True,
+            context={"request": request},
         )
         return Response(serializer.data)
 
@@ -108,18 +204,25 @@ class UserViewSet(DjoserUserViewSet):
         if user == author:
             raise ValidationError("Нельзя подписаться на самого себя.")
         if request.method == "POST":
-            _, created = Subscriptions.objects.get_or_create(user=user, author=author)
-            if not created:
-                raise ValidationError("Вы уже подписаны на этого пользователя!")
+            recipes_limit = self.get_recipes_limit()
+            if not Subscriptions.objects.subscribe(user, author):
+                raise ValidationError(
+                    "Вы уже подписаны на этого пользователя!"
+                )
+            authors = self.get_subscriptions_queryset(
+                User.objects.filter(pk=author.pk)
+            )
+            author = self.prefetch_recipes(list(authors), recipes_limit)[0]
             return Response(
                 SubscriptionsSerializer(author, context={"request": request}).data,
                 status=status.HTTP_201_CREATED,
             )
-        get_object_or_404(Subscriptions, user=user, author=author).delete()
+        if not Subscriptions.objects.unsubscribe(user, author):
+            raise Http404
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ReferenceDataCacheMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet для управления тегами."""
 
     queryset = Tag.objects.all()
@@ -127,7 +230,9 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.AllowAny]
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(
+    ReferenceDataCacheMixin, viewsets.ReadOnlyModelViewSet
+):
     """ViewSet для управления ингридиентами."""
 
     queryset = Ingredient.objects.all()
@@ -137,34 +242,175 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousRecipeCacheMixin, viewsets.ModelViewSet):
     """ViewSet для управления рецептами."""
 
     queryset = Recipe.objects.all().order_by("-pub_date")
     filter_backends = (DjangoFilterBackend,)
     pagination_class = PaginatorWithLimit
+    keyset_ordering = ("-pub_date", "id")
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, ReadOnlyOrAuthor]
     filterset_class = RecipeFilter
+    parser_classes = (JSONParser, JSONFieldsMultiPartParser)
+
+    def get_queryset(self):
+        """
+        Возвращает рецепты со всем необходимым для сериализации.
+
+        Флаги текущего пользователя вычисляются через Exists, автор и
+        связанные теги и продукты подгружаются заранее, поэтому число
+        запросов не зависит от размера страницы.
+        """
+        user = self.request.user
+        authors = User.objects.all()
+        queryset = super().get_queryset()
+        if user.is_authenticated:
+            authors = authors.annotate(
+                is_subscribed=Exists(
+                    Subscriptions.objects.filter(
+                        user=user, author=OuterRef("pk")
+                    )
+                )
+            )
+            queryset = queryset.annotate(
+                is_favorited=Exists(
+                    Favorite.objects.filter(user=user, recipe=OuterRef("pk"))
+                ),
+                is_in_shopping_cart=Exists(
+                    ShoppingCart.objects.filter(
+                        user=user, recipe=OuterRef("pk")
+                    )
+                ),
+            )
+        return queryset.prefetch_related(
+            Prefetch("author", queryset=authors),
+            "tags",
+            Prefetch(
+                "recipeingredients",
+                queryset=RecipeIngredient.objects.select_related("ingredient"),
+            ),
+        )
+
+    def get_paginated_response(self, data):
+        """
+        Добавляет к списку рецептов блок facets по параметру "facets=true".
+
+        В нём число рецептов с каждым тегом при текущих фильтрах.
+        """
+        response = super().get_paginated_response(data)
+        if self.action == "list" and self.request.query_params.get(
+            RECIPE_FACETS_PARAM
+        ) in ("true", "1"):
+            response.data["facets"] = {
+                "tags": tag_facets(self.filtered_queryset)
+            }
+        return response
+
+    def filter_queryset(self, queryset):
+        """Запоминает отфильтрованную выборку для блока facets."""
+        self.filtered_queryset = super().filter_queryset(queryset)
+        return self.filtered_queryset
 
     def get_serializer_class(self):
         """Возвращает соответствующий сериализатор для получения и создания."""
-        if self.action in ["retrieve", "get_link"]:
+        if self.action in ["retrieve", "get_link", "feed"]:
             return RecipeRetrieveSerializer
+        if self.action == "what_can_i_cook":
+            return CookableRecipeSerializer
         return RecipeCreateUpdateSerializer
 
     @action(detail=True, permission_classes=[permissions.AllowAny], url_path="get-link")
     def get_link(self, request, pk=None):
         """Получение короткой ссылки."""
-        recipe = get_object_or_404(Recipe, pk=pk)
+        recipe_id = decode(pk) if pk.isascii() and pk.isdigit() else None
+        if recipe_id is None or not recipe_exists(recipe_id):
+            raise Http404
         return Response(
             {
                 "short-link": request.build_absolute_uri(
-                    reverse("recipes:shortlink", args=[recipe.pk])
+                    reverse("recipes:shortlink", args=[encode(recipe_id)])
                 )
             },
             status=status.HTTP_200_OK,
         )
 
+    @action(
+        detail=False,
+        permission_classes=[permissions.IsAuthenticated],
+        pagination_class=KeysetPaginator,
+    )
+    def feed(self, request):
+        """
+        Рецепты авторов, на которых подписан пользователь, от новых к старым.
+
+        Страницы выдаются по курсору; запрос обслуживается индексом
+        (author, pub_date). О новых рецептах сообщает поток событий
+        FEED_EVENTS_PATH.
+        """
+        recipes = self.filter_queryset(
+            self.get_queryset().filter(
+                author__in=Subscriptions.objects.filter(
+                    user=request.user
+                ).values("author")
+            )
+        )
+        page = self.paginate_queryset(recipes)
+        return self.get_paginated_response(
+            self.get_serializer(page, many=True).data
+        )
+
+    @action(
+        detail=False,
+        permission_classes=[permissions.AllowAny],
+        url_path="what_can_i_cook",
+    )
+    def what_can_i_cook(self, request):
+        """
+        Рецепты из продуктов, которые есть у пользователя.
+
+        Продукты передаются параметром ingredients (повторяющимся или
+        через запятую). Рецепты упорядочены по доле имеющихся продуктов,
+        затем по числу недостающих; считает их индекс в памяти процесса,
+        из базы читается только страница выдачи.
+        """
+        serializer = IngredientIdsSerializer(
+            data={
+                "ingredients": [
+                    value
+                    for values in request.query_params.getlist("ingredients")
+                    for value in values.split(",")
+                    if value
+                ]
+            }
+        )
+        serializer.is_valid(raise_exception=True)
+        recipe_ids, matched, sizes = coverage_index.get().rank(
+            serializer.validated_data["ingredients"]
+        )
+        # Страница выбирается из номеров в ранжированном списке.
+        positions = list(
+            self.paginator.paginate_queryset(range(len(recipe_ids)), request)
+        )
+        page = recipe_ids[positions].tolist()
+        recipes = self.get_queryset().in_bulk(page)
+        serializer = CookableRecipeSerializer(
+            [recipes[pk] for pk in page if pk in recipes],
+            many=True,
+            context={
+                **self.get_serializer_context(),
+                "coverage": dict(
+                    zip(
+                        page,
+                        zip(
+                            matched[positions].tolist(),
+                            sizes[positions].tolist(),
+                        ),
+                    )
+                ),
+            },
+        )
+        return self.paginator.get_paginated_response(serializer.data)
+
     @action(
         detail=False,
         methods=["get"],
@@ -172,34 +418,56 @@ class RecipeViewSet(viewsets.ModelViewSet):
         url_path="download_shopping_cart",
     )
     def download_shopping_cart(self, request):
-        """Возвращает список покупок в формате TXT."""
+        """
+        Возвращает список покупок в формате TXT или CSV.
 
+        Формат задаётся параметром "file_format", файл отдаётся потоком.
+        """
+        file_format = request.query_params.get(
+            SHOPPING_LIST_FORMAT_PARAM, "txt"
+        )
+        if file_format not in SHOPPING_LIST_FORMATS:
+            raise ValidationError(
+                {
+                    SHOPPING_LIST_FORMAT_PARAM: "Допустимые форматы: "
+                    f'{", ".join(SHOPPING_LIST_FORMATS)}.'
+                }
+            )
+        generate, filename, content_type = SHOPPING_LIST_FORMATS[file_format]
         user = request.user
         ingredients = (
-            Ingredient.objects.filter(
-                recipeingredients__recipe__shoppingcarts__user=user
+            ShoppingListItem.objects.filter(user=user)
+            .values(
+                "amount",
+                name=F("ingredient__name"),
+                measurement=F("ingredient__measurement_unit"),
             )
-            .values("name", measurement=F("measurement_unit"))
-            .annotate(amount=Sum("recipeingredients__amount"))
+            .order_by("ingredient__name")
         )
-        return FileResponse(
-            generate_txt(ingredients, Recipe.objects.filter(shoppingcarts__user=user)),
-            content_type="text/plain",
-            filename=TXT_FILENAME,
+        response = StreamingHttpResponse(
+            generate(
+                ingredients, Recipe.objects.filter(shoppingcarts__user=user)
+            ),
+            content_type=content_type,
         )
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
 
     @staticmethod
     def shoppingcart_favorite_method(request, pk, model, delete_message):
         recipe = get_object_or_404(Recipe, pk=pk)
         if request.method == "POST":
-            _, created = model.objects.get_or_create(user=request.user, recipe=recipe)
-            if created:
+            if model.objects.add_recipe(request.user, recipe):
                 return Response(
-                    ShortRecipeSerializer(recipe).data, status=status.HTTP_201_CREATED
+                    ShortRecipeSerializer(recipe).data,
+                    status=status.HTTP_201_CREATED,
                 )
             raise ValidationError("Этот рецепт уже в списке.")
-        get_object_or_404(model, user=request.user, recipe=recipe).delete()
-        return Response({"delete": delete_message}, status=status.HTTP_204_NO_CONTENT)
+        if not model.objects.remove_recipe(request.user, recipe):
+            raise Http404
+        return Response(
+            {"delete": delete_message}, status=status.HTTP_204_NO_CONTENT
+        )
 
     @action(
         detail=True,
@@ -224,3 +492,61 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return self.shoppingcart_favorite_method(
             request, pk, ShoppingCart, delete_message="Рецепт удален из списка покупок"
         )
+
+    @staticmethod
+    def bulk_shoppingcart_favorite_method(request, model):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data["recipes"]
+        if request.method == "POST":
+            created, existing, missing = model.objects.add_recipes(
+                request.user, recipe_ids
+            )
+            return Response(
+                {"created": created, "existing": existing, "missing": missing},
+                status=(
+                    status.HTTP_201_CREATED if created else status.HTTP_200_OK
+                ),
+            )
+        deleted, missing = model.objects.remove_recipes(
+            request.user, recipe_ids
+        )
+        return Response({"deleted": deleted, "missing": missing})
+
+    @action(
+        detail=False,
+        url_path="favorite",
+        methods=("post", "delete"),
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def favorite_bulk(self, request):
+        """Добавляет в избранное или удаляет из него несколько рецептов."""
+        return self.bulk_shoppingcart_favorite_method(request, Favorite)
+
+    @action(
+        detail=False,
+        url_path="shopping_cart",
+        methods=("post", "delete"),
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def shopping_cart_bulk(self, request):
+        """Добавляет в список покупок или удаляет несколько рецептов."""
+        return self.bulk_shoppingcart_favorite_method(request, ShoppingCart)
+
+    @action(
+        detail=False,
+        url_path="shopping_cart/clear",
+        methods=("delete",),
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def clear_shopping_cart(self, request):
+        """Очищает список покупок."""
+        ShoppingCart.objects.clear(request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAdminUser])
+def metrics_view(request):
+    """Отдаёт метрики времени обработки запросов в формате Prometheus."""
+    return HttpResponse(metrics.render(), content_type=METRICS_CONTENT_TYPE)
@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Модели импортируются после настройки Django в get_asgi_application().
+from api.constants import FEED_EVENTS_PATH  # noqa: E402
+from api.events import route_feed_events  # noqa: E402
+
+application = route_feed_events(django_application, FEED_EVENTS_PATH)
@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -37,6 +38,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.timing.ServerTimingMiddleware',
+    'api.nplusone.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -85,6 +88,34 @@ else:
         }
     }
 
+# Готовые ответы хранятся в кэше процесса, а их версии — в кэше "versions",
+# общем для всех процессов: версии справочников и рецептов, которые меняют
+# сигналы и команды импорта, должны доходить до каждого воркера. Таблицу
+# DatabaseCache создаёт миграция; оба кэша можно перенести в Redis.
+# Версии не должны вытесняться: ключей не больше, чем рецептов, а при
+# вытеснении вместе с версиями отдельных рецептов пропадали бы версии
+# справочников и списков, поэтому предел записей задан с запасом.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    },
+    'versions': {
+        'BACKEND': os.getenv(
+            'VERSIONS_CACHE_BACKEND',
+            'django.core.cache.backends.db.DatabaseCache',
+        ),
+        'LOCATION': os.getenv('VERSIONS_CACHE_LOCATION', 'django_cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(
+                os.getenv('VERSIONS_CACHE_MAX_ENTRIES', 10 ** 9)
+            ),
+        },
+    },
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -131,6 +162,34 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.timing.TimedJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+
+COVERAGE_INDEX_PATH = os.getenv('COVERAGE_INDEX_PATH', '')
+
+# API и поток событий ленты работают в разных процессах, поэтому с
+# PostgreSQL события передаются через LISTEN/NOTIFY.
+FEED_BROKER = os.getenv('FEED_BROKER', (
+    'recipes.events.PostgresBroker'
+    if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql'
+    else 'recipes.events.InProcessBroker'
+))
+
+# В тестах N+1 и превышение бюджета запросов роняют запрос.
+NPLUSONE_MODE = os.getenv(
+    'NPLUSONE_MODE', 'raise' if sys.argv[1:2] == ['test'] else 'off'
+)
+NPLUSONE_THRESHOLD = 3
+QUERY_BUDGETS = {
+    ('api:recipes-list', 'GET'): 8,
+    ('api:recipes-detail', 'GET'): 5,
+    ('api:users-subscriptions', 'GET'): 4,
+    ('api:recipes-download-shopping-cart', 'GET'): 3,
 }
 
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
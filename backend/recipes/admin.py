@@ -1,6 +1,9 @@
+from collections import defaultdict
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import Group
+from django.db.models import Prefetch
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.utils.html import format_html
@@ -13,6 +16,7 @@ from .models import (
     RecipeIngredient,
     Favorite,
     ShoppingCart,
+    ShoppingListItem,
 )
 
 from .filters import (
@@ -21,12 +25,20 @@ from .filters import (
     HasFollowersFilter,
     CookingTimeFilter
 )
+from .paginators import EstimatedCountPaginator
 
 admin.site.unregister(Group)
 
 
+class EstimatedCountMixin:
+    """Список без точного подсчёта строк больших таблиц."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(EstimatedCountMixin, BaseUserAdmin):
     list_display = (
         'username',
         'email',
@@ -44,9 +56,9 @@ class UserAdmin(BaseUserAdmin):
         HasFollowersFilter,
     )
 
-    @admin.display(description='Рецепты')
+    @admin.display(description='Рецепты', ordering='recipes_count')
     def recipe_count(self, user):
-        count = user.recipes.count()
+        count = user.recipes_count
         if count:
             url = reverse(
                 'admin:recipes_recipe_changelist'
@@ -54,19 +66,23 @@ class UserAdmin(BaseUserAdmin):
             return format_html('<a href="{}">{}</a>', url, count)
         return count
 
-    @admin.display(description='Подписки')
+    @admin.display(description='Подписки', ordering='subscriptions_count')
     def subscription_count(self, user):
-        count = user.authors.count()
+        count = user.subscriptions_count
         if count:
-            url = reverse('admin:recipes_subscriptions_changelist')
+            url = reverse(
+                'admin:recipes_subscriptions_changelist'
+            ) + f'?user__id={user.id}'
             return format_html('<a href="{}">{}</a>', url, count)
         return count
 
-    @admin.display(description='Подписчики')
+    @admin.display(description='Подписчики', ordering='subscribers_count')
     def follower_count(self, user):
-        count = user.followers.count()
+        count = user.subscribers_count
         if count:
-            url = reverse('admin:recipes_subscriptions_changelist')
+            url = reverse(
+                'admin:recipes_subscriptions_changelist'
+            ) + f'?author__id={user.id}'
             return format_html('<a href="{}">{}</a>', url, count)
         return count
 
@@ -79,19 +95,20 @@ class UserAdmin(BaseUserAdmin):
 
 
 @admin.register(Subscriptions)
-class SubscriptionsAdmin(admin.ModelAdmin):
+class SubscriptionsAdmin(EstimatedCountMixin, admin.ModelAdmin):
     list_display = ('user', 'author')
+    list_select_related = ('user', 'author')
     search_fields = ('user__username', 'author__username')
 
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
-    list_display = ('name', 'slug', 'recipe_count')
+    list_display = ('name', 'slug', 'bit', 'recipe_count')
     search_fields = ('name',)
 
-    @admin.display(description='Число рецептов')
+    @admin.display(description='Число рецептов', ordering='recipes_count')
     def recipe_count(self, tag):
-        return tag.recipes.count()
+        return tag.recipes_count
 
 
 @admin.register(Ingredient)
@@ -100,9 +117,9 @@ class IngredientAdmin(admin.ModelAdmin):
     search_fields = ('name', 'measurement_unit')
     list_filter = ('measurement_unit',)
 
-    @admin.display(description='Число рецептов')
+    @admin.display(description='Число рецептов', ordering='recipes_count')
     def recipe_count(self, ingredient):
-        return ingredient.recipeingredients.count()
+        return ingredient.recipes_count
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -111,7 +128,7 @@ class RecipeIngredientInline(admin.TabularInline):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(EstimatedCountMixin, admin.ModelAdmin):
     list_display = (
         'name',
         'author',
@@ -128,6 +145,19 @@ class RecipeAdmin(admin.ModelAdmin):
 
     inlines = [RecipeIngredientInline]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipeingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        )
+
     @admin.display(description='Теги')
     @mark_safe
     def display_tags(self, recipe):
@@ -149,17 +179,83 @@ class RecipeAdmin(admin.ModelAdmin):
             recipe.image.url
         )
 
-    @admin.display(description='Избранное')
+    @admin.display(description='Избранное', ordering='favorites_count')
     def favorite_count(self, recipe):
-        return recipe.favorites.count()
+        return recipe.favorites_count
+
+    def save_model(self, request, recipe, form, change):
+        old_author_id = Recipe.objects.filter(pk=recipe.pk).values_list(
+            'author_id', flat=True
+        ).first()
+        super().save_model(request, recipe, form, change)
+        Recipe.objects.author_changed(old_author_id, recipe.author_id)
+
+    def save_related(self, request, form, formsets, change):
+        """
+        Сохраняет теги и продукты, обновляя счётчики и списки покупок.
+
+        Изменения продуктов в inline переносятся в агрегат списков
+        покупок тех, у кого рецепт в корзине.
+        """
+        recipe = form.instance
+        old_tags = set(recipe.tags.values_list('pk', flat=True))
+        old_amounts = dict(recipe.recipeingredients.values_list(
+            'ingredient_id', 'amount'
+        ))
+        super().save_related(request, form, formsets, change)
+        amounts = dict(recipe.recipeingredients.values_list(
+            'ingredient_id', 'amount'
+        ))
+        ShoppingListItem.objects.update_recipe(recipe, old_amounts, amounts)
+        Recipe.objects.relations_changed(
+            old_tags,
+            [tag.pk for tag in form.cleaned_data['tags']],
+            old_amounts,
+            amounts,
+        )
+
+
+class UserRecipeAdminMixin:
+    """
+    Добавление и удаление рецептов пользователя через менеджер модели.
+
+    Менеджер обновляет счётчик избранного и агрегат списка покупок,
+    которые при прямом сохранении и удалении строк разошлись бы.
+    """
+
+    def save_model(self, request, relation, form, change):
+        manager = self.model.objects
+        if change:
+            old = manager.select_related('user').get(pk=relation.pk)
+            manager.remove_recipes(old.user, [old.recipe_id])
+        manager.add_recipe(relation.user, relation.recipe)
+        relation.pk = manager.get(
+            user=relation.user, recipe=relation.recipe
+        ).pk
+
+    def delete_model(self, request, relation):
+        self.model.objects.remove_recipe(relation.user, relation.recipe)
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = defaultdict(list)
+        for user_id, recipe_id in queryset.values_list('user_id', 'recipe_id'):
+            recipe_ids[user_id].append(recipe_id)
+        for user in User.objects.filter(pk__in=recipe_ids):
+            self.model.objects.remove_recipes(user, recipe_ids[user.pk])
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(
+    UserRecipeAdminMixin, EstimatedCountMixin, admin.ModelAdmin
+):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(
+    UserRecipeAdminMixin, EstimatedCountMixin, admin.ModelAdmin
+):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
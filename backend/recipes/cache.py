@@ -0,0 +1,117 @@
+import time
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.connection import ConnectionProxy
+
+from .constants import REFERENCE_DATA_VERSION_TTL
+
+# Версии хранятся в кэше, общем для всех процессов сервера.
+cache = ConnectionProxy(caches, 'versions')
+
+REFERENCE_DATA_VERSION_KEY = 'reference-data-version'
+RECIPE_LIST_VERSION_KEY = 'recipe-list-version'
+
+# Версия справочников, прочитанная процессом, и когда её перечитать.
+local_reference_data_version = (None, 0.0)
+
+
+def read_reference_data_version():
+    """Версия справочников из общего кэша; создаётся при отсутствии."""
+    version = cache.get(REFERENCE_DATA_VERSION_KEY)
+    if version is None:
+        cache.add(REFERENCE_DATA_VERSION_KEY, int(time.time()), None)
+        version = cache.get(REFERENCE_DATA_VERSION_KEY)
+    return version
+
+
+def get_reference_data_version():
+    """
+    Возвращает версию справочников (тегов и продуктов).
+
+    Версия — время последнего изменения справочников в секундах.
+    Процесс запоминает её на REFERENCE_DATA_VERSION_TTL секунд, поэтому
+    повторные запросы справочников не обращаются к кэшу версий в базе,
+    а изменения из других процессов видны с этой задержкой.
+    """
+    global local_reference_data_version
+    version, expires = local_reference_data_version
+    if expires > time.monotonic():
+        return version
+    version = read_reference_data_version()
+    local_reference_data_version = (
+        version, time.monotonic() + REFERENCE_DATA_VERSION_TTL
+    )
+    return version
+
+
+def forget_reference_data_version():
+    """Сбрасывает версию справочников, запомненную процессом."""
+    global local_reference_data_version
+    local_reference_data_version = (None, 0.0)
+
+
+def bump_reference_data_version():
+    """Меняет версию справочников после фиксации текущей транзакции."""
+
+    def bump():
+        cache.set(
+            REFERENCE_DATA_VERSION_KEY,
+            max(int(time.time()), read_reference_data_version() + 1),
+            None,
+        )
+        forget_reference_data_version()
+
+    transaction.on_commit(bump)
+
+
+def recipe_version_key(pk):
+    return f'recipe-version:{pk}'
+
+
+def get_version(key):
+    """
+    Возвращает версию по ключу кэша.
+
+    Если ключ вытеснен или ещё не создан, записывается новая случайная
+    версия, поэтому записи, сделанные до вытеснения, становятся
+    недостижимыми.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def get_recipe_list_version():
+    """Версия всех списков рецептов."""
+    return get_version(RECIPE_LIST_VERSION_KEY)
+
+
+def get_recipe_version(pk):
+    """Версия отдельного рецепта."""
+    return get_version(recipe_version_key(pk))
+
+
+def bump_recipe_versions(recipe_ids):
+    """
+    Меняет версии рецептов recipe_ids и списков рецептов.
+
+    Версии меняются после фиксации текущей транзакции, чтобы ответ,
+    собранный до неё, не попал в кэш под новой версией.
+    """
+    recipe_ids = list(recipe_ids)
+
+    def bump():
+        version = uuid4().hex
+        cache.set_many(
+            {
+                RECIPE_LIST_VERSION_KEY: version,
+                **{recipe_version_key(pk): version for pk in recipe_ids},
+            },
+            None,
+        )
+
+    transaction.on_commit(bump)
@@ -17,3 +17,59 @@ RANGE_2_START = 21
 RANGE_2_END = 40
 RANGE_3_START = 41
 RANGE_3_END = 9999
+
+# Размеры уменьшенных копий: (ширина, высота, обрезать ли до размера).
+IMAGE_RENDITIONS = {
+    'recipe': {
+        'card': (480, 320, True),
+        'detail': (1200, 800, False),
+    },
+    'avatar': {
+        'avatar': (160, 160, True),
+    },
+}
+IMAGE_RENDITION_FORMATS = (('webp', 'WEBP'), ('jpg', 'JPEG'))
+IMAGE_RENDITION_QUALITY = 80
+IMAGE_RENDITION_WORKERS = 2
+
+# Начиная с этого числа строк админка показывает оценку вместо COUNT(*).
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
+# Сколько секунд процесс использует прочитанную версию справочников,
+# не обращаясь к общему кэшу версий.
+REFERENCE_DATA_VERSION_TTL = 5
+
+# Короткие ссылки: алфавит кодов, размер кэша процесса и время жизни
+# записей о найденных и отсутствующих рецептах (в секундах). Удаление
+# рецепта сбрасывает запись только в своём процессе, остальные узнают
+# о нём через SHORT_LINK_CACHE_TIMEOUT.
+SHORT_LINK_ALPHABET = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+SHORT_LINK_CACHE_SIZE = 10000
+SHORT_LINK_CACHE_TIMEOUT = 30
+SHORT_LINK_MISSING_TIMEOUT = 30
+SHORT_LINK_MAX_AGE = 60 * 60
+
+# Полнотекстовый поиск рецептов: конфигурация PostgreSQL, веса
+# категорий D, C, B, A (описание, продукты, название) и теневая
+# таблица FTS5 для SQLite.
+SEARCH_CONFIG = 'russian'
+SEARCH_WEIGHTS = (0.1, 0.2, 0.4, 1.0)
+SEARCH_FTS_TABLE = 'recipes_recipe_fts'
+SEARCH_INDEX_BATCH_SIZE = 1000
+
+# Подбор рецептов по продуктам: как часто процесс перестраивает индекс
+# (в секундах) и сколько строк читать из базы за раз при построении.
+COVERAGE_INDEX_MAX_AGE = 60 * 5
+COVERAGE_BUILD_CHUNK_SIZE = 10000
+
+# Теги получают биты маски рецепта Recipe.tags_mask: 63 бита, чтобы
+# маска оставалась положительным bigint. Бит, занятый параллельной
+# транзакцией, ищется заново не больше TAG_BIT_ATTEMPTS раз.
+TAG_MASK_BITS = 63
+TAG_BIT_ATTEMPTS = 5
+
+# События ленты через LISTEN/NOTIFY PostgreSQL: канал уведомлений,
+# сколько секунд ждать уведомления за раз и пауза перед переподключением.
+FEED_NOTIFY_CHANNEL = 'foodgram_feed_events'
+FEED_NOTIFY_POLL_TIMEOUT = 5
+FEED_NOTIFY_RECONNECT_DELAY = 1
@@ -0,0 +1,91 @@
+from django.db.models import (
+    BigIntegerField,
+    Count,
+    F,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Cast, Coalesce
+
+# (модель, поле счётчика, модель связи, поле связи с моделью)
+COUNTERS = (
+    ('Recipe', 'favorites_count', 'Favorite', 'recipe'),
+    ('User', 'recipes_count', 'Recipe', 'author'),
+    ('User', 'subscribers_count', 'Subscriptions', 'author'),
+    ('User', 'subscriptions_count', 'Subscriptions', 'user'),
+    ('Tag', 'recipes_count', 'Recipe_tags', 'tag'),
+    ('Ingredient', 'recipes_count', 'RecipeIngredient', 'ingredient'),
+)
+
+
+def shift_counter(model, field, pks, delta):
+    """Атомарно изменяет счётчик field у объектов pks на delta."""
+    pks = {pk for pk in pks if pk is not None}
+    if pks and delta:
+        model.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+
+
+def get_counters(apps):
+    """Возвращает COUNTERS с моделями из реестра приложений apps."""
+    return [
+        (
+            apps.get_model('recipes', model),
+            field,
+            apps.get_model('recipes', related),
+            relation,
+        )
+        for model, field, related, relation in COUNTERS
+    ]
+
+
+def expected_count(related, relation):
+    """Выражение с фактическим числом связанных строк."""
+    return Coalesce(
+        Subquery(
+            related.objects.filter(**{relation: OuterRef('pk')}).order_by()
+            .values(relation).annotate(count=Count('*')).values('count')
+        ),
+        0,
+    )
+
+
+def find_drift(model, field, related, relation):
+    """Возвращает {pk: (счётчик, фактическое значение)} для расхождений."""
+    return {
+        pk: (stored, expected)
+        for pk, stored, expected in model.objects.annotate(
+            expected=expected_count(related, relation)
+        ).exclude(**{field: F('expected')}).values_list(
+            'pk', field, 'expected'
+        ).order_by()
+    }
+
+
+def recount(model, field, related, relation, pks=None):
+    """Пересчитывает счётчик для pks или всех объектов модели."""
+    queryset = model.objects.all()
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+    return queryset.update(**{field: expected_count(related, relation)})
+
+
+def expected_tags_mask(tags_through):
+    """
+    Выражение с маской тегов рецепта: сумма 1 << bit по его тегам.
+
+    Биты тегов различны, поэтому сумма совпадает с побитовым ИЛИ.
+    """
+    return Coalesce(
+        Subquery(
+            tags_through.objects.filter(recipe=OuterRef('pk')).order_by()
+            .values('recipe').annotate(mask=Sum(
+                Cast(Value(1), BigIntegerField()).bitleftshift(
+                    F('tag__bit')
+                ),
+                output_field=BigIntegerField(),
+            )).values('mask')
+        ),
+        0,
+    )
@@ -0,0 +1,306 @@
+import logging
+import os
+import threading
+import time
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+
+from .constants import COVERAGE_BUILD_CHUNK_SIZE, COVERAGE_INDEX_MAX_AGE
+from .models import RecipeIngredient
+
+logger = logging.getLogger(__name__)
+
+POSITION_DTYPE = np.int32
+
+
+class CoverageIndex:
+    """
+    Инвертированный индекс продукт → рецепты для подбора по продуктам.
+
+    Рецепты пронумерованы позициями; для каждого продукта хранится
+    отсортированный массив позиций рецептов с ним, для каждой позиции —
+    id рецепта и число его продуктов. Новые рецепты получают позиции в
+    конце, удалённые остаются с нулём продуктов до перестроения.
+    """
+
+    def __init__(self, recipe_ids=(), sizes=(), postings=None):
+        self.recipe_ids = np.array(recipe_ids, dtype=np.int64)
+        self.sizes = np.array(sizes, dtype=np.int32)
+        self.length = len(self.recipe_ids)
+        self.positions = {
+            int(pk): position for position, pk in enumerate(self.recipe_ids)
+        }
+        self.postings = postings or {}
+        self.built = time.monotonic()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_pairs(cls, recipe_ids, ingredient_ids):
+        """Строит индекс по массивам пар (рецепт, продукт)."""
+        recipes, positions, sizes = np.unique(
+            recipe_ids, return_inverse=True, return_counts=True
+        )
+        if not len(recipes):
+            return cls()
+        positions = positions.reshape(-1).astype(POSITION_DTYPE)
+        order = np.lexsort((positions, ingredient_ids))
+        ingredient_ids = ingredient_ids[order]
+        positions = positions[order]
+        starts = np.flatnonzero(np.diff(ingredient_ids)) + 1
+        return cls(recipes, sizes, {
+            int(ingredient): posting
+            for ingredient, posting in zip(
+                ingredient_ids[np.r_[0, starts]],
+                np.split(positions, starts),
+            )
+        })
+
+    @classmethod
+    def build(cls):
+        """Строит индекс по всем продуктам рецептов из базы."""
+        rows = RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient_id'
+        ).order_by().iterator(chunk_size=COVERAGE_BUILD_CHUNK_SIZE)
+        pairs = np.fromiter(
+            chain.from_iterable(rows), dtype=np.int64
+        ).reshape(-1, 2)
+        return cls.from_pairs(pairs[:, 0], pairs[:, 1])
+
+    def save(self, path):
+        """
+        Сохраняет индекс в формате .npz, списки продуктов — подряд.
+
+        Файл записывается под именем path как есть (np.savez дописал бы
+        ".npz" к пути без этого суффикса) и подменяется целиком, чтобы
+        процессы не прочитали его наполовину записанным.
+        """
+        with self.lock:
+            ingredients = np.array(sorted(self.postings), dtype=np.int64)
+            postings = [self.postings[pk] for pk in ingredients.tolist()]
+            with open(f'{path}.tmp', 'wb') as file:
+                self.write(file, ingredients, postings)
+        os.replace(f'{path}.tmp', path)
+
+    def write(self, file, ingredients, postings):
+        np.savez(
+            file,
+            recipe_ids=self.recipe_ids[:self.length],
+            sizes=self.sizes[:self.length],
+            ingredients=ingredients,
+            offsets=np.cumsum([0] + [len(item) for item in postings]),
+            positions=(
+                np.concatenate(postings) if postings
+                else np.empty(0, dtype=POSITION_DTYPE)
+            ),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            offsets = data['offsets']
+            positions = data['positions']
+            return cls(data['recipe_ids'], data['sizes'], {
+                int(ingredient): positions[start:end]
+                for ingredient, start, end in zip(
+                    data['ingredients'], offsets[:-1], offsets[1:]
+                )
+            })
+
+    def rank(self, ingredient_ids):
+        """
+        Рецепты, в которых есть хотя бы один из продуктов ingredient_ids.
+
+        Возвращает массивы id рецептов, числа имеющихся и всех продуктов
+        рецепта, упорядоченные по доле имеющихся продуктов, затем по
+        числу недостающих и от новых рецептов к старым.
+        """
+        with self.lock:
+            postings = [
+                self.postings[pk] for pk in set(ingredient_ids)
+                if pk in self.postings
+            ]
+            if not postings:
+                empty = np.empty(0, dtype=np.int64)
+                return empty, empty, empty
+            matched = np.bincount(
+                np.concatenate(postings), minlength=self.length
+            )
+            candidates = np.flatnonzero(matched)
+            recipe_ids = self.recipe_ids[candidates]
+            sizes = self.sizes[candidates]
+        matched = matched[candidates]
+        order = np.lexsort((-recipe_ids, sizes - matched, -matched / sizes))
+        return recipe_ids[order], matched[order], sizes[order]
+
+    def update(self, recipe_id, ingredient_ids):
+        """Заменяет продукты рецепта; пустой набор убирает рецепт."""
+        ingredient_ids = set(ingredient_ids)
+        with self.lock:
+            position = self.positions.get(recipe_id)
+            if position is None:
+                if not ingredient_ids:
+                    return
+                position = self.append(recipe_id)
+            else:
+                self.discard(position)
+            self.sizes[position] = len(ingredient_ids)
+            for pk in ingredient_ids:
+                posting = self.postings.get(pk)
+                if posting is None:
+                    self.postings[pk] = np.array(
+                        [position], dtype=POSITION_DTYPE
+                    )
+                    continue
+                self.postings[pk] = np.insert(
+                    posting, np.searchsorted(posting, position), position
+                )
+
+    def remove(self, recipe_id):
+        with self.lock:
+            position = self.positions.get(recipe_id)
+            if position is not None:
+                self.discard(position)
+                self.sizes[position] = 0
+
+    def append(self, recipe_id):
+        """Отводит рецепту новую позицию, удваивая массивы при нехватке."""
+        if self.length == len(self.recipe_ids):
+            capacity = max(2 * self.length, 1)
+            self.recipe_ids = np.resize(self.recipe_ids, capacity)
+            self.sizes = np.resize(self.sizes, capacity)
+        position = self.length
+        self.recipe_ids[position] = recipe_id
+        self.sizes[position] = 0
+        self.positions[recipe_id] = position
+        self.length += 1
+        return position
+
+    def discard(self, position):
+        """
+        Убирает позицию из списков продуктов.
+
+        Старый состав рецепта не хранится, поэтому просматриваются все
+        списки — это двоичный поиск на каждый продукт справочника.
+        """
+        for pk, posting in self.postings.items():
+            index = np.searchsorted(posting, position)
+            if index < len(posting) and posting[index] == position:
+                self.postings[pk] = np.delete(posting, index)
+
+
+class CoverageIndexHolder:
+    """
+    Индекс процесса: снимок загружается при старте, без него индекс
+    строится при первом обращении, затем перестраивается.
+
+    Изменения рецептов применяются к индексу того процесса, который их
+    сохранил; остальные процессы подхватывают их при перестроении раз в
+    COVERAGE_INDEX_MAX_AGE секунд. Перестроение идёт в фоновом потоке,
+    запросы тем временем обслуживает старый индекс.
+    """
+
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self.index = None
+        self.rebuilding = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_path():
+        return getattr(settings, 'COVERAGE_INDEX_PATH', '')
+
+    def get(self):
+        with self.lock:
+            if self.index is None:
+                self.index = self.load()
+            elif (
+                self.rebuilding is None
+                and time.monotonic() - self.index.built > self.max_age
+            ):
+                self.rebuilding = set()
+                threading.Thread(target=self.rebuild, daemon=True).start()
+            return self.index
+
+    def preload(self):
+        """
+        Загружает при старте процесса снимок команды build_coverage_index.
+
+        К базе не обращается: без снимка индекс строится при первом
+        подборе рецептов в том процессе, который его выполняет.
+        """
+        index = self.load_snapshot()
+        with self.lock:
+            if self.index is None and index is not None:
+                self.index = index
+
+    def load_snapshot(self):
+        """Индекс из снимка COVERAGE_INDEX_PATH или None."""
+        path = self.get_path()
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            index = CoverageIndex.load(path)
+        except (OSError, ValueError, KeyError):
+            logger.exception('Не удалось загрузить индекс %s', path)
+            return None
+        index.built -= time.time() - os.path.getmtime(path)
+        return index
+
+    def load(self):
+        """Загружает снимок команды build_coverage_index или строит индекс."""
+        index = self.load_snapshot()
+        return CoverageIndex.build() if index is None else index
+
+    def rebuild(self):
+        try:
+            try:
+                index = CoverageIndex.build()
+            except Exception:
+                logger.exception('Не удалось перестроить индекс продуктов')
+                index = None
+            with self.lock:
+                changed, self.rebuilding = self.rebuilding, None
+                if index is None:
+                    if self.index is not None:
+                        self.index.built = time.monotonic()
+                    return
+                self.index = index
+            # Рецепты, изменённые во время перестроения, могли не попасть
+            # в новый индекс.
+            for recipe_id in changed:
+                self.refresh(index, recipe_id)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def refresh(index, recipe_id):
+        index.update(recipe_id, RecipeIngredient.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('ingredient_id', flat=True).order_by())
+
+    def recipe_changed(self, recipe_id):
+        """Обновляет рецепт в уже загруженном индексе процесса."""
+        with self.lock:
+            index = self.index
+            if self.rebuilding is not None:
+                self.rebuilding.add(recipe_id)
+        if index is not None:
+            self.refresh(index, recipe_id)
+
+    def recipe_deleted(self, recipe_id):
+        with self.lock:
+            index = self.index
+            if self.rebuilding is not None:
+                self.rebuilding.add(recipe_id)
+        if index is not None:
+            index.remove(recipe_id)
+
+    def clear(self):
+        with self.lock:
+            self.index = None
+
+
+coverage_index = CoverageIndexHolder(COVERAGE_INDEX_MAX_AGE)
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from functools import lru_cache, partial
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.utils.module_loading import import_string
+
+from .constants import (
+    FEED_NOTIFY_CHANNEL,
+    FEED_NOTIFY_POLL_TIMEOUT,
+    FEED_NOTIFY_RECONNECT_DELAY,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def author_channel(author_id):
+    """Канал новых рецептов автора."""
+    return f'author:{author_id}'
+
+
+def user_channel(user_id):
+    """Канал изменений подписок пользователя."""
+    return f'user:{user_id}'
+
+
+class Listener:
+    """
+    Очередь сообщений одного потока событий.
+
+    Живёт в цикле событий ASGI-сервера; при переполнении новые
+    сообщения отбрасываются — клиент догонит их по ленте.
+    """
+
+    def __init__(self, loop, size):
+        self.loop = loop
+        self.queue = asyncio.Queue(size)
+        self.channels = set()
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning('Очередь событий переполнена, сообщение пропущено')
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class InProcessBroker:
+    """
+    Публикация и подписка в памяти процесса.
+
+    Публиковать можно из любого потока, слушатели получают сообщения в
+    своём цикле событий. Подходит, когда API и поток событий обслуживает
+    один процесс, и для тестов; другой брокер подключается настройкой
+    FEED_BROKER и реализует те же методы.
+    """
+
+    def __init__(self):
+        self.listeners = {}
+        self.lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self.lock:
+            listeners = list(self.listeners.get(channel, ()))
+        for listener in listeners:
+            try:
+                listener.loop.call_soon_threadsafe(listener.put, message)
+            except RuntimeError:
+                # Цикл событий уже закрыт, слушатель вот-вот отпишется.
+                pass
+
+    def listen(self, channels, size):
+        """Создаёт слушателя каналов; вызывается из цикла событий."""
+        listener = Listener(asyncio.get_running_loop(), size)
+        for channel in channels:
+            self.follow(listener, channel)
+        return listener
+
+    def follow(self, listener, channel):
+        with self.lock:
+            self.listeners.setdefault(channel, set()).add(listener)
+            listener.channels.add(channel)
+
+    def unfollow(self, listener, channel):
+        with self.lock:
+            listener.channels.discard(channel)
+            listeners = self.listeners.get(channel)
+            if listeners is not None:
+                listeners.discard(listener)
+                if not listeners:
+                    del self.listeners[channel]
+
+    def close(self, listener):
+        for channel in list(listener.channels):
+            self.unfollow(listener, channel)
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Публикация и подписка через LISTEN/NOTIFY PostgreSQL.
+
+    События публикуют WSGI-процессы API, а слушают процессы ASGI-сервера
+    потока событий. Процесс со слушателями держит отдельное соединение,
+    которое ждёт уведомлений в фоновом потоке и раздаёт их слушателям
+    процесса так же, как InProcessBroker.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.receiver = None
+
+    def publish(self, channel, message):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', (
+                FEED_NOTIFY_CHANNEL,
+                json.dumps({'channel': channel, 'message': message}),
+            ))
+
+    def listen(self, channels, size):
+        with self.lock:
+            if self.receiver is None:
+                self.receiver = threading.Thread(
+                    target=self.receive, daemon=True
+                )
+                self.receiver.start()
+        return super().listen(channels, size)
+
+    def receive(self):
+        """Раздаёт уведомления слушателям, переподключаясь при ошибках."""
+        while True:
+            try:
+                self.receive_notifications()
+            except Exception:
+                logger.exception('Соединение LISTEN прервано')
+            finally:
+                connections[DEFAULT_DB_ALIAS].close()
+            time.sleep(FEED_NOTIFY_RECONNECT_DELAY)
+
+    def receive_notifications(self):
+        database = connections[DEFAULT_DB_ALIAS]
+        with database.cursor() as cursor:
+            cursor.execute(f'LISTEN {FEED_NOTIFY_CHANNEL}')
+        raw = database.connection
+        while True:
+            if not select.select([raw], [], [], FEED_NOTIFY_POLL_TIMEOUT)[0]:
+                continue
+            raw.poll()
+            while raw.notifies:
+                event = json.loads(raw.notifies.pop(0).payload)
+                super().publish(event['channel'], event['message'])
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    """Брокер событий из настройки FEED_BROKER."""
+    return import_string(settings.FEED_BROKER)()
+
+
+def publish(channel, message):
+    """Публикует сообщение; ошибка брокера не прерывает запрос."""
+    try:
+        get_broker().publish(channel, message)
+    except Exception:
+        logger.exception('Не удалось опубликовать событие в %s', channel)
+
+
+def publish_on_commit(channel, message):
+    """Публикует сообщение после фиксации транзакции."""
+    transaction.on_commit(partial(publish, channel, message))
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db.models import Count, Q
 from ast import literal_eval
 
 from .constants import (
@@ -23,9 +24,10 @@ class HasRecipesFilter(admin.SimpleListFilter):
         )
 
     def queryset(self, request, queryset):
-        if self.value() in ['yes', 'no']:
-            has_recipes = self.value() == 'yes'
-            return queryset.filter(recipes__isnull=not has_recipes)
+        if self.value() == 'yes':
+            return queryset.filter(recipes_count__gt=0)
+        if self.value() == 'no':
+            return queryset.filter(recipes_count=0)
 
 
 class HasSubscriptionsFilter(admin.SimpleListFilter):
@@ -40,9 +42,10 @@ class HasSubscriptionsFilter(admin.SimpleListFilter):
         )
 
     def queryset(self, request, queryset):
-        if self.value() in ['yes', 'no']:
-            has_subscriptions = self.value() == 'yes'
-            return queryset.filter(following__isnull=not has_subscriptions)
+        if self.value() == 'yes':
+            return queryset.filter(subscriptions_count__gt=0)
+        if self.value() == 'no':
+            return queryset.filter(subscriptions_count=0)
 
 
 class HasFollowersFilter(admin.SimpleListFilter):
@@ -57,9 +60,10 @@ class HasFollowersFilter(admin.SimpleListFilter):
         )
 
     def queryset(self, request, queryset):
-        if self.value() in ['yes', 'no']:
-            has_followers = self.value() == 'yes'
-            return queryset.filter(followers__isnull=not has_followers)
+        if self.value() == 'yes':
+            return queryset.filter(subscribers_count__gt=0)
+        if self.value() == 'no':
+            return queryset.filter(subscribers_count=0)
 
 
 class CookingTimeFilter(admin.SimpleListFilter):
@@ -82,12 +86,20 @@ class CookingTimeFilter(admin.SimpleListFilter):
     ]
 
     def lookups(self, request, model_admin):
-        queryset = model_admin.get_queryset(request)
+        """Варианты фильтра с числом рецептов, посчитанным одним запросом."""
+        counts = model_admin.get_queryset(request).order_by().aggregate(**{
+            f'range_{index}': Count(
+                'pk', filter=Q(cooking_time__range=(start, end))
+            )
+            for index, (start, end, _) in enumerate(
+                self.COOKING_TIME_RANGES
+            )
+        })
         return [
-            ((start, end),
-             f'{label} '
-             f'({self.get_filtered_queryset(queryset, start, end).count()})')
-            for start, end, label in self.COOKING_TIME_RANGES
+            ((start, end), f'{label} ({counts[f"range_{index}"]})')
+            for index, (start, end, label) in enumerate(
+                self.COOKING_TIME_RANGES
+            )
         ]
 
     def queryset(self, request, queryset):
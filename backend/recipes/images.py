@@ -0,0 +1,164 @@
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from .cache import bump_recipe_versions
+from .constants import (
+    IMAGE_RENDITION_FORMATS,
+    IMAGE_RENDITION_QUALITY,
+    IMAGE_RENDITION_WORKERS,
+    IMAGE_RENDITIONS,
+)
+
+logger = logging.getLogger(__name__)
+
+executor = None
+executor_lock = Lock()
+
+
+def get_formats():
+    """Форматы копий, которые поддерживает установленный Pillow."""
+    Image.init()
+    return [
+        (extension, image_format)
+        for extension, image_format in IMAGE_RENDITION_FORMATS
+        if image_format in Image.SAVE
+    ]
+
+
+def rendition_name(name, size, extension):
+    """Путь копии рядом с оригиналом: dir/renditions/stem_size.ext."""
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(
+        directory, 'renditions', f'{stem}_{size}.{extension}'
+    )
+
+
+def resize(image, width, height, crop):
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.LANCZOS)
+    image = image.copy()
+    image.thumbnail((width, height), Image.LANCZOS)
+    return image
+
+
+def convert(image, image_format):
+    """Приводит режим изображения к поддерживаемому форматом."""
+    if image_format != 'JPEG':
+        return image if image.mode in ('RGB', 'RGBA') else (
+            image.convert('RGBA')
+        )
+    if image.mode == 'RGB':
+        return image
+    image = image.convert('RGBA')
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def generate_renditions(name, kind, force=False, storage=default_storage):
+    """
+    Создаёт недостающие уменьшенные копии изображения.
+
+    Возвращает число созданных файлов.
+    """
+    targets = [
+        (rendition_name(name, size, extension), spec, image_format)
+        for size, spec in IMAGE_RENDITIONS[kind].items()
+        for extension, image_format in get_formats()
+    ]
+    if not force:
+        targets = [
+            target for target in targets if not storage.exists(target[0])
+        ]
+    if not targets:
+        return 0
+    with storage.open(name) as file:
+        original = Image.open(file)
+        original.load()
+    original = ImageOps.exif_transpose(original)
+    for target, (width, height, crop), image_format in targets:
+        buffer = BytesIO()
+        convert(resize(original, width, height, crop), image_format).save(
+            buffer, image_format, quality=IMAGE_RENDITION_QUALITY
+        )
+        storage.delete(target)
+        storage.save(target, ContentFile(buffer.getvalue()))
+    return len(targets)
+
+
+def generate_renditions_logged(name, kind, callback=None):
+    try:
+        generate_renditions(name, kind)
+    except (OSError, ValueError):
+        logger.exception('Не удалось создать копии изображения %s', name)
+        return
+    if callback is None:
+        return
+    try:
+        callback()
+    finally:
+        connection.close()
+
+
+def get_executor():
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=IMAGE_RENDITION_WORKERS,
+                thread_name_prefix='image-renditions',
+            )
+        return executor
+
+
+def schedule_renditions(name, kind, callback=None):
+    """
+    Создаёт копии в пуле потоков после фиксации транзакции.
+
+    callback вызывается в потоке пула, когда все копии готовы, и
+    обычно отмечает это в модели для get_srcset().
+    """
+    if name:
+        transaction.on_commit(
+            lambda: get_executor().submit(
+                generate_renditions_logged, name, kind, callback
+            )
+        )
+
+
+def mark_renditions_ready(queryset, field, name, recipe_ids):
+    """
+    Отмечает, что копии изображения name готовы.
+
+    Запись меняется, только если изображение всё ещё name; кэш рецептов
+    сбрасывается, когда в ответах появляются копии.
+    """
+    if queryset.filter(**{field: name}).exclude(
+        **{f'{field}_renditions': name}
+    ).update(**{f'{field}_renditions': name}):
+        bump_recipe_versions(recipe_ids)
+
+
+def get_srcset(name, kind, storage=default_storage):
+    """
+    Возвращает ссылки на копии изображения по форматам.
+
+    Вызывается только для изображений, копии которых отмечены готовыми,
+    поэтому наличие файлов не проверяется.
+    """
+    srcset = {}
+    for extension, _ in get_formats():
+        for size, (width, _, _) in IMAGE_RENDITIONS[kind].items():
+            srcset.setdefault(extension, []).append((
+                storage.url(rendition_name(name, size, extension)), width
+            ))
+    return srcset
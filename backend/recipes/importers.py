@@ -0,0 +1,354 @@
+import csv
+import io
+import json
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+
+from .models import Ingredient, Tag
+from .utils import normalize_search_key
+
+JSON_READ_SIZE = 64 * 1024
+
+
+def read_csv(file, fields):
+    """
+    Читает строки CSV как записи с полями fields.
+
+    Первая строка пропускается, если совпадает с названиями полей.
+    """
+    for index, row in enumerate(csv.reader(file)):
+        if not row or index == 0 and tuple(row) == tuple(fields):
+            continue
+        yield dict(zip(fields, row))
+
+
+def read_jsonl(file, fields):
+    """Читает файл, в каждой строке которого записан один объект."""
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_json(file, fields):
+    """
+    Читает JSON-массив объектов по одному элементу.
+
+    Файл читается порциями, в памяти находится только текущий
+    недочитанный фрагмент массива.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        buffer = buffer.lstrip()
+        if started:
+            buffer = buffer.lstrip(',').lstrip()
+        if not buffer:
+            chunk = file.read(JSON_READ_SIZE)
+            if not chunk:
+                if started:
+                    raise ValueError('Массив JSON не закрыт.')
+                return
+            buffer += chunk
+            continue
+        if not started:
+            if buffer[0] != '[':
+                raise ValueError('Ожидался массив JSON.')
+            buffer = buffer[1:]
+            started = True
+            continue
+        if buffer[0] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(JSON_READ_SIZE)
+            if not chunk:
+                raise
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def default_fields(model, fields):
+    """Поля модели со значением по умолчанию, не перечисленные в fields."""
+    return [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key
+        and field.has_default()
+        and field.name not in fields
+        and field.attname not in fields
+    ]
+
+
+def bulk_insert(model, fields, rows, batch_size=5000, use_copy=None):
+    """
+    Вставляет кортежи значений полей fields без создания объектов модели.
+
+    Значения передаются в базу как есть, поэтому auto_now_add и прочие
+    pre_save не срабатывают. Остальные поля со значением по умолчанию
+    (например, счётчики) заполняются им. На PostgreSQL используется COPY.
+    Возвращает число вставленных строк.
+    """
+    if use_copy is None:
+        use_copy = connection.vendor == 'postgresql'
+    defaults = default_fields(model, fields)
+    default_values = [field.get_default() for field in defaults]
+    model_fields = [
+        model._meta.get_field(field) for field in fields
+    ] + defaults
+    table = model._meta.db_table
+    columns = ', '.join(
+        connection.ops.quote_name(field.column) for field in model_fields
+    )
+    prepare = [
+        field if field.get_internal_type() in (
+            'DateField', 'DateTimeField', 'TimeField'
+        ) else None
+        for field in model_fields
+    ]
+    inserted = 0
+    rows = iter(rows)
+    with connection.cursor() as cursor:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return inserted
+            batch = [
+                [
+                    value if field is None or value is None
+                    else field.get_db_prep_save(value, connection)
+                    for field, value in zip(
+                        prepare, (*row, *default_values)
+                    )
+                ]
+                for row in batch
+            ]
+            if use_copy:
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)',
+                    buffer,
+                )
+            else:
+                cursor.executemany(
+                    f'INSERT INTO {table} ({columns}) VALUES '
+                    f'({", ".join(["%s"] * len(model_fields))})',
+                    batch,
+                )
+            inserted += len(batch)
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+    'jsonl': read_jsonl,
+}
+
+
+class CatalogImporter:
+    """
+    Загрузка справочника с обновлением по естественному ключу.
+
+    Записи проверяются, группируются в пакеты и записываются либо через
+    ORM, либо на PostgreSQL через COPY во временную таблицу и
+    INSERT ... ON CONFLICT.
+    """
+
+    model = None
+    record_fields = ()
+    fields = ()
+    key_fields = ()
+    update_fields = ()
+    conflict_fields = ()
+
+    def __init__(self, batch_size=1000, use_copy=None):
+        self.batch_size = batch_size
+        self.use_copy = (
+            connection.vendor == 'postgresql' if use_copy is None
+            else use_copy
+        )
+        self.inserted = self.updated = self.skipped = 0
+
+    @property
+    def processed(self):
+        return self.inserted + self.updated + self.skipped
+
+    def build(self, row):
+        """Создаёт объект модели из записи файла."""
+        return self.model(**{field: row[field] for field in self.fields})
+
+    def key(self, obj):
+        return tuple(getattr(obj, field) for field in self.key_fields)
+
+    def clean(self, rows):
+        """Отбрасывает некорректные записи и повторы ключа в пакете."""
+        objects = {}
+        for row in rows:
+            try:
+                obj = self.build(row)
+                obj.clean_fields(exclude=('id',))
+            except (KeyError, TypeError, ValidationError):
+                self.skipped += 1
+                continue
+            if self.key(obj) in objects:
+                self.skipped += 1
+            objects[self.key(obj)] = obj
+        return list(objects.values())
+
+    def run(self, rows):
+        """Загружает записи пакетами."""
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return
+            objects = self.clean(batch)
+            if self.use_copy:
+                self.write_copy(objects)
+            else:
+                self.write_orm(objects)
+
+    def write_orm(self, objects):
+        existing = {
+            self.key(obj): obj
+            for obj in self.model.objects.filter(**{
+                f'{self.key_fields[0]}__in': {
+                    getattr(obj, self.key_fields[0]) for obj in objects
+                }
+            })
+        }
+        owners = {}
+        for field in self.conflict_fields:
+            for obj in self.model.objects.filter(**{
+                f'{field}__in': {getattr(obj, field) for obj in objects}
+            }):
+                owners[field, getattr(obj, field)] = self.key(obj)
+        created, updated = [], []
+        for obj in objects:
+            key = self.key(obj)
+            if any(
+                owners.setdefault((field, getattr(obj, field)), key) != key
+                for field in self.conflict_fields
+            ):
+                self.skipped += 1
+                continue
+            current = existing.get(key)
+            if current is None:
+                created.append(obj)
+                continue
+            changed = [
+                field for field in self.update_fields
+                if getattr(current, field) != getattr(obj, field)
+            ]
+            if not changed:
+                self.skipped += 1
+                continue
+            for field in changed:
+                setattr(current, field, getattr(obj, field))
+            updated.append(current)
+        self.model.objects.bulk_create(created)
+        self.model.objects.bulk_update(updated, self.update_fields)
+        self.inserted += len(created)
+        self.updated += len(updated)
+
+    def write_copy(self, objects):
+        def columns(fields, prefix=''):
+            return ', '.join(
+                prefix + self.model._meta.get_field(field).column
+                for field in fields
+            )
+
+        fields = (*self.fields, *(
+            field.name for field in default_fields(self.model, self.fields)
+        ))
+        table = self.model._meta.db_table
+        staging = f'{table}_staging'
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for obj in objects:
+            writer.writerow(getattr(obj, field) for field in fields)
+        buffer.seek(0)
+        conflicts = ''.join(
+            f' AND NOT EXISTS (SELECT 1 FROM {table} t'
+            f' WHERE t.{column} = s.{column}'
+            f' AND ({columns(self.key_fields, "t.")})'
+            f' <> ({columns(self.key_fields, "s.")}))'
+            for column in (
+                self.model._meta.get_field(field).column
+                for field in self.conflict_fields
+            )
+        )
+        updates = [
+            self.model._meta.get_field(field).column
+            for field in self.update_fields
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE IF NOT EXISTS {staging} AS '
+                f'SELECT {columns(fields)} FROM {table} WITH NO DATA'
+            )
+            cursor.execute(f'TRUNCATE {staging}')
+            cursor.copy_expert(
+                f'COPY {staging} ({columns(fields)}) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
+            cursor.execute(
+                f'INSERT INTO {table} ({columns(fields)}) '
+                f'SELECT {columns(fields, "s.")} '
+                f'FROM {staging} s WHERE TRUE{conflicts} '
+                f'ON CONFLICT ({columns(self.key_fields)}) DO UPDATE SET '
+                + ', '.join(
+                    f'{column} = EXCLUDED.{column}' for column in updates
+                )
+                + f' WHERE ({columns(self.update_fields, f"{table}.")})'
+                ' IS DISTINCT FROM '
+                f'({columns(self.update_fields, "EXCLUDED.")}) '
+                'RETURNING xmax = 0'
+            )
+            results = [inserted for inserted, in cursor.fetchall()]
+        self.inserted += sum(results)
+        self.updated += len(results) - sum(results)
+        self.skipped += len(objects) - len(results)
+
+
+class IngredientImporter(CatalogImporter):
+    model = Ingredient
+    record_fields = ('name', 'measurement_unit')
+    fields = ('name', 'measurement_unit', 'search_name')
+    key_fields = ('name', 'measurement_unit')
+    update_fields = ('search_name',)
+
+    def build(self, row):
+        name = ' '.join(row['name'].split())
+        return Ingredient(
+            name=name,
+            measurement_unit=row['measurement_unit'].strip(),
+            search_name=normalize_search_key(name),
+        )
+
+
+class TagImporter(CatalogImporter):
+    model = Tag
+    record_fields = ('name', 'slug')
+    fields = ('name', 'slug')
+    key_fields = ('slug',)
+    update_fields = ('name',)
+    conflict_fields = ('name',)
+
+    def run(self, rows):
+        """Загружает теги и раздаёт новым биты маски рецептов."""
+        super().run(rows)
+        Tag.objects.assign_bits()
+
+
+IMPORTERS = {
+    'ingredients': IngredientImporter,
+    'tags': TagImporter,
+}
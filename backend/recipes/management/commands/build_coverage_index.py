@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.coverage import CoverageIndex
+
+
+class Command(BaseCommand):
+    help = (
+        'Построение индекса подбора рецептов по продуктам и сохранение '
+        'его снимка, который процессы загружают при старте'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default=settings.COVERAGE_INDEX_PATH,
+            help='Файл .npz, по умолчанию COVERAGE_INDEX_PATH.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['output']:
+            raise CommandError(
+                'Укажите --output или переменную COVERAGE_INDEX_PATH.'
+            )
+        started = time.monotonic()
+        index = CoverageIndex.build()
+        index.save(options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс по {index.length} рецептам и {len(index.postings)} '
+            f'продуктам построен за {time.monotonic() - started:.1f} с'
+        ))
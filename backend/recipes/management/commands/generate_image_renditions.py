@@ -0,0 +1,73 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from recipes.constants import IMAGE_RENDITION_WORKERS
+from recipes.images import generate_renditions, mark_renditions_ready
+from recipes.models import Recipe, User
+
+
+class Command(BaseCommand):
+    help = 'Создание уменьшенных копий для уже загруженных изображений'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=IMAGE_RENDITION_WORKERS
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать уже существующие копии.',
+        )
+
+    def generate(self, name, kind):
+        try:
+            return generate_renditions(name, kind, force=self.force)
+        except (OSError, ValueError) as error:
+            self.stderr.write(f'{name}: {error}')
+            return None
+
+    @staticmethod
+    def mark_ready(name, kind):
+        """Отмечает готовые копии у всех владельцев изображения."""
+        if kind == 'recipe':
+            recipes = Recipe.objects.filter(image=name)
+            mark_renditions_ready(
+                recipes, 'image', name, recipes.values_list('pk', flat=True)
+            )
+        else:
+            users = User.objects.filter(avatar=name)
+            mark_renditions_ready(
+                users, 'avatar', name, Recipe.objects.filter(
+                    author__in=users
+                ).values_list('pk', flat=True)
+            )
+
+    def handle(self, *args, **options):
+        self.force = options['force']
+        images = [
+            (name, 'recipe')
+            for name in Recipe.objects.exclude(image='').values_list(
+                'image', flat=True
+            ).distinct()
+        ] + [
+            (name, 'avatar')
+            for name in User.objects.exclude(avatar='').exclude(
+                avatar__isnull=True
+            ).values_list('avatar', flat=True).distinct()
+        ]
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            results = list(executor.map(
+                lambda image: self.generate(*image), images
+            ))
+        for image, result in zip(images, results):
+            if result is not None:
+                self.mark_ready(*image)
+        failed = results.count(None)
+        created = sum(result for result in results if result)
+        self.stdout.write(self.style.SUCCESS(
+            f'Изображений: {len(images)}, создано копий: {created}, '
+            f'ошибок: {failed}, за {time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,74 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.cache import bump_reference_data_version
+from recipes.importers import IMPORTERS, READERS
+
+
+class Command(BaseCommand):
+    help = 'Потоковый импорт справочника из CSV, JSON или JSONL'
+
+    catalog = None
+    default_path = None
+
+    def add_arguments(self, parser):
+        if self.catalog is None:
+            parser.add_argument('catalog', choices=IMPORTERS)
+        parser.add_argument(
+            '--path',
+            default=self.default_path,
+            help='Путь к файлу относительно каталога проекта.',
+        )
+        parser.add_argument(
+            '--format',
+            dest='file_format',
+            choices=READERS,
+            help='Формат файла, по умолчанию определяется по расширению.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY на PostgreSQL.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Выполнить импорт и откатить транзакцию.',
+        )
+
+    def handle(self, *args, **options):
+        catalog = self.catalog or options['catalog']
+        if not options['path']:
+            raise CommandError('Укажите путь к файлу в --path.')
+        file_path = settings.BASE_DIR / options['path']
+        file_format = options['file_format'] or file_path.suffix[1:].lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {file_path}')
+        importer = IMPORTERS[catalog](
+            batch_size=options['batch_size'],
+            use_copy=False if options['no_copy'] else None,
+        )
+        started = time.monotonic()
+        try:
+            with transaction.atomic():
+                with open(file_path, 'r', encoding='utf-8') as file:
+                    importer.run(
+                        READERS[file_format](file, importer.record_fields)
+                    )
+                if options['dry_run']:
+                    transaction.set_rollback(True)
+                else:
+                    bump_reference_data_version()
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Ошибка чтения {file_path}: {error}')
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Проверен" if options["dry_run"] else "Импортирован"} '
+            f'{file_path.name}: добавлено {importer.inserted}, '
+            f'обновлено {importer.updated}, пропущено {importer.skipped} '
+            f'({importer.processed / max(elapsed, 1e-9):.0f} строк/с)'
+        ))
@@ -1,20 +1,8 @@
-import json
+from .import_catalog import Command as ImportCatalogCommand
 
-from django.conf import settings
-from django.core.management.base import BaseCommand
 
-from recipes.models import Tag
-
-
-class Command(BaseCommand):
+class Command(ImportCatalogCommand):
     help = 'Импорт тегов из data/tags.json'
 
-    def handle(self, *args, **kwargs):
-        file_path = settings.BASE_DIR / 'data' / 'tags.json'
-        with open(file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-        Tag.objects.bulk_create((
-            Tag(**item) for item in data),
-            ignore_conflicts=True
-        )
-        self.stdout.write(self.style.SUCCESS('Успешно импортированы теги'))
+    catalog = 'tags'
+    default_path = 'data/tags.json'
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from recipes.constants import SEARCH_INDEX_BATCH_SIZE
+from recipes.models import Recipe
+from recipes.search import get_backend, update_search_index
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт поискового индекса рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=SEARCH_INDEX_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        if get_backend() is None:
+            self.stdout.write(self.style.WARNING(
+                'Полнотекстовый индекс для этой базы не поддерживается.'
+            ))
+            return
+        bounds = Recipe.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            self.stdout.write(self.style.SUCCESS('Рецептов нет'))
+            return
+        started = time.monotonic()
+        batch_size = options['batch_size']
+        for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+            update_search_index(Recipe.objects.filter(
+                pk__range=(start, start + batch_size - 1)
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс пересчитан за {time.monotonic() - started:.1f} с'
+        ))
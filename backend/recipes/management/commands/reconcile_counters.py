@@ -0,0 +1,62 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+
+from recipes.counters import (
+    expected_tags_mask,
+    find_drift,
+    get_counters,
+    recount,
+)
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчёт и проверка счётчиков рецептов, избранного и подписок '
+        'и масок тегов рецептов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить расхождения, не исправляя их.',
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        problems = []
+        for model, field, related, relation in get_counters(apps):
+            drift = find_drift(model, field, related, relation)
+            if not drift:
+                continue
+            name = f'{model._meta.model_name}.{field}'
+            problems.append(
+                f'{name}: расхождений {len(drift)}, id {sorted(drift)[:10]}'
+            )
+            if not options['check']:
+                recount(model, field, related, relation, drift.keys())
+        drift = list(Recipe.objects.annotate(
+            expected=expected_tags_mask(Recipe.tags.through)
+        ).exclude(tags_mask=F('expected')).values_list(
+            'pk', flat=True
+        ).order_by())
+        if drift:
+            problems.append(
+                f'recipe.tags_mask: расхождений {len(drift)}, '
+                f'id {sorted(drift)[:10]}'
+            )
+            if not options['check']:
+                Recipe.objects.update_tags_mask(
+                    Recipe.objects.filter(pk__in=drift)
+                )
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+        message = '\n'.join(problems)
+        if options['check']:
+            raise CommandError(message)
+        self.stdout.write(self.style.WARNING(message))
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт и проверка агрегированных списков покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить расхождения, не исправляя их.',
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        expected = ShoppingListItem.objects.calculate()
+        actual = {
+            (user_id, ingredient_id): (amount, count)
+            for user_id, ingredient_id, amount, count
+            in ShoppingListItem.objects.select_for_update().values_list(
+                'user_id', 'ingredient_id', 'amount', 'recipes_count'
+            )
+        }
+        drift = {
+            key for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        }
+        if not drift:
+            self.stdout.write(self.style.SUCCESS(
+                f'Расхождений нет, строк: {len(actual)}'
+            ))
+            return
+        message = (
+            f'Расхождений: {len(drift)} у пользователей '
+            f'{sorted({user_id for user_id, _ in drift})}'
+        )
+        if options['check']:
+            raise CommandError(message)
+        self.stdout.write(self.style.WARNING(message))
+        ShoppingListItem.objects.apply_changes({
+            key: tuple(
+                new - old for new, old in zip(
+                    expected.get(key, (0, 0)), actual.get(key, (0, 0))
+                )
+            )
+            for key in drift
+        })
+        self.stdout.write(self.style.SUCCESS('Списки покупок пересчитаны'))
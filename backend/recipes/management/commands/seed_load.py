@@ -0,0 +1,324 @@
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate, islice
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from recipes.constants import SEARCH_INDEX_BATCH_SIZE
+from recipes.counters import expected_count, get_counters
+from recipes.importers import (
+    IngredientImporter,
+    TagImporter,
+    bulk_insert,
+    read_csv,
+    read_json,
+)
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingListItem,
+    Subscriptions,
+    Tag,
+    User,
+)
+from recipes.search import update_search_index
+
+USERS_PER_SCALE = 100_000
+RECIPES_PER_SCALE = 1_000_000
+SEED_IMAGE = 'recipe_images/seed.png'
+SEED_PASSWORD = 'seed-password'
+PUB_DATE_SPREAD = timedelta(days=365)
+SHOPPING_LIST_USERS_BATCH = 1000
+
+
+def parse_range(value):
+    """Разбирает диапазон вида "1-3" или одно число."""
+    low, _, high = value.partition('-')
+    low, high = int(low), int(high or low)
+    if not 0 <= low <= high:
+        raise CommandError(f'Неверный диапазон: {value}')
+    return low, high
+
+
+class ZipfSampler:
+    """
+    Выбор элементов с популярностью по закону Ципфа.
+
+    Ранги популярности назначаются детерминированной перестановкой
+    элементов, поэтому популярные объекты не совпадают с первыми id.
+    """
+
+    def __init__(self, items, exponent, rng):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)
+        ))
+
+    def sample(self, rng, count):
+        """Возвращает до count различных элементов."""
+        count = min(count, len(self.items))
+        chosen = dict.fromkeys(
+            rng.choices(self.items, cum_weights=self.cum_weights, k=count)
+        )
+        while len(chosen) < count:
+            chosen.update(dict.fromkeys(rng.choices(
+                self.items, cum_weights=self.cum_weights, k=count
+            )))
+        return list(islice(chosen, count))
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерация детерминированных данных для нагрузочного тестирования: '
+        'scale=1 — 100 тыс. пользователей и 1 млн рецептов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=0.01)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--zipf',
+            type=float,
+            default=1.1,
+            help='Показатель распределения популярности.',
+        )
+        parser.add_argument('--tags-per-recipe', default='1-3')
+        parser.add_argument('--ingredients-per-recipe', default='5-15')
+        parser.add_argument('--favorites-per-user', default='0-40')
+        parser.add_argument('--carts-per-user', default='0-10')
+        parser.add_argument('--subscriptions-per-user', default='0-20')
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY на PostgreSQL.',
+        )
+
+    def insert(self, model, fields, rows):
+        started = time.monotonic()
+        inserted = bulk_insert(
+            model,
+            fields,
+            rows,
+            batch_size=self.options['batch_size'],
+            use_copy=False if self.options['no_copy'] else None,
+        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'{model._meta.db_table}: {inserted} строк за {elapsed:.1f} с '
+            f'({inserted / max(elapsed, 1e-9):.0f} строк/с)'
+        )
+        return inserted
+
+    def rng(self, name):
+        return random.Random(f'{self.options["seed"]}:{name}')
+
+    def load_catalog(self):
+        if not Ingredient.objects.exists():
+            with open(
+                settings.BASE_DIR / 'data' / 'ingredients.csv',
+                encoding='utf-8',
+            ) as file:
+                IngredientImporter().run(
+                    read_csv(file, IngredientImporter.record_fields)
+                )
+        if not Tag.objects.exists():
+            with open(
+                settings.BASE_DIR / 'data' / 'tags.json', encoding='utf-8'
+            ) as file:
+                TagImporter().run(read_json(file, TagImporter.record_fields))
+        return (
+            list(Ingredient.objects.values_list('pk', flat=True)),
+            list(Tag.objects.values_list('pk', flat=True)),
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        prefix = f'load{options["seed"]}'
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(
+                f'Данные с seed={options["seed"]} уже сгенерированы.'
+            )
+        ranges = {
+            name: parse_range(options[name])
+            for name in (
+                'tags_per_recipe',
+                'ingredients_per_recipe',
+                'favorites_per_user',
+                'carts_per_user',
+                'subscriptions_per_user',
+            )
+        }
+        users_count = max(1, int(USERS_PER_SCALE * options['scale']))
+        recipes_count = max(1, int(RECIPES_PER_SCALE * options['scale']))
+        now = timezone.now()
+        started = time.monotonic()
+        with transaction.atomic():
+            ingredient_ids, tag_ids = self.load_catalog()
+            first_user = (
+                User.objects.aggregate(Max('pk'))['pk__max'] or 0
+            ) + 1
+            first_recipe = (
+                Recipe.objects.aggregate(Max('pk'))['pk__max'] or 0
+            ) + 1
+            user_ids = range(first_user, first_user + users_count)
+            recipe_ids = range(first_recipe, first_recipe + recipes_count)
+            password = make_password(SEED_PASSWORD)
+            self.insert(
+                User,
+                (
+                    'id', 'password', 'is_superuser', 'is_staff',
+                    'is_active', 'date_joined', 'username', 'email',
+                    'first_name', 'last_name',
+                ),
+                (
+                    (
+                        user_id, password, False, False, True, now,
+                        f'{prefix}-{index}', f'{prefix}-{index}@example.com',
+                        f'Имя {index}', f'Фамилия {index}',
+                    )
+                    for index, user_id in enumerate(user_ids)
+                ),
+            )
+            rng = self.rng('recipes')
+            authors = ZipfSampler(user_ids, options['zipf'], rng)
+            self.insert(
+                Recipe,
+                (
+                    'id', 'name', 'author', 'text', 'image', 'pub_date',
+                    'cooking_time',
+                ),
+                (
+                    (
+                        recipe_id,
+                        f'{prefix} рецепт {index}',
+                        authors.sample(rng, 1)[0],
+                        f'Описание рецепта {index}',
+                        SEED_IMAGE,
+                        now - PUB_DATE_SPREAD * rng.random(),
+                        rng.randint(1, 180),
+                    )
+                    for index, recipe_id in enumerate(recipe_ids)
+                ),
+            )
+            rng = self.rng('tags')
+            tags = ZipfSampler(tag_ids, options['zipf'], rng)
+            self.insert(
+                Recipe.tags.through,
+                ('recipe', 'tag'),
+                (
+                    (recipe_id, tag_id)
+                    for recipe_id in recipe_ids
+                    for tag_id in tags.sample(
+                        rng, rng.randint(*ranges['tags_per_recipe'])
+                    )
+                ),
+            )
+            rng = self.rng('ingredients')
+            ingredients = ZipfSampler(ingredient_ids, options['zipf'], rng)
+            self.insert(
+                RecipeIngredient,
+                ('recipe', 'ingredient', 'amount'),
+                (
+                    (recipe_id, ingredient_id, rng.randint(1, 500))
+                    for recipe_id in recipe_ids
+                    for ingredient_id in ingredients.sample(
+                        rng, rng.randint(*ranges['ingredients_per_recipe'])
+                    )
+                ),
+            )
+            for model, name in (
+                (Favorite, 'favorites_per_user'),
+                (ShoppingCart, 'carts_per_user'),
+            ):
+                rng = self.rng(name)
+                recipes = ZipfSampler(recipe_ids, options['zipf'], rng)
+                self.insert(
+                    model,
+                    ('user', 'recipe'),
+                    (
+                        (user_id, recipe_id)
+                        for user_id in user_ids
+                        for recipe_id in recipes.sample(
+                            rng, rng.randint(*ranges[name])
+                        )
+                    ),
+                )
+            rng = self.rng('subscriptions')
+            authors = ZipfSampler(user_ids, options['zipf'], rng)
+            self.insert(
+                Subscriptions,
+                ('user', 'author'),
+                (
+                    (user_id, author_id)
+                    for user_id in user_ids
+                    for author_id in authors.sample(
+                        rng, rng.randint(*ranges['subscriptions_per_user'])
+                    )
+                    if author_id != user_id
+                ),
+            )
+            self.insert(
+                ShoppingListItem,
+                ('user', 'ingredient', 'amount', 'recipes_count'),
+                (
+                    (user_id, ingredient_id, amount, count)
+                    for start in range(
+                        user_ids.start, user_ids.stop,
+                        SHOPPING_LIST_USERS_BATCH,
+                    )
+                    for (user_id, ingredient_id), (amount, count)
+                    in ShoppingListItem.objects.calculate(
+                        user_ids=range(
+                            start,
+                            min(
+                                start + SHOPPING_LIST_USERS_BATCH,
+                                user_ids.stop,
+                            ),
+                        )
+                    ).items()
+                ),
+            )
+            scopes = {
+                User: (user_ids.start, user_ids.stop - 1),
+                Recipe: (recipe_ids.start, recipe_ids.stop - 1),
+            }
+            for model, field, related, relation in get_counters(apps):
+                objects = model.objects.all()
+                if model in scopes:
+                    objects = objects.filter(pk__range=scopes[model])
+                objects.update(**{field: expected_count(related, relation)})
+            Recipe.objects.update_tags_mask(
+                Recipe.objects.filter(pk__range=scopes[Recipe])
+            )
+            started_index = time.monotonic()
+            for start in range(
+                recipe_ids.start, recipe_ids.stop, SEARCH_INDEX_BATCH_SIZE
+            ):
+                update_search_index(Recipe.objects.filter(pk__range=(
+                    start, start + SEARCH_INDEX_BATCH_SIZE - 1
+                )))
+            self.stdout.write(
+                f'Поисковый индекс: {time.monotonic() - started_index:.1f} с'
+            )
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [User, Recipe]
+                ):
+                    cursor.execute(sql)
+        self.stdout.write(self.style.SUCCESS(
+            f'Сгенерировано за {time.monotonic() - started:.1f} с: '
+            f'пользователей {users_count}, рецептов {recipes_count}'
+        ))
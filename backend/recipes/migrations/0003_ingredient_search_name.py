@@ -0,0 +1,56 @@
+from django.db import migrations, models
+
+from recipes.utils import normalize_search_key
+
+
+def fill_search_name(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    ingredients = list(Ingredient.objects.only('id', 'name'))
+    for ingredient in ingredients:
+        ingredient.search_name = normalize_search_key(ingredient.name)
+    Ingredient.objects.bulk_update(
+        ingredients, ('search_name',), batch_size=1000
+    )
+
+
+def create_trigram_index(apps, schema_editor):
+    # Поиск по началу названия обслуживает индекс "_like" с
+    # varchar_pattern_ops, который Django создаёт для db_index=True.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_ingredient_search_name_trgm '
+        'ON recipes_ingredient USING gin (search_name gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS recipes_ingredient_search_name_trgm'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='search_name',
+            field=models.CharField(default='', editable=False, max_length=256, verbose_name='Название для поиска'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='ingredient',
+            name='search_name',
+            field=models.CharField(db_index=True, editable=False, max_length=256, verbose_name='Название для поиска'),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
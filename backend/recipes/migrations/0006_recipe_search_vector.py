@@ -0,0 +1,87 @@
+# Generated by Django 3.2.3 on 2026-10-18 19:42
+
+import django.contrib.postgres.search
+from django.db import migrations
+from django.db.utils import OperationalError
+
+from recipes.utils import normalize_search_key
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_gin '
+            'ON recipes_recipe USING gin (search_vector)'
+        )
+        schema_editor.execute(
+            "UPDATE recipes_recipe r SET search_vector = "
+            "setweight(to_tsvector('russian', r.name), 'A') "
+            "|| setweight(to_tsvector('russian', coalesce(("
+            "SELECT string_agg(i.name, ' ') "
+            "FROM recipes_recipeingredient ri "
+            "JOIN recipes_ingredient i ON i.id = ri.ingredient_id "
+            "WHERE ri.recipe_id = r.id), '')), 'B') "
+            "|| setweight(to_tsvector('russian', r.text), 'C')"
+        )
+    elif vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts '
+                'USING fts5(name, ingredients, text, '
+                "tokenize='unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite собран без FTS5: поиск работает через icontains.
+            return
+        Recipe = apps.get_model('recipes', 'Recipe')
+        RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+        ingredients = {}
+        for recipe_id, name in RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient__name'
+        ):
+            ingredients.setdefault(recipe_id, []).append(name)
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO recipes_recipe_fts '
+                '(rowid, name, ingredients, text) VALUES (%s, %s, %s, %s)',
+                [
+                    (
+                        pk,
+                        normalize_search_key(name),
+                        normalize_search_key(
+                            ' '.join(ingredients.get(pk, ()))
+                        ),
+                        normalize_search_key(text),
+                    )
+                    for pk, name, text in Recipe.objects.values_list(
+                        'pk', 'name', 'text'
+                    )
+                ],
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP INDEX IF EXISTS recipes_recipe_search_vector_gin'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS recipes_recipe_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
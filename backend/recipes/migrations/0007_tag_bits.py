@@ -0,0 +1,40 @@
+# Generated by Django 3.2.3 on 2026-10-18 19:49
+
+from django.db import migrations, models
+
+from recipes.constants import TAG_MASK_BITS
+from recipes.counters import expected_tags_mask
+
+
+def fill_tags_masks(apps, schema_editor):
+    Tag = apps.get_model('recipes', 'Tag')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    for bit, tag_id in zip(
+        range(TAG_MASK_BITS),
+        Tag.objects.order_by('pk').values_list('pk', flat=True),
+    ):
+        Tag.objects.filter(pk=tag_id).update(bit=bit)
+    Recipe.objects.update(
+        tags_mask=expected_tags_mask(apps.get_model('recipes', 'Recipe_tags'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Маска тегов'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, unique=True, verbose_name='Бит в маске рецептов'),
+        ),
+        migrations.RunPython(fill_tags_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_renditions',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100, verbose_name='Изображение с готовыми копиями'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avatar_renditions',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100, verbose_name='Аватар с готовыми копиями'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+def drop_prefix_index(apps, schema_editor):
+    # Индекс создавала прежняя версия 0003; он повторял индекс "_like".
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS recipes_ingredient_search_name_prefix'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_renditions'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_prefix_index, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,8 @@
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.utils.translation import gettext_lazy as _
 
 from .constants import (
@@ -15,13 +16,85 @@ from .constants import (
     MAX_LENGTH_USERNAME,
     MIN_COOKING_TIME,
     MIN_INGREDIENT_AMOUNT,
+    TAG_BIT_ATTEMPTS,
+    TAG_MASK_BITS,
 )
+from .counters import expected_tags_mask, shift_counter
+from .utils import normalize_search_key
 from .validators import validate_username
 
 
-class User(AbstractUser):
+class DenormalizedFieldsMixin:
+    """
+    Не записывает при обычном save() поля из denormalized_fields.
+
+    Счётчики и подобные поля меняются отдельными UPDATE, поэтому
+    сохранение экземпляра, загруженного раньше, затёрло бы их
+    устаревшими значениями. Явный update_fields не меняется.
+
+    Поля, значения которых отличаются от загруженных из базы,
+    записываются в changed_fields, чтобы обработчики post_save не
+    считали изменёнными все сохранённые поля. При явном update_fields
+    и создании записи changed_fields равно None.
+    """
+
+    denormalized_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_values = {
+            attname: instance.get_saved_value(cls._meta.get_field(attname))
+            for attname in field_names
+        }
+        return instance
+
+    def get_saved_value(self, field):
+        return field.get_prep_value(getattr(self, field.attname))
+
+    def save(self, *args, **kwargs):
+        self.changed_fields = None
+        loaded = getattr(self, 'loaded_values', None)
+        if (
+            not self._state.adding
+            and not args
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+        ):
+            deferred = self.get_deferred_fields()
+            fields = [
+                field for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.denormalized_fields
+                and field.attname not in deferred
+            ]
+            kwargs['update_fields'] = [field.name for field in fields]
+            if loaded is not None:
+                self.changed_fields = {
+                    field.name for field in fields
+                    if field.attname not in loaded
+                    or self.get_saved_value(field) != loaded[field.attname]
+                }
+        super().save(*args, **kwargs)
+        if loaded is not None:
+            saved = kwargs.get('update_fields')
+            for field in self._meta.concrete_fields:
+                if field.attname in loaded and (
+                    saved is None or field.name in saved
+                ):
+                    loaded[field.attname] = self.get_saved_value(field)
+
+
+class User(DenormalizedFieldsMixin, AbstractUser):
     """Модель пользователя."""
 
+    denormalized_fields = (
+        'recipes_count',
+        'subscribers_count',
+        'subscriptions_count',
+        'avatar_renditions',
+    )
+
     username = models.CharField(
         verbose_name='Имя пользователя',
         unique=True,
@@ -46,6 +119,28 @@ class User(AbstractUser):
         null=True,
         default=None
     )
+    avatar_renditions = models.CharField(
+        verbose_name='Аватар с готовыми копиями',
+        max_length=100,
+        blank=True,
+        default='',
+        editable=False,
+    )
+    recipes_count = models.IntegerField(
+        verbose_name='Число рецептов',
+        default=0,
+        editable=False,
+    )
+    subscribers_count = models.IntegerField(
+        verbose_name='Число подписчиков',
+        default=0,
+        editable=False,
+    )
+    subscriptions_count = models.IntegerField(
+        verbose_name='Число подписок',
+        default=0,
+        editable=False,
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -59,6 +154,32 @@ class User(AbstractUser):
         return self.username
 
 
+class SubscriptionsManager(models.Manager):
+    """Менеджер подписок, поддерживающий счётчики пользователей."""
+
+    @transaction.atomic
+    def subscribe(self, user, author):
+        """Подписывает user на author, возвращает признак создания."""
+        _, created = self.get_or_create(user=user, author=author)
+        if created:
+            self.shift_counters([user.pk], [author.pk], 1)
+        return created
+
+    @transaction.atomic
+    def unsubscribe(self, user, author):
+        """Отписывает user от author, возвращает признак удаления."""
+        deleted, _ = self.filter(user=user, author=author).delete()
+        if deleted:
+            self.shift_counters([user.pk], [author.pk], -1)
+        return bool(deleted)
+
+    @staticmethod
+    def shift_counters(user_ids, author_ids, delta):
+        """Изменяет счётчики подписок user_ids и подписчиков author_ids."""
+        shift_counter(User, 'subscriptions_count', user_ids, delta)
+        shift_counter(User, 'subscribers_count', author_ids, delta)
+
+
 class Subscriptions(models.Model):
     """Модель подписки пользователя на других пользователей."""
 
@@ -75,6 +196,8 @@ class Subscriptions(models.Model):
         on_delete=models.CASCADE,
     )
 
+    objects = SubscriptionsManager()
+
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
@@ -90,8 +213,42 @@ class Subscriptions(models.Model):
                 f'на {self.author.username[:MAX_LENGTH_NAME]}')
 
 
-class Tag(models.Model):
-    """Модель тега для рецептов."""
+class TagManager(models.Manager):
+    """Менеджер тегов, раздающий биты маски рецептов."""
+
+    def free_bits(self):
+        taken = set(self.exclude(bit=None).values_list('bit', flat=True))
+        return [bit for bit in range(TAG_MASK_BITS) if bit not in taken]
+
+    def assign_bits(self):
+        """
+        Раздаёт свободные биты тегам, созданным в обход save().
+
+        Маски рецептов с этими тегами пересчитываются, иначе фильтр по
+        маске не нашёл бы их.
+        """
+        assigned = []
+        for tag_id, bit in zip(
+            self.filter(bit=None).order_by('pk').values_list('pk', flat=True),
+            self.free_bits(),
+        ):
+            self.filter(pk=tag_id).update(bit=bit)
+            assigned.append(tag_id)
+        if assigned:
+            Recipe.objects.update_tags_mask(
+                Recipe.objects.filter(tags__in=assigned)
+            )
+
+
+class Tag(DenormalizedFieldsMixin, models.Model):
+    """
+    Модель тега для рецептов.
+
+    Пока тегов не больше TAG_MASK_BITS, у каждого есть бит в маске
+    рецепта; теги сверх этого фильтруются по связям.
+    """
+
+    denormalized_fields = ('recipes_count',)
 
     name = models.CharField(
         verbose_name='Название',
@@ -103,6 +260,19 @@ class Tag(models.Model):
         max_length=MAX_LENGTH_SLUG,
         unique=True,
     )
+    recipes_count = models.IntegerField(
+        verbose_name='Число рецептов',
+        default=0,
+        editable=False,
+    )
+    bit = models.PositiveSmallIntegerField(
+        verbose_name='Бит в маске рецептов',
+        null=True,
+        unique=True,
+        editable=False,
+    )
+
+    objects = TagManager()
 
     class Meta:
         verbose_name = 'Тэг'
@@ -112,10 +282,36 @@ class Tag(models.Model):
     def __str__(self):
         return self.name[:MAX_LENGTH_NAME]
 
-
-class Ingredient(models.Model):
+    def save(self, *args, **kwargs):
+        """
+        Сохраняет тег, отводя ему свободный бит маски.
+
+        Тот же бит могла одновременно занять другая транзакция; тогда
+        уникальность bit нарушается, и сохранение повторяется со
+        следующим свободным битом.
+        """
+        if self.bit is not None:
+            return super().save(*args, **kwargs)
+        for attempt in range(TAG_BIT_ATTEMPTS):
+            self.bit = next(iter(Tag.objects.free_bits()), None)
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                if (
+                    self.bit is None
+                    or attempt == TAG_BIT_ATTEMPTS - 1
+                    or not Tag.objects.filter(bit=self.bit).exists()
+                ):
+                    self.bit = None
+                    raise
+
+
+class Ingredient(DenormalizedFieldsMixin, models.Model):
     """Модель ингредиента для рецептов."""
 
+    denormalized_fields = ('recipes_count',)
+
     name = models.CharField(
         verbose_name='Название',
         max_length=MAX_LENGTH_NAME,
@@ -124,6 +320,17 @@ class Ingredient(models.Model):
         verbose_name='Единица измерения',
         max_length=MAX_LENGTH_UNIT,
     )
+    search_name = models.CharField(
+        verbose_name='Название для поиска',
+        max_length=MAX_LENGTH_NAME,
+        editable=False,
+        db_index=True,
+    )
+    recipes_count = models.IntegerField(
+        verbose_name='Число рецептов',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Продукт'
@@ -139,10 +346,67 @@ class Ingredient(models.Model):
     def __str__(self):
         return f'{self.name} ({self.measurement_unit})'
 
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_search_key(self.name)
+        super().save(*args, **kwargs)
+
+
+class RecipeManager(models.Manager):
+    """
+    Менеджер рецептов, поддерживающий счётчики рецептов.
+
+    Методы вызываются в транзакции изменения рецепта и переводят
+    разницу наборов id в приращения счётчиков авторов, тегов и
+    продуктов.
+    """
+
+    def author_changed(self, old_author_id, new_author_id):
+        if old_author_id != new_author_id:
+            shift_counter(User, 'recipes_count', [old_author_id], -1)
+            shift_counter(User, 'recipes_count', [new_author_id], 1)
+
+    def relations_changed(
+        self, old_tags, new_tags, old_ingredients, new_ingredients
+    ):
+        """Принимает наборы id тегов и продуктов до и после изменения."""
+        for model, old, new in (
+            (Tag, set(old_tags), set(new_tags)),
+            (Ingredient, set(old_ingredients), set(new_ingredients)),
+        ):
+            shift_counter(model, 'recipes_count', new - old, 1)
+            shift_counter(model, 'recipes_count', old - new, -1)
+
+    def update_tags_mask(self, recipes):
+        """Пересчитывает маску тегов у рецептов из выборки recipes."""
+        return recipes.update(
+            tags_mask=expected_tags_mask(self.model.tags.through)
+        )
+
+    def tag_removed(self, tag):
+        """Снимает бит тега с масок рецептов, пока связи ещё на месте."""
+        if tag.bit is not None:
+            self.filter(tags=tag).update(
+                tags_mask=models.F('tags_mask').bitand(~(1 << tag.bit))
+            )
+
+    def recipe_deleted(self, recipe):
+        """Вычитает удаляемый рецепт из счётчиков."""
+        self.author_changed(recipe.author_id, None)
+        self.relations_changed(
+            recipe.tags.values_list('pk', flat=True),
+            (),
+            recipe.recipeingredients.values_list('ingredient_id', flat=True),
+            (),
+        )
+
 
-class Recipe(models.Model):
+class Recipe(DenormalizedFieldsMixin, models.Model):
     """Модель рецепта."""
 
+    denormalized_fields = (
+        'favorites_count', 'tags_mask', 'search_vector', 'image_renditions'
+    )
+
     name = models.CharField(
         verbose_name='Название',
         max_length=MAX_LENGTH_NAME
@@ -170,6 +434,13 @@ class Recipe(models.Model):
         verbose_name='Изображение',
         upload_to='recipe_images/'
     )
+    image_renditions = models.CharField(
+        verbose_name='Изображение с готовыми копиями',
+        max_length=100,
+        blank=True,
+        default='',
+        editable=False,
+    )
     pub_date = models.DateTimeField(
         verbose_name='Дата публикации',
         auto_now_add=True
@@ -180,12 +451,39 @@ class Recipe(models.Model):
             MinValueValidator(MIN_COOKING_TIME)
         ]
     )
+    favorites_count = models.IntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    tags_mask = models.BigIntegerField(
+        verbose_name='Маска тегов',
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeManager()
 
     class Meta:
         default_related_name = '%(class)ss'
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('-pub_date', 'id'),
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=('author', '-pub_date', 'id'),
+                name='recipe_author_pub_date_idx',
+            ),
+        )
         constraints = (
             models.UniqueConstraint(
                 fields=('name', 'author',),
@@ -234,6 +532,123 @@ class RecipeIngredient(models.Model):
                 f'{self.ingredient.name} для {self.recipe.name}')
 
 
+def lock_users(user_ids):
+    """
+    Блокирует строки пользователей до конца транзакции.
+
+    Изменения избранного, корзины и агрегата списка покупок одного
+    пользователя так выполняются по очереди, и проверка «уже добавлено»
+    не устаревает до вставки. Строки берутся в порядке id, чтобы
+    транзакции не блокировали друг друга крест-накрест.
+    """
+    list(
+        User.objects.select_for_update().filter(pk__in=user_ids)
+        .order_by('pk').values_list('pk', flat=True)
+    )
+
+
+class UserRecipeManager(models.Manager):
+    """Менеджер связей пользователя и рецепта."""
+
+    def add_recipe(self, user, recipe):
+        """Добавляет рецепт пользователю, возвращает признак добавления."""
+        created, _, _ = self.add_recipes(user, [recipe.pk])
+        return bool(created)
+
+    def remove_recipe(self, user, recipe):
+        """Удаляет рецепт у пользователя, возвращает признак удаления."""
+        deleted, _ = self.remove_recipes(user, [recipe.pk])
+        return bool(deleted)
+
+    @transaction.atomic
+    def add_recipes(self, user, recipe_ids):
+        """
+        Добавляет пользователю рецепты из списка.
+
+        Возвращает отсортированные списки добавленных, уже добавленных
+        ранее и несуществующих id.
+        """
+        recipe_ids = set(recipe_ids)
+        lock_users([user.pk])
+        found = dict(
+            Recipe.objects.filter(pk__in=recipe_ids).annotate(
+                present=models.Exists(
+                    self.filter(user=user, recipe=models.OuterRef('pk'))
+                )
+            ).values_list('pk', 'present')
+        )
+        created = sorted(pk for pk, present in found.items() if not present)
+        self.bulk_create(
+            self.model(user=user, recipe_id=pk) for pk in created
+        )
+        if created:
+            self.recipes_added(user, created)
+        return (
+            created,
+            sorted(pk for pk, present in found.items() if present),
+            sorted(recipe_ids - found.keys()),
+        )
+
+    @transaction.atomic
+    def remove_recipes(self, user, recipe_ids):
+        """
+        Удаляет у пользователя рецепты из списка.
+
+        Возвращает отсортированные списки удалённых id и id, которых
+        у пользователя не было.
+        """
+        recipe_ids = set(recipe_ids)
+        lock_users([user.pk])
+        relations = self.filter(user=user, recipe_id__in=recipe_ids)
+        deleted = sorted(
+            relations.select_for_update().values_list('recipe_id', flat=True)
+        )
+        if deleted:
+            relations.delete()
+            self.recipes_removed(user, deleted)
+        return deleted, sorted(recipe_ids.difference(deleted))
+
+    def clear(self, user):
+        """Удаляет все рецепты пользователя, возвращает их число."""
+        deleted, _ = self.remove_recipes(
+            user, self.filter(user=user).values_list('recipe_id', flat=True)
+        )
+        return len(deleted)
+
+    def recipes_added(self, user, recipe_ids):
+        """Вызывается в транзакции после добавления рецептов."""
+
+    def recipes_removed(self, user, recipe_ids):
+        """Вызывается в транзакции после удаления рецептов."""
+
+
+class FavoriteManager(UserRecipeManager):
+    """Менеджер избранного, поддерживающий счётчик рецептов."""
+
+    def recipes_added(self, user, recipe_ids):
+        shift_counter(Recipe, 'favorites_count', recipe_ids, 1)
+
+    def recipes_removed(self, user, recipe_ids):
+        shift_counter(Recipe, 'favorites_count', recipe_ids, -1)
+
+
+class ShoppingCartManager(UserRecipeManager):
+    """Менеджер списка покупок, поддерживающий агрегат продуктов."""
+
+    def recipes_added(self, user, recipe_ids):
+        ShoppingListItem.objects.add_recipes(user, recipe_ids)
+
+    def recipes_removed(self, user, recipe_ids):
+        ShoppingListItem.objects.remove_recipes(user, recipe_ids)
+
+    @transaction.atomic
+    def clear(self, user):
+        """Очищает список покупок вместе с агрегатом продуктов."""
+        deleted, _ = self.filter(user=user).delete()
+        ShoppingListItem.objects.filter(user=user).delete()
+        return deleted
+
+
 class UserRecipeBase(models.Model):
     """Базовая модель для связи пользователя и рецепта."""
 
@@ -248,6 +663,8 @@ class UserRecipeBase(models.Model):
         verbose_name='Рецепт',
     )
 
+    objects = UserRecipeManager()
+
     class Meta:
         abstract = True
         default_related_name = '%(class)ss'
@@ -265,6 +682,8 @@ class UserRecipeBase(models.Model):
 class Favorite(UserRecipeBase):
     """Модель избранных рецептов пользователя."""
 
+    objects = FavoriteManager()
+
     class Meta(UserRecipeBase.Meta):
         verbose_name = _('Избранный рецепт')
         verbose_name_plural = _('Избранные рецепты')
@@ -276,6 +695,8 @@ class Favorite(UserRecipeBase):
 class ShoppingCart(UserRecipeBase):
     """Модель списка покупок пользователя."""
 
+    objects = ShoppingCartManager()
+
     class Meta(UserRecipeBase.Meta):
         verbose_name = _('Список покупок')
         verbose_name_plural = _('Списки покупок')
@@ -285,3 +706,161 @@ class ShoppingCart(UserRecipeBase):
             f'{self.user.username} добавил '
             f'в список покупок {self.recipe.name}'
         )
+
+
+class ShoppingListItemManager(models.Manager):
+    """
+    Менеджер агрегата списка покупок.
+
+    Все изменения выражаются приращениями количества продукта и числа
+    рецептов, из которых он попал в список, и применяются в текущей
+    транзакции под блокировкой строк затронутых пользователей.
+    """
+
+    @transaction.atomic
+    def apply_changes(self, changes):
+        """
+        Применяет изменения вида {(user_id, ingredient_id): (amount, count)}.
+
+        Строки, у которых не осталось рецептов, удаляются.
+        """
+        changes = {key: delta for key, delta in changes.items() if any(delta)}
+        if not changes:
+            return
+        lock_users({user_id for user_id, _ in changes})
+        items = {
+            (item.user_id, item.ingredient_id): item
+            for item in self.select_for_update().filter(
+                user_id__in={user_id for user_id, _ in changes},
+                ingredient_id__in={
+                    ingredient_id for _, ingredient_id in changes
+                },
+            )
+        }
+        created, updated, deleted = [], [], []
+        for (user_id, ingredient_id), (amount, count) in changes.items():
+            item = items.get((user_id, ingredient_id))
+            if item is None:
+                if count > 0:
+                    created.append(self.model(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=amount,
+                        recipes_count=count,
+                    ))
+                continue
+            item.amount += amount
+            item.recipes_count += count
+            if item.recipes_count > 0:
+                updated.append(item)
+            else:
+                deleted.append(item.pk)
+        self.bulk_create(created)
+        self.bulk_update(updated, ('amount', 'recipes_count'))
+        self.filter(pk__in=deleted).delete()
+
+    def _recipe_changes(self, user, recipe_ids, sign):
+        changes = {}
+        for ingredient_id, amount in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('ingredient_id', 'amount'):
+            total, count = changes.get((user.pk, ingredient_id), (0, 0))
+            changes[user.pk, ingredient_id] = (
+                total + sign * amount, count + sign
+            )
+        return changes
+
+    def add_recipes(self, user, recipe_ids):
+        """Добавляет в агрегат продукты рецептов из списка покупок."""
+        self.apply_changes(self._recipe_changes(user, recipe_ids, 1))
+
+    def remove_recipes(self, user, recipe_ids):
+        """Вычитает из агрегата продукты удалённых из списка рецептов."""
+        self.apply_changes(self._recipe_changes(user, recipe_ids, -1))
+
+    def update_recipe(self, recipe, old_ingredients, new_ingredients):
+        """
+        Переносит изменение состава рецепта в списки покупок.
+
+        old_ingredients и new_ingredients — словари
+        {ingredient_id: amount} до и после изменения.
+        """
+        deltas = {}
+        for ingredient_id in old_ingredients.keys() | new_ingredients.keys():
+            old = old_ingredients.get(ingredient_id)
+            new = new_ingredients.get(ingredient_id)
+            deltas[ingredient_id] = (
+                (new or 0) - (old or 0), (new is not None) - (old is not None)
+            )
+        user_ids = ShoppingCart.objects.filter(
+            recipe=recipe
+        ).values_list('user_id', flat=True)
+        self.apply_changes({
+            (user_id, ingredient_id): delta
+            for user_id in user_ids
+            for ingredient_id, delta in deltas.items()
+        })
+
+    def delete_recipe(self, recipe):
+        """Убирает удаляемый рецепт из всех списков покупок."""
+        ingredients = dict(
+            recipe.recipeingredients.values_list('ingredient_id', 'amount')
+        )
+        self.update_recipe(recipe, ingredients, {})
+
+    def calculate(self, user_ids=None):
+        """Считает агрегат заново по корзинам пользователей."""
+        carts = ShoppingCart.objects.filter(
+            recipe__recipeingredients__isnull=False
+        )
+        if user_ids is not None:
+            carts = carts.filter(user_id__in=user_ids)
+        return {
+            (user_id, ingredient_id): (amount, count)
+            for user_id, ingredient_id, amount, count in carts.values(
+                'user_id', 'recipe__recipeingredients__ingredient_id'
+            ).annotate(
+                amount=models.Sum('recipe__recipeingredients__amount'),
+                count=models.Count('recipe'),
+            ).values_list(
+                'user_id',
+                'recipe__recipeingredients__ingredient_id',
+                'amount',
+                'count',
+            ).order_by()
+        }
+
+
+class ShoppingListItem(models.Model):
+    """Агрегированная строка списка покупок пользователя."""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Продукт',
+    )
+    amount = models.IntegerField(verbose_name='Количество')
+    recipes_count = models.IntegerField(verbose_name='Число рецептов')
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        default_related_name = '%(class)ss'
+        verbose_name = 'Продукт списка покупок'
+        verbose_name_plural = 'Продукты списка покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient',),
+                name='unique_shopping_list_user_ingredient',
+            ),
+        )
+
+    def __str__(self):
+        return (f'{self.user.username}: {self.amount} '
+                f'{self.ingredient.measurement_unit} '
+                f'из {self.ingredient.name}')
@@ -0,0 +1,42 @@
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .constants import ADMIN_EXACT_COUNT_LIMIT
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк запроса по плану PostgreSQL.
+
+    На других базах возвращает None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор списков админки для больших таблиц.
+
+    Если планировщик оценивает выборку не меньше чем в
+    ADMIN_EXACT_COUNT_LIMIT строк, число страниц считается по оценке и
+    COUNT(*) не выполняется.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < ADMIN_EXACT_COUNT_LIMIT:
+            return super().count
+        return estimate
@@ -0,0 +1,177 @@
+import re
+from itertools import islice
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db import connection
+from django.db.models import Exists, F, OuterRef, Q, Subquery
+
+from .constants import (
+    SEARCH_CONFIG,
+    SEARCH_FTS_TABLE,
+    SEARCH_INDEX_BATCH_SIZE,
+    SEARCH_WEIGHTS,
+)
+from .models import Recipe, RecipeIngredient
+from .utils import normalize_search_key
+
+
+def get_backend():
+    """
+    Способ полнотекстового поиска для текущей базы.
+
+    "postgresql" — столбец tsvector с GIN-индексом, "fts5" — теневая
+    таблица SQLite FTS5, None — поиск через icontains. Наличие таблицы
+    FTS5 проверяется один раз на соединение с базой.
+    """
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor != 'sqlite':
+        return None
+    connection.ensure_connection()
+    cached = getattr(connection, 'search_backend', None)
+    if cached is None or cached[0] is not connection.connection:
+        cached = (connection.connection, (
+            'fts5' if SEARCH_FTS_TABLE in (
+                connection.introspection.table_names()
+            ) else None
+        ))
+        connection.search_backend = cached
+    return cached[1]
+
+
+def search_vector():
+    """Выражение tsvector для рецепта: название, продукты, описание."""
+    ingredients = Subquery(
+        RecipeIngredient.objects.filter(recipe=OuterRef('pk')).order_by()
+        .values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names')
+    )
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(ingredients, weight='B', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_index(recipes):
+    """Пересчитывает поисковый индекс рецептов из выборки recipes."""
+    backend = get_backend()
+    if backend == 'postgresql':
+        recipes.update(search_vector=search_vector())
+    elif backend == 'fts5':
+        update_fts(recipes.values_list('pk', flat=True).order_by())
+
+
+def update_fts(recipe_ids):
+    """
+    Перезаписывает строки рецептов в таблице FTS5.
+
+    Токенизатор FTS5 не сводит «ё» к «е», поэтому текст нормализуется
+    так же, как поисковый запрос.
+    """
+    recipe_ids = iter(recipe_ids)
+    while True:
+        batch = list(islice(recipe_ids, SEARCH_INDEX_BATCH_SIZE))
+        if not batch:
+            return
+        ingredients = {}
+        for recipe_id, name in RecipeIngredient.objects.filter(
+            recipe_id__in=batch
+        ).values_list('recipe_id', 'ingredient__name').order_by():
+            ingredients.setdefault(recipe_id, []).append(name)
+        rows = [
+            (
+                pk,
+                normalize_search_key(name),
+                normalize_search_key(' '.join(ingredients.get(pk, ()))),
+                normalize_search_key(text),
+            )
+            for pk, name, text in Recipe.objects.filter(
+                pk__in=batch
+            ).values_list('pk', 'name', 'text').order_by()
+        ]
+        with connection.cursor() as cursor:
+            remove_fts(cursor, batch)
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_FTS_TABLE} '
+                '(rowid, name, ingredients, text) VALUES (%s, %s, %s, %s)',
+                rows,
+            )
+
+
+def remove_fts(cursor, recipe_ids):
+    cursor.execute(
+        f'DELETE FROM {SEARCH_FTS_TABLE} WHERE rowid IN '
+        f'({", ".join(["%s"] * len(recipe_ids))})',
+        recipe_ids,
+    )
+
+
+def remove_from_search_index(recipe_ids):
+    """Убирает удалённые рецепты из таблицы FTS5."""
+    recipe_ids = list(recipe_ids)
+    if recipe_ids and get_backend() == 'fts5':
+        with connection.cursor() as cursor:
+            remove_fts(cursor, recipe_ids)
+
+
+def fts_query(value):
+    """Запрос FTS5: все слова запроса как префиксы."""
+    return ' '.join(
+        f'"{word}"*'
+        for word in re.findall(r'\w+', normalize_search_key(value))
+    )
+
+
+def search_baseline(recipes, value):
+    """Поиск подстрокой без индекса, используется как запасной."""
+    return recipes.filter(
+        Q(name__icontains=value)
+        | Q(text__icontains=value)
+        | Exists(RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk'), ingredient__name__icontains=value
+        ))
+    )
+
+
+def search_recipes(recipes, value):
+    """
+    Рецепты, подходящие под запрос, с релевантностью в search_rank.
+
+    Название весит больше продуктов, продукты — больше описания.
+    """
+    backend = get_backend()
+    if backend == 'postgresql':
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return recipes.filter(search_vector=query).annotate(
+            search_rank=SearchRank(
+                F('search_vector'), query, weights=list(SEARCH_WEIGHTS)
+            )
+        ).order_by('-search_rank', '-pub_date')
+    if backend == 'fts5':
+        query = fts_query(value)
+        if not query:
+            return recipes
+        _, text, ingredients, name = SEARCH_WEIGHTS
+        # Таблица FTS5 присоединяется к рецептам, и MATCH выполняется
+        # один раз на запрос; bm25() тем меньше, чем документ релевантнее.
+        return recipes.extra(
+            tables=(SEARCH_FTS_TABLE,),
+            where=(
+                f'{SEARCH_FTS_TABLE}.rowid = {Recipe._meta.db_table}.id',
+                f'{SEARCH_FTS_TABLE} MATCH %s',
+            ),
+            params=(query,),
+            select={'search_rank': (
+                f'-bm25({SEARCH_FTS_TABLE}, {name}, {ingredients}, {text})'
+            )},
+        ).order_by('-search_rank', '-pub_date')
+    return search_baseline(recipes, value)
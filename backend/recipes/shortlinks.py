@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.db import connection
+
+from .constants import (
+    SHORT_LINK_ALPHABET,
+    SHORT_LINK_CACHE_SIZE,
+    SHORT_LINK_CACHE_TIMEOUT,
+    SHORT_LINK_MISSING_TIMEOUT,
+)
+from .models import Recipe
+
+BASE = len(SHORT_LINK_ALPHABET)
+DIGITS = {char: index for index, char in enumerate(SHORT_LINK_ALPHABET)}
+
+
+def encode(pk):
+    """Код короткой ссылки для id рецепта."""
+    code = ''
+    while True:
+        pk, digit = divmod(pk, BASE)
+        code = SHORT_LINK_ALPHABET[digit] + code
+        if not pk:
+            return code
+
+
+def decode(code):
+    """
+    Возвращает id рецепта по коду или None для некорректного кода.
+
+    Ссылки, выданные до появления кодов, содержат id цифрами и
+    по-прежнему разбираются: в алфавите кодов цифр нет.
+    """
+    if code.isascii() and code.isdigit():
+        pk = int(code)
+    else:
+        pk = 0
+        for char in code:
+            if char not in DIGITS:
+                return None
+            pk = pk * BASE + DIGITS[char]
+    _, max_pk = connection.ops.integer_field_range(
+        Recipe._meta.pk.get_internal_type()
+    )
+    # SQLite не сообщает диапазон, у него целые восьмибайтовые.
+    return pk if 0 < pk <= (max_pk or 2 ** 63 - 1) else None
+
+
+class ExistenceCache:
+    """
+    LRU-кэш процесса с признаком существования рецептов.
+
+    Отсутствующие рецепты тоже кэшируются, но на меньшее время, чтобы
+    перебор кодов не доходил до базы.
+    """
+
+    def __init__(self, size, timeout, missing_timeout):
+        self.size = size
+        self.timeout = timeout
+        self.missing_timeout = missing_timeout
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, pk):
+        """Возвращает True/False или None, если записи нет."""
+        with self.lock:
+            item = self.items.get(pk)
+            if item is None:
+                return None
+            exists, expires = item
+            if expires < time.monotonic():
+                del self.items[pk]
+                return None
+            self.items.move_to_end(pk)
+            return exists
+
+    def set(self, pk, exists):
+        timeout = self.timeout if exists else self.missing_timeout
+        with self.lock:
+            self.items[pk] = (exists, time.monotonic() + timeout)
+            self.items.move_to_end(pk)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def discard(self, pk):
+        with self.lock:
+            self.items.pop(pk, None)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+existence_cache = ExistenceCache(
+    SHORT_LINK_CACHE_SIZE,
+    SHORT_LINK_CACHE_TIMEOUT,
+    SHORT_LINK_MISSING_TIMEOUT,
+)
+
+
+def recipe_exists(pk):
+    """Проверяет существование рецепта, обращаясь к базе при промахе."""
+    exists = existence_cache.get(pk)
+    if exists is None:
+        exists = Recipe.objects.filter(pk=pk).exists()
+        existence_cache.set(pk, exists)
+    return exists
@@ -0,0 +1,249 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from .cache import bump_recipe_versions, bump_reference_data_version
+from .coverage import coverage_index
+from .events import author_channel, publish_on_commit, user_channel
+from .images import mark_renditions_ready, schedule_renditions
+from .models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingListItem,
+    Subscriptions,
+    Tag,
+    User,
+)
+from .search import remove_from_search_index, update_search_index
+from .shortlinks import existence_cache
+
+AUTHOR_FIELDS = {'username', 'first_name', 'last_name', 'email', 'avatar'}
+
+
+def get_changed_fields(instance, update_fields):
+    """
+    Поля, изменённые сохранением, или None, если изменены все.
+
+    Обычный save() записывает все поля, но DenormalizedFieldsMixin
+    отмечает, какие из них действительно изменились.
+    """
+    changed_fields = getattr(instance, 'changed_fields', None)
+    return update_fields if changed_fields is None else changed_fields
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_lists(sender, instance, **kwargs):
+    """Убирает продукты удаляемого рецепта из списков покупок."""
+    ShoppingListItem.objects.delete_recipe(instance)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Вычитает удаляемый рецепт из счётчиков автора, тегов и продуктов."""
+    Recipe.objects.recipe_deleted(instance)
+
+
+@receiver(pre_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    """
+    Вычитает избранное и подписки удаляемого пользователя из счётчиков.
+
+    Рецепты пользователя остаются без автора, их кэш сбрасывается.
+    """
+    bump_recipe_versions(instance.recipes.values_list('pk', flat=True))
+    Favorite.objects.recipes_removed(
+        instance, instance.favorites.values_list('recipe_id', flat=True)
+    )
+    Subscriptions.objects.shift_counters(
+        instance.authors.values_list('user_id', flat=True),
+        instance.followers.values_list('author_id', flat=True),
+        -1,
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def reference_data_changed(sender, **kwargs):
+    """Сбрасывает кэш справочников при изменении тегов и продуктов."""
+    bump_reference_data_version()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def forget_recipe_existence(sender, instance, **kwargs):
+    """Убирает рецепт из кэша коротких ссылок при создании и удалении."""
+    existence_cache.discard(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, update_fields=None, **kwargs):
+    """Создаёт уменьшенные копии изображения рецепта."""
+    update_fields = get_changed_fields(instance, update_fields)
+    if update_fields is None or 'image' in update_fields:
+        schedule_renditions(
+            instance.image.name,
+            'recipe',
+            partial(
+                mark_renditions_ready,
+                Recipe.objects.filter(pk=instance.pk),
+                'image',
+                instance.image.name,
+                [instance.pk],
+            ),
+        )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    """Сбрасывает кэш ответов рецепта и списков рецептов."""
+    bump_recipe_versions([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, **kwargs):
+    """
+    Обновляет поисковый индекс рецепта после фиксации транзакции.
+
+    К этому моменту продукты рецепта тоже сохранены.
+    """
+    transaction.on_commit(partial(
+        update_search_index, Recipe.objects.filter(pk=instance.pk)
+    ))
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, **kwargs):
+    remove_from_search_index([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def update_coverage_index(sender, instance, **kwargs):
+    """Обновляет состав рецепта в индексе подбора по продуктам."""
+    transaction.on_commit(partial(
+        coverage_index.recipe_changed, instance.pk
+    ))
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_coverage_index(sender, instance, **kwargs):
+    transaction.on_commit(partial(
+        coverage_index.recipe_deleted, instance.pk
+    ))
+
+
+@receiver(post_save, sender=Recipe)
+def announce_recipe(sender, instance, created, **kwargs):
+    """Сообщает подписчикам автора о новом рецепте."""
+    if created and instance.author_id is not None:
+        publish_on_commit(author_channel(instance.author_id), {
+            'type': 'recipe',
+            'id': instance.pk,
+            'name': instance.name,
+            'author': instance.author_id,
+            'pub_date': instance.pub_date.isoformat(),
+        })
+
+
+@receiver(post_save, sender=Subscriptions)
+def subscription_created(sender, instance, created, **kwargs):
+    """Сообщает открытым потокам событий пользователя о новой подписке."""
+    if created:
+        publish_on_commit(user_channel(instance.user_id), {
+            'type': 'subscribed', 'author': instance.author_id,
+        })
+
+
+@receiver(post_delete, sender=Subscriptions)
+def subscription_deleted(sender, instance, **kwargs):
+    publish_on_commit(user_channel(instance.user_id), {
+        'type': 'unsubscribed', 'author': instance.author_id,
+    })
+
+
+@receiver(post_save, sender=Ingredient)
+def index_ingredient_recipes(sender, instance, created, **kwargs):
+    """Обновляет поисковый индекс рецептов с переименованным продуктом."""
+    if not created:
+        transaction.on_commit(partial(
+            update_search_index,
+            Recipe.objects.filter(recipeingredients__ingredient=instance),
+        ))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    """Сбрасывает кэш ответов рецепта при изменении его продуктов."""
+    bump_recipe_versions([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Сбрасывает кэш ответов рецептов при изменении их тегов."""
+    if action.startswith('post_'):
+        bump_recipe_versions(pk_set or () if reverse else [instance.pk])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def update_tags_mask(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Пересчитывает маску тегов рецептов при изменении их тегов.
+
+    При очистке тегов у тега затронутые рецепты известны только до
+    удаления связей, поэтому бит снимается заранее.
+    """
+    if reverse and action == 'pre_clear':
+        Recipe.objects.tag_removed(instance)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        Recipe.objects.update_tags_mask(Recipe.objects.filter(
+            pk__in=pk_set or () if reverse else [instance.pk]
+        ))
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    """Снимает бит удаляемого тега с масок рецептов."""
+    Recipe.objects.tag_removed(instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Создаёт уменьшенные копии аватара и сбрасывает кэш рецептов автора.
+
+    Рецепты показывают имя и аватар автора, поэтому их кэш сбрасывается
+    при изменении этих полей и ещё раз, когда готовы копии аватара.
+    """
+    update_fields = get_changed_fields(instance, update_fields)
+    if created or (
+        update_fields is not None
+        and AUTHOR_FIELDS.isdisjoint(update_fields)
+    ):
+        recipe_ids = []
+    else:
+        recipe_ids = list(instance.recipes.values_list('pk', flat=True))
+        bump_recipe_versions(recipe_ids)
+    if update_fields is None or 'avatar' in update_fields:
+        schedule_renditions(
+            instance.avatar.name,
+            'avatar',
+            partial(
+                mark_renditions_ready,
+                User.objects.filter(pk=instance.pk),
+                'avatar',
+                instance.avatar.name,
+                recipe_ids,
+            ),
+        )
@@ -0,0 +1,106 @@
+from django.test import TestCase
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingListItem,
+    Tag,
+    User,
+)
+
+
+class AdminCountersTests(TestCase):
+    """Правки в админке поддерживают счётчики и списки покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='x'
+        )
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='x'
+        )
+        cls.tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        cls.milk, cls.oats = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Молоко', 'Овсянка')
+        )
+        cls.recipe = Recipe.objects.create(
+            name='Каша',
+            author=cls.admin,
+            text='Сварить.',
+            image='recipe_images/test.png',
+            cooking_time=10,
+        )
+        cls.recipe.tags.add(cls.tag)
+        cls.recipe_ingredient = RecipeIngredient.objects.create(
+            recipe=cls.recipe, ingredient=cls.milk, amount=200
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def shopping_list(self):
+        return dict(ShoppingListItem.objects.filter(
+            user=self.reader
+        ).values_list('ingredient_id', 'amount'))
+
+    def test_add_and_delete_favorite(self):
+        response = self.client.post('/admin/recipes/favorite/add/', {
+            'user': self.reader.pk, 'recipe': self.recipe.pk,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        favorite = Favorite.objects.get()
+        self.client.post(
+            f'/admin/recipes/favorite/{favorite.pk}/delete/', {'post': 'yes'}
+        )
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_add_and_bulk_delete_shopping_cart(self):
+        self.client.post('/admin/recipes/shoppingcart/add/', {
+            'user': self.reader.pk, 'recipe': self.recipe.pk,
+        })
+        self.assertEqual(self.shopping_list(), {self.milk.pk: 200})
+        self.client.post('/admin/recipes/shoppingcart/', {
+            'action': 'delete_selected',
+            '_selected_action': list(
+                ShoppingCart.objects.values_list('pk', flat=True)
+            ),
+            'post': 'yes',
+        })
+        self.assertFalse(ShoppingCart.objects.exists())
+        self.assertEqual(self.shopping_list(), {})
+
+    def test_inline_ingredients(self):
+        ShoppingCart.objects.add_recipe(self.reader, self.recipe)
+        response = self.client.post(
+            f'/admin/recipes/recipe/{self.recipe.pk}/change/',
+            {
+                'name': self.recipe.name,
+                'author': self.admin.pk,
+                'tags': [self.tag.pk],
+                'text': self.recipe.text,
+                'cooking_time': self.recipe.cooking_time,
+                'recipeingredients-TOTAL_FORMS': 2,
+                'recipeingredients-INITIAL_FORMS': 1,
+                'recipeingredients-0-id': self.recipe_ingredient.pk,
+                'recipeingredients-0-recipe': self.recipe.pk,
+                'recipeingredients-0-ingredient': self.milk.pk,
+                'recipeingredients-0-amount': 300,
+                'recipeingredients-1-recipe': self.recipe.pk,
+                'recipeingredients-1-ingredient': self.oats.pk,
+                'recipeingredients-1-amount': 50,
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            self.shopping_list(), {self.milk.pk: 300, self.oats.pk: 50}
+        )
+        self.oats.refresh_from_db()
+        self.assertEqual(self.oats.recipes_count, 1)
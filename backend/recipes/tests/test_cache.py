@@ -0,0 +1,19 @@
+from django.test import TestCase
+
+from recipes.cache import (
+    get_recipe_list_version,
+    get_recipe_version,
+    read_reference_data_version,
+)
+
+
+class VersionsCacheTests(TestCase):
+    """Версии рецептов не вытесняют версии справочников и списков."""
+
+    def test_many_recipe_versions(self):
+        list_version = get_recipe_list_version()
+        reference_version = read_reference_data_version()
+        for pk in range(1, 401):
+            get_recipe_version(pk)
+        self.assertEqual(get_recipe_list_version(), list_version)
+        self.assertEqual(read_reference_data_version(), reference_version)
@@ -0,0 +1,86 @@
+from django.test import TestCase
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    Subscriptions,
+    Tag,
+    User,
+)
+
+
+class StaleSaveTests(TestCase):
+    """Сохранение устаревшего экземпляра не затирает счётчики."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='x'
+        )
+        cls.tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        cls.ingredient = Ingredient.objects.create(
+            name='Молоко', measurement_unit='мл'
+        )
+        cls.recipe = Recipe.objects.create(
+            name='Каша',
+            author=cls.author,
+            text='Сварить.',
+            image='recipe_images/test.png',
+            cooking_time=10,
+        )
+
+    def test_recipe_favorites_count(self):
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        Favorite.objects.add_recipe(self.reader, self.recipe)
+        stale.name = 'Овсяная каша'
+        stale.save()
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual(recipe.name, 'Овсяная каша')
+        self.assertEqual(recipe.favorites_count, 1)
+
+    def test_recipe_tags_mask(self):
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        self.recipe.tags.add(self.tag)
+        stale.save()
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipe.pk).tags_mask,
+            1 << Tag.objects.get(pk=self.tag.pk).bit,
+        )
+
+    def test_ingredient_recipes_count(self):
+        stale = Ingredient.objects.get(pk=self.ingredient.pk)
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.ingredient, amount=1
+        )
+        Recipe.objects.relations_changed((), (), (), [self.ingredient.pk])
+        stale.name = 'Молоко коровье'
+        stale.save()
+        ingredient = Ingredient.objects.get(pk=self.ingredient.pk)
+        self.assertEqual(ingredient.name, 'Молоко коровье')
+        self.assertEqual(ingredient.recipes_count, 1)
+
+    def test_tag_recipes_count(self):
+        stale = Tag.objects.get(pk=self.tag.pk)
+        Recipe.objects.relations_changed((), [self.tag.pk], (), ())
+        stale.name = 'Ранний завтрак'
+        stale.save()
+        self.assertEqual(Tag.objects.get(pk=self.tag.pk).recipes_count, 1)
+
+    def test_user_counters(self):
+        stale = User.objects.get(pk=self.author.pk)
+        Subscriptions.objects.subscribe(self.reader, self.author)
+        stale.first_name = 'Автор'
+        stale.save()
+        author = User.objects.get(pk=self.author.pk)
+        self.assertEqual(author.first_name, 'Автор')
+        self.assertEqual(author.subscribers_count, 1)
+
+    def test_new_objects_are_inserted(self):
+        tag = Tag(name='Ужин', slug='dinner')
+        tag.save()
+        self.assertTrue(Tag.objects.filter(pk=tag.pk).exists())
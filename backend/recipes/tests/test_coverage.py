@@ -0,0 +1,63 @@
+import os
+import tempfile
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from recipes.coverage import CoverageIndex, CoverageIndexHolder
+
+
+class CoverageIndexTests(SimpleTestCase):
+    """Подбор рецептов по продуктам и снимок индекса."""
+
+    def setUp(self):
+        # Рецепт 1: продукты 10, 20; рецепт 2: 10; рецепт 3: 20, 30, 40.
+        self.index = CoverageIndex.from_pairs(
+            np.array([1, 1, 2, 3, 3, 3]), np.array([10, 20, 10, 20, 30, 40])
+        )
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'coverage')
+
+    def assert_rank(self, index, ingredient_ids, expected):
+        recipe_ids, matched, sizes = index.rank(ingredient_ids)
+        self.assertEqual(
+            list(zip(recipe_ids.tolist(), matched.tolist(), sizes.tolist())),
+            expected,
+        )
+
+    def test_rank(self):
+        self.assert_rank(
+            self.index, [10, 20], [(2, 1, 1), (1, 2, 2), (3, 1, 3)]
+        )
+
+    def test_update_and_remove(self):
+        self.index.update(4, [30])
+        self.index.remove(2)
+        self.assert_rank(
+            self.index, [10, 30], [(4, 1, 1), (1, 1, 2), (3, 1, 3)]
+        )
+
+    def test_snapshot_path_without_suffix(self):
+        self.index.save(self.path)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['coverage'])
+        self.assert_rank(
+            CoverageIndex.load(self.path),
+            [10, 20],
+            [(2, 1, 1), (1, 2, 2), (3, 1, 3)],
+        )
+
+    def test_preload_snapshot(self):
+        self.index.save(self.path)
+        holder = CoverageIndexHolder(max_age=60)
+        with override_settings(COVERAGE_INDEX_PATH=self.path):
+            holder.preload()
+        self.assertIsNotNone(holder.index)
+        self.assert_rank(holder.get(), [30], [(3, 1, 3)])
+
+    def test_preload_without_snapshot(self):
+        holder = CoverageIndexHolder(max_age=60)
+        with override_settings(COVERAGE_INDEX_PATH=self.path):
+            holder.preload()
+        self.assertIsNone(holder.index)
+        self.assertIsNone(holder.rebuilding)
@@ -0,0 +1,143 @@
+import asyncio
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from recipes.events import (
+    InProcessBroker,
+    author_channel,
+    get_broker,
+    user_channel,
+)
+from recipes.models import Recipe, Subscriptions, User
+
+
+class InProcessBrokerTests(SimpleTestCase):
+    """Доставка сообщений слушателям в цикле событий."""
+
+    def run_listener(self, broker, channels, publish):
+        """Публикует сообщения publish() и возвращает полученные."""
+
+        async def main():
+            listener = broker.listen(channels, 10)
+            publish(listener)
+            messages = []
+            try:
+                while True:
+                    messages.append(
+                        await asyncio.wait_for(listener.get(), 0.1)
+                    )
+            except asyncio.TimeoutError:
+                return messages
+            finally:
+                broker.close(listener)
+
+        return asyncio.run(main())
+
+    def test_publish_from_another_thread(self):
+        broker = InProcessBroker()
+
+        def publish(listener):
+            thread = threading.Thread(
+                target=broker.publish, args=('a', {'id': 1})
+            )
+            thread.start()
+            thread.join()
+            broker.publish('b', {'id': 2})
+
+        self.assertEqual(
+            self.run_listener(broker, ['a'], publish), [{'id': 1}]
+        )
+        self.assertEqual(broker.listeners, {})
+
+    def test_follow_and_unfollow(self):
+        broker = InProcessBroker()
+
+        def publish(listener):
+            broker.follow(listener, 'b')
+            broker.unfollow(listener, 'a')
+            broker.publish('a', {'id': 1})
+            broker.publish('b', {'id': 2})
+
+        self.assertEqual(
+            self.run_listener(broker, ['a'], publish), [{'id': 2}]
+        )
+
+    def test_full_queue_drops_messages(self):
+        broker = InProcessBroker()
+
+        def publish(listener):
+            for pk in range(15):
+                broker.publish('a', {'id': pk})
+
+        with self.assertLogs('recipes.events', 'WARNING'):
+            messages = self.run_listener(broker, ['a'], publish)
+        self.assertEqual(messages, [{'id': pk} for pk in range(10)])
+
+
+@override_settings(FEED_BROKER='recipes.events.InProcessBroker')
+class FeedSignalsTests(TestCase):
+    """Сигналы публикуют события после фиксации транзакции."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='x'
+        )
+
+    def setUp(self):
+        get_broker.cache_clear()
+        self.addCleanup(get_broker.cache_clear)
+        # Копии изображений к событиям отношения не имеют.
+        patcher = mock.patch('recipes.signals.schedule_renditions')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def collect(self, channels, action):
+        """Выполняет action() и возвращает сообщения каналов channels."""
+        broker = get_broker()
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+
+        async def listen():
+            return broker.listen(channels, 10)
+
+        listener = loop.run_until_complete(listen())
+        with self.captureOnCommitCallbacks(execute=True):
+            action()
+        # Сообщения доставляются в цикл событий через call_soon_threadsafe.
+        loop.run_until_complete(asyncio.sleep(0))
+        broker.close(listener)
+        messages = []
+        while not listener.queue.empty():
+            messages.append(listener.queue.get_nowait())
+        return messages
+
+    def test_new_recipe(self):
+        messages = self.collect(
+            [author_channel(self.author.pk)],
+            lambda: Recipe.objects.create(
+                name='Каша',
+                author=self.author,
+                text='Сварить.',
+                image='recipe_images/test.png',
+                cooking_time=10,
+            ),
+        )
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0]['type'], 'recipe')
+        self.assertEqual(messages[0]['author'], self.author.pk)
+
+    def test_subscription_changes(self):
+        messages = self.collect([user_channel(self.reader.pk)], lambda: (
+            Subscriptions.objects.subscribe(self.reader, self.author),
+            Subscriptions.objects.unsubscribe(self.reader, self.author),
+        ))
+        self.assertEqual(messages, [
+            {'type': 'subscribed', 'author': self.author.pk},
+            {'type': 'unsubscribed', 'author': self.author.pk},
+        ])
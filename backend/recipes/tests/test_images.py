@@ -0,0 +1,48 @@
+from unittest import mock
+
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase
+
+from api.serializers import ShortRecipeSerializer
+from recipes.images import mark_renditions_ready
+from recipes.models import Recipe, User
+
+
+class SrcsetTests(TestCase):
+    """Копии изображения попадают в ответ, когда отмечены готовыми."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        cls.recipe = Recipe.objects.create(
+            name='Каша',
+            author=author,
+            text='Сварить.',
+            image='recipe_images/test.png',
+            cooking_time=10,
+        )
+
+    def get_srcset(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        with mock.patch.object(FileSystemStorage, 'exists') as exists:
+            srcset = ShortRecipeSerializer(recipe).data['image_srcset']
+        exists.assert_not_called()
+        return srcset
+
+    def test_not_ready(self):
+        self.assertEqual(self.get_srcset(), {})
+
+    def test_ready(self):
+        recipes = Recipe.objects.filter(pk=self.recipe.pk)
+        mark_renditions_ready(recipes, 'image', 'recipe_images/test.png', [])
+        srcset = self.get_srcset()
+        self.assertIn('jpg', srcset)
+        self.assertIn('renditions/test_card.jpg 480w', srcset['jpg'])
+
+    def test_image_replaced(self):
+        recipes = Recipe.objects.filter(pk=self.recipe.pk)
+        recipes.update(image='recipe_images/new.png')
+        mark_renditions_ready(recipes, 'image', 'recipe_images/test.png', [])
+        self.assertEqual(self.get_srcset(), {})
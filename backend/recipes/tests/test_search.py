@@ -0,0 +1,50 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Recipe, User
+from recipes.search import (
+    get_backend,
+    search_recipes,
+    update_search_index,
+)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Поиск FTS5 есть только в SQLite')
+class FTSSearchTests(TestCase):
+    """Поиск по таблице FTS5."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        cls.in_text, cls.in_name = (
+            Recipe.objects.create(
+                name=name,
+                author=author,
+                text=text,
+                image='recipe_images/test.png',
+                cooking_time=10,
+            )
+            for name, text in (
+                ('Суп', 'Добавить картофель.'),
+                ('Картофельное пюре', 'Размять.'),
+            )
+        )
+        # Индекс обновляется после фиксации транзакции, а её в тесте нет.
+        update_search_index(Recipe.objects.all())
+
+    def test_backend_is_cached_per_connection(self):
+        self.assertEqual(get_backend(), 'fts5')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_backend(), 'fts5')
+
+    def test_rank_orders_by_field_weight(self):
+        with CaptureQueriesContext(connection) as context:
+            recipes = list(search_recipes(Recipe.objects.all(), 'картоф'))
+        self.assertEqual(recipes, [self.in_name, self.in_text])
+        self.assertGreater(recipes[0].search_rank, recipes[1].search_rank)
+        self.assertEqual(context.captured_queries[-1]['sql'].count('MATCH'), 1)
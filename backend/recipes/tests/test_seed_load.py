@@ -0,0 +1,24 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from recipes.models import Recipe, RecipeIngredient, User
+
+
+class SeedLoadTests(TestCase):
+    """Команда seed_load заполняет базу на малом масштабе."""
+
+    def test_small_scale(self):
+        call_command(
+            'seed_load', scale=0.0001, seed=7, stdout=StringIO()
+        )
+        users = User.objects.filter(username__startswith='load7-')
+        recipes = Recipe.objects.filter(author__in=users)
+        self.assertEqual(users.count(), 10)
+        self.assertEqual(recipes.count(), 100)
+        self.assertFalse(users.exclude(avatar_renditions='').exists())
+        self.assertFalse(recipes.exclude(image_renditions='').exists())
+        self.assertTrue(
+            RecipeIngredient.objects.filter(recipe__in=recipes).exists()
+        )
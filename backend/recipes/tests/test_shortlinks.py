@@ -0,0 +1,62 @@
+import time
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from recipes.constants import SHORT_LINK_CACHE_TIMEOUT
+from recipes.models import Recipe, User
+from recipes.shortlinks import decode, encode, existence_cache
+
+
+class ShortLinkTests(TestCase):
+    """Коды коротких ссылок и перенаправление по ним."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        cls.recipe = Recipe.objects.create(
+            name='Каша',
+            author=cls.author,
+            text='Сварить.',
+            image='recipe_images/test.png',
+            cooking_time=10,
+        )
+
+    def setUp(self):
+        existence_cache.clear()
+        self.url = reverse('recipes:shortlink', args=(encode(self.recipe.pk),))
+
+    def test_round_trip(self):
+        for pk in (1, 51, 52, 2 ** 40):
+            with self.subTest(pk=pk):
+                self.assertTrue(encode(pk).isalpha())
+                self.assertEqual(decode(encode(pk)), pk)
+
+    def test_legacy_and_invalid_codes(self):
+        self.assertEqual(decode('42'), 42)
+        self.assertIsNone(decode('a-b'))
+        self.assertIsNone(decode('0'))
+
+    def test_redirect_and_404_after_delete(self):
+        response = self.client.get(self.url)
+        self.assertRedirects(
+            response,
+            f'/recipes/{self.recipe.pk}/',
+            fetch_redirect_response=False,
+        )
+        self.recipe.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_deleted_in_other_process(self):
+        self.client.get(self.url)
+        # Удаление в другом процессе не сбрасывает кэш этого процесса.
+        Recipe.objects.filter(pk=self.recipe.pk)._raw_delete('default')
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+        with mock.patch(
+            'recipes.shortlinks.time.monotonic',
+            return_value=time.monotonic() + SHORT_LINK_CACHE_TIMEOUT + 1,
+        ):
+            self.assertEqual(self.client.get(self.url).status_code, 404)
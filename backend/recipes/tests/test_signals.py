@@ -0,0 +1,60 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from recipes.cache import get_recipe_version
+from recipes.models import Recipe, User
+
+
+class ChangedFieldsTests(TestCase):
+    """Обработчики сохранения реагируют только на изменённые поля."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        cls.recipe = Recipe.objects.create(
+            name='Каша',
+            author=cls.author,
+            text='Сварить.',
+            image='recipe_images/test.png',
+            cooking_time=10,
+        )
+
+    def save_recipe(self, **values):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        for name, value in values.items():
+            setattr(recipe, name, value)
+        with mock.patch(
+            'recipes.signals.schedule_renditions'
+        ) as schedule_renditions:
+            recipe.save()
+        return recipe, schedule_renditions
+
+    def test_recipe_text_change(self):
+        recipe, schedule_renditions = self.save_recipe(text='Сварить кашу.')
+        self.assertEqual(recipe.changed_fields, {'text'})
+        schedule_renditions.assert_not_called()
+
+    def test_recipe_image_change(self):
+        _, schedule_renditions = self.save_recipe(
+            image='recipe_images/other.png'
+        )
+        schedule_renditions.assert_called_once()
+
+    def test_password_change_keeps_recipe_versions(self):
+        version = get_recipe_version(self.recipe.pk)
+        user = User.objects.get(pk=self.author.pk)
+        user.set_password('y')
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertEqual(get_recipe_version(self.recipe.pk), version)
+
+    def test_name_change_bumps_recipe_versions(self):
+        version = get_recipe_version(self.recipe.pk)
+        user = User.objects.get(pk=self.author.pk)
+        user.first_name = 'Анна'
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertNotEqual(get_recipe_version(self.recipe.pk), version)
@@ -0,0 +1,56 @@
+from unittest import mock
+
+from django.db import IntegrityError
+from django.test import TestCase
+
+from recipes.models import Recipe, Tag, TagManager, User
+
+
+class TagBitTests(TestCase):
+    """Раздача битов маски новым тегам."""
+
+    def test_free_bit(self):
+        first = Tag.objects.create(name='Завтрак', slug='breakfast')
+        second = Tag.objects.create(name='Обед', slug='lunch')
+        self.assertEqual((first.bit, second.bit), (0, 1))
+
+    def test_bit_taken_concurrently(self):
+        Tag.objects.create(name='Завтрак', slug='breakfast')
+        free_bits = TagManager.free_bits
+        # Первый поиск видит состояние до вставки первого тега.
+        with mock.patch.object(
+            TagManager,
+            'free_bits',
+            autospec=True,
+            side_effect=[[0, 1], free_bits(Tag.objects)],
+        ):
+            tag = Tag.objects.create(name='Обед', slug='lunch')
+        self.assertEqual(tag.bit, 1)
+        self.assertEqual(Tag.objects.get(pk=tag.pk).bit, 1)
+
+    def test_other_conflict_is_raised(self):
+        Tag.objects.create(name='Завтрак', slug='breakfast')
+        tag = Tag(name='Завтрак', slug='lunch')
+        with self.assertRaises(IntegrityError):
+            tag.save()
+        self.assertIsNone(tag.bit)
+
+    def test_assign_bits_updates_masks(self):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        recipe = Recipe.objects.create(
+            name='Каша',
+            author=author,
+            text='Сварить.',
+            image='recipe_images/test.png',
+            cooking_time=10,
+        )
+        # Теги из импорта создаются без save() и без бита.
+        Tag.objects.bulk_create([Tag(name='Обед', slug='lunch')])
+        tag = Tag.objects.get(slug='lunch')
+        recipe.tags.add(tag)
+        Tag.objects.assign_bits()
+        tag.refresh_from_db()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.tags_mask, 1 << tag.bit)
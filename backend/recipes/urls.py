@@ -5,5 +5,5 @@ from .views import redirect_to_recipe_detail
 app_name = 'recipes'
 
 urlpatterns = [
-    path('s/<int:pk>/', redirect_to_recipe_detail, name='shortlink'),
+    path('s/<str:code>/', redirect_to_recipe_detail, name='shortlink'),
 ]
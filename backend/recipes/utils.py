@@ -0,0 +1,3 @@
+def normalize_search_key(value):
+    """Приводит строку к виду для поиска: без регистра, «ё» как «е»."""
+    return ' '.join(value.casefold().replace('ё', 'е').split())
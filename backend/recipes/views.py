@@ -1,11 +1,16 @@
+from django.http import Http404
 from django.shortcuts import redirect
-from django.core.exceptions import ValidationError
-from .models import Recipe
+from django.utils.cache import patch_cache_control
 
+from .constants import SHORT_LINK_MAX_AGE
+from .shortlinks import decode, recipe_exists
 
-def redirect_to_recipe_detail(request, pk):
+
+def redirect_to_recipe_detail(request, code):
     """Перенаправляет на детальную страницу рецепта, если он существует."""
-    if Recipe.objects.filter(pk=pk).exists():
-        return redirect(f'/recipes/{pk}/')
-    else:
-        raise ValidationError(f'Рецепт с id {pk} отсутствует.')
+    pk = decode(code)
+    if pk is None or not recipe_exists(pk):
+        raise Http404(f'Рецепт по ссылке {code} отсутствует.')
+    response = redirect(f'/recipes/{pk}/')
+    patch_cache_control(response, public=True, max_age=SHORT_LINK_MAX_AGE)
+    return response